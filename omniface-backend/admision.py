@@ -0,0 +1,130 @@
+# ✅ omniface-backend/admision.py
+"""
+Control de admisión del worker de inferencia.
+
+El worker informa, por cada lote, cuántos frames procesó, cuánto tardó y
+qué profundidad tenía la cola. Con eso se estima su capacidad (frames/s) y
+se reparte en partes iguales entre las cámaras activas; la parte de una
+cámara se divide entre sus sesiones (usuarios / modos que la miran). Cada
+sesión recibe un fps objetivo entre RECON_FPS_MIN y RECON_FPS_MAX y no
+envía frames más seguido que eso. Si la cola crece por encima de RECON_COLA_OBJETIVO el
+reparto se reduce a la mitad hasta que se vacíe.
+
+Los frames que igual llegan tarde (más viejos que RECON_FRAME_MAX_EDAD_MS)
+los descarta el worker en lugar de procesarlos.
+"""
+import time
+from threading import Lock
+from config import (
+    RECON_FPS_MAX, RECON_FPS_MIN, RECON_COLA_OBJETIVO, RECON_UTILIZACION
+)
+from metricas import Metricas
+
+_ALFA = 0.2   # suavizado exponencial de capacidad / fps medidos
+
+
+class ControlAdmision:
+    """Estado global (clase) como VideoManager / InferenceManager."""
+    _lock = Lock()
+    _sesiones: dict = {}          # clave → {"usuario_id", "cam_id", "ultimo_envio", "fps"}
+    _capacidad: float = float(RECON_FPS_MAX)   # frames/s que procesa el worker
+    _latencia: float = 0.0        # s por lote (EMA)
+    _cola: int = 0                # profundidad de cola en el último lote
+    _descartados: int = 0         # frames viejos descartados por el worker
+
+    # ---------- sesiones ----------
+    @classmethod
+    def registrar(cls, clave, usuario_id: int, cam_id: int):
+        with cls._lock:
+            cls._sesiones[clave] = {"usuario_id": usuario_id, "cam_id": cam_id, "ultimo_envio": 0.0, "fps": 0.0}
+
+    @classmethod
+    def quitar(cls, clave):
+        with cls._lock:
+            cls._sesiones.pop(clave, None)
+
+    @classmethod
+    def fps_objetivo(cls, clave=None) -> float:
+        """Parte justa de la capacidad por cámara; con `clave`, la de esa sesión dentro de su cámara."""
+        sesiones = list(cls._sesiones.values())
+        fps = cls._capacidad * RECON_UTILIZACION / max(1, len({s["cam_id"] for s in sesiones}))
+        propia = cls._sesiones.get(clave)
+        if propia is not None:
+            fps /= sum(1 for s in sesiones if s["cam_id"] == propia["cam_id"]) or 1
+        if cls._cola > RECON_COLA_OBJETIVO:
+            fps *= 0.5
+        return min(float(RECON_FPS_MAX), max(float(RECON_FPS_MIN), fps))
+
+    @classmethod
+    def espera(cls, clave) -> float:
+        """Segundos que la sesión debe esperar antes de enviar otro frame."""
+        s = cls._sesiones.get(clave)
+        if s is None:
+            return 0.0
+        return max(0.0, s["ultimo_envio"] + 1.0 / cls.fps_objetivo(clave) - time.monotonic())
+
+    @classmethod
+    def marcar_envio(cls, clave):
+        ahora = time.monotonic()
+        with cls._lock:
+            s = cls._sesiones.get(clave)
+            if s is None:
+                return
+            if s["ultimo_envio"]:
+                inst = 1.0 / max(1e-3, ahora - s["ultimo_envio"])
+                s["fps"] = inst if not s["fps"] else (1 - _ALFA) * s["fps"] + _ALFA * inst
+            s["ultimo_envio"] = ahora
+
+    # ---------- worker ----------
+    @classmethod
+    def observar_lote(cls, n_frames: int, latencia: float, cola: int):
+        if n_frames <= 0:
+            return
+        with cls._lock:
+            inst = n_frames / max(1e-3, latencia)
+            cls._capacidad = (1 - _ALFA) * cls._capacidad + _ALFA * inst
+            cls._latencia = latencia if not cls._latencia else (1 - _ALFA) * cls._latencia + _ALFA * latencia
+            cls._cola = cola
+
+    @classmethod
+    def observar_descarte(cls, n: int = 1):
+        with cls._lock:
+            cls._descartados += n
+
+    # ---------- consulta ----------
+    @classmethod
+    def fps_por_camara(cls, usuario_id: int = None) -> dict:
+        """fps efectivo analizado por cámara (la sesión más rápida de cada una)."""
+        fps = {}
+        with cls._lock:
+            for s in cls._sesiones.values():
+                if usuario_id is not None and s["usuario_id"] != usuario_id:
+                    continue
+                key = f"camara_{s['cam_id']}"
+                fps[key] = round(max(fps.get(key, 0.0), s["fps"]), 2)
+        return fps
+
+    @classmethod
+    def resumen(cls, usuario_id: int = None) -> dict:
+        """Estado del worker; con `usuario_id`, sesiones y fps sólo de ese usuario."""
+        return {
+            "capacidad_fps": round(cls._capacidad, 2),
+            "latencia_lote_ms": round(cls._latencia * 1000, 1),
+            "cola": cls._cola,
+            "sesiones": sum(1 for s in list(cls._sesiones.values())
+                            if usuario_id is None or s["usuario_id"] == usuario_id),
+            "fps_objetivo": round(cls.fps_objetivo(), 2),
+            "descartados": cls._descartados,
+            "fps_por_camara": cls.fps_por_camara(usuario_id),
+        }
+
+
+Metricas.medidor("omniface_sesiones_activas", "Sesiones de reconocimiento registradas",
+                 lambda: len(ControlAdmision._sesiones))
+Metricas.medidor("omniface_capacidad_fps", "Capacidad estimada del worker (frames/s)",
+                 lambda: round(ControlAdmision._capacidad, 2))
+Metricas.medidor("omniface_fps_objetivo", "fps asignado a cada cámara",
+                 lambda: round(ControlAdmision.fps_objetivo(), 2))
+Metricas.medidor("omniface_analisis_fps", "fps analizado por cámara",
+                 lambda: [({"camara": k.replace("camara_", "")}, v)
+                          for k, v in ControlAdmision.fps_por_camara().items()])
@@ -0,0 +1,200 @@
+# ✅ omniface-backend/almacen_modelo.py
+"""
+Almacén persistente de embeddings y versiones publicadas del modelo.
+
+Estructura por usuario (modelo_final/usuario_<id>/):
+    almacen.pkl         persona_id → sus imágenes de referencia, cada una con
+                        hash + embedding (o el motivo de rechazo); sólo se
+                        re-embeben las imágenes nuevas o cambiadas
+    versiones/<v>/      faiss.index (todas las imágenes, etiquetas = persona_id),
+                        prototipos.index (un centroide por persona),
+                        embeddings.pkl y errores.json de cada publicación
+    actual.json         {"version": <v>}: la versión vigente
+
+Publicar = escribir la versión completa en una carpeta temporal, renombrarla
+y reemplazar actual.json con os.replace. Quien lee el modelo ve siempre una
+versión entera, la anterior o la nueva. Se conservan MODELO_VERSIONES.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import MODELO_VERSIONES
+
+_FORMATO = 2      # 2: varias imágenes por persona
+
+
+def hash_imagen(ruta) -> str:
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+# ──────────────────────────────
+#  Almacén de embeddings
+# ──────────────────────────────
+class AlmacenEmbeddings:
+    """
+    Una entrada por persona: {"nombre", "imagenes": {ruta: imagen}}, con
+    imagen = {"hash", "mtime", "tamano", "embedding" (float32 o None),
+    "error", "norma"}. mtime/tamaño evitan releer la imagen cuando el
+    archivo no cambió.
+    """
+
+    def __init__(self, carpeta: Path, personas: dict = None):
+        self.ruta     = Path(carpeta) / "almacen.pkl"
+        self.personas = personas or {}
+
+    @classmethod
+    def cargar(cls, carpeta: Path) -> "AlmacenEmbeddings":
+        ruta = Path(carpeta) / "almacen.pkl"
+        if not ruta.exists():
+            return cls(carpeta)
+        with open(ruta, "rb") as f:
+            datos = pickle.load(f)
+        if datos.get("formato") != _FORMATO:
+            return cls(carpeta)       # formato viejo: se reconstruye
+        return cls(carpeta, datos["personas"])
+
+    def guardar(self):
+        tmp = self.ruta.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump({"formato": _FORMATO, "personas": self.personas}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.ruta)
+
+    def vigente(self, persona_id: int, ruta_imagen) -> bool:
+        """True si esa imagen de la persona es la misma que ya está procesada."""
+        previo = self.personas.get(persona_id, {}).get("imagenes", {}).get(str(ruta_imagen))
+        if previo is None or not os.path.exists(ruta_imagen):
+            return False
+        st = os.stat(ruta_imagen)
+        if previo["mtime"] == st.st_mtime_ns and previo["tamano"] == st.st_size:
+            return True
+        # Mismo contenido con otro mtime (p. ej. copiada de nuevo): no re-embeber
+        if previo["hash"] == hash_imagen(ruta_imagen):
+            previo["mtime"], previo["tamano"] = st.st_mtime_ns, st.st_size
+            return True
+        return False
+
+    def poner(self, persona_id: int, ruta_imagen, nombre: str, embedding, error, norma):
+        if os.path.exists(ruta_imagen):
+            st = os.stat(ruta_imagen)
+            huella = (hash_imagen(ruta_imagen), st.st_mtime_ns, st.st_size)
+        else:
+            huella = (None, None, None)      # se reintenta cuando aparezca la imagen
+        persona = self.personas.setdefault(persona_id, {"nombre": nombre, "imagenes": {}})
+        persona["imagenes"][str(ruta_imagen)] = {
+            "hash": huella[0], "mtime": huella[1], "tamano": huella[2],
+            "embedding": embedding, "error": error,
+            "norma": float(norma) if norma is not None else None,
+        }
+
+    def quitar(self, persona_id: int):
+        self.personas.pop(persona_id, None)
+
+    def podar_imagenes(self, persona_id: int, vigentes) -> bool:
+        """Quita las imágenes de la persona que ya no están en `vigentes`; True si quitó alguna."""
+        imagenes = self.personas.get(persona_id, {}).get("imagenes", {})
+        sobrantes = set(imagenes) - {str(r) for r in vigentes}
+        for ruta in sobrantes:
+            del imagenes[ruta]
+        return bool(sobrantes)
+
+    def validos(self):
+        """
+        (ids int64, nombres, embeddings float32): una fila por imagen con
+        embedding, así que el persona_id se repite si tiene varias.
+        """
+        filas = [(pid, p["nombre"], img["embedding"])
+                 for pid, p in sorted(self.personas.items())
+                 for _, img in sorted(p["imagenes"].items())
+                 if img["embedding"] is not None]
+        if not filas:
+            return np.zeros(0, dtype=np.int64), [], np.zeros((0, 512), dtype=np.float32)
+        ids, nombres, embs = zip(*filas)
+        return np.array(ids, dtype=np.int64), list(nombres), np.stack(embs).astype(np.float32)
+
+    def centroides(self, persona_ids=None):
+        """
+        (ids, nombres, centroides): una fila por persona, media normalizada de
+        sus imágenes. Con `persona_ids`, sólo esas personas.
+        """
+        ids, nombres, embs = self.validos()
+        if persona_ids is not None:
+            elegidas = np.isin(ids, np.fromiter(persona_ids, dtype=np.int64))
+            ids, embs = ids[elegidas], embs[elegidas]
+            nombres = [n for n, e in zip(nombres, elegidas) if e]
+        if not len(ids):
+            return ids, nombres, embs
+        embs = embs / np.linalg.norm(embs, axis=1, keepdims=True)
+        unicos, inicio, inversa = np.unique(ids, return_index=True, return_inverse=True)
+        sumas = np.zeros((len(unicos), embs.shape[1]), dtype=np.float32)
+        np.add.at(sumas, inversa, embs)
+        sumas /= np.linalg.norm(sumas, axis=1, keepdims=True)
+        return unicos, [nombres[i] for i in inicio], sumas
+
+    def errores(self) -> list:
+        return [
+            {"persona_id": pid, "nombre": p["nombre"], "imagen": ruta,
+             "error": img["error"], "norma": img["norma"]}
+            for pid, p in sorted(self.personas.items())
+            for ruta, img in sorted(p["imagenes"].items()) if img["error"]
+        ]
+
+
+# ──────────────────────────────
+#  Versiones publicadas
+# ──────────────────────────────
+def puntero(carpeta: Path) -> Path:
+    return Path(carpeta) / "actual.json"
+
+
+def version_actual(carpeta: Path):
+    """Carpeta de la versión vigente, o None si el usuario no tiene ninguna."""
+    try:
+        with open(puntero(carpeta), encoding="utf-8") as f:
+            version = json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+    return Path(carpeta) / "versiones" / version
+
+
+def publicar(carpeta: Path, escribir) -> Path:
+    """
+    Crea una versión nueva: `escribir(destino)` deja los archivos en una
+    carpeta temporal, que se renombra y pasa a ser la vigente de un golpe.
+    """
+    versiones = Path(carpeta) / "versiones"
+    versiones.mkdir(parents=True, exist_ok=True)
+    version = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000_000:09d}"
+    tmp = versiones / f".{version}.tmp"
+    escribir(tmp)
+    destino = versiones / version
+    os.replace(tmp, destino)
+
+    ptr_tmp = puntero(carpeta).with_suffix(".tmp")
+    with open(ptr_tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "publicado": time.time()}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(ptr_tmp, puntero(carpeta))
+    _podar(versiones, version)
+    return destino
+
+
+def _podar(versiones: Path, vigente: str):
+    viejas = sorted(p for p in versiones.iterdir()
+                    if p.is_dir() and not p.name.startswith(".") and p.name != vigente)
+    sobrantes = len(viejas) - (MODELO_VERSIONES - 1)
+    for p in viejas[:max(0, sobrantes)]:
+        shutil.rmtree(p, ignore_errors=True)
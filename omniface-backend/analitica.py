@@ -0,0 +1,94 @@
+# ✅ omniface-backend/analitica.py
+"""
+Resumen por cámara (emociones, presencia y tendencia) para el frontend.
+
+Cada frame se reduce a dos vectores de conteo por emoción (conocidos y
+visitantes) con np.bincount. La tendencia usa un anillo NumPy de
+RESUMEN_VENTANA frames con la suma acumulada, que se actualiza sumando el
+frame nuevo y restando el que sale. Así no se recorren los frames
+anteriores en cada frame.
+
+El resumen sólo se emite cuando cambia. Aun así, se emite a lo sumo una vez
+cada RESUMEN_MIN_S; un cambio retenido sale en el siguiente frame permitido.
+Sin cambios, se repite cada RESUMEN_REFRESCO_S para los visores que se unen
+tarde. En los demás frames el mensaje no lleva "summary".
+"""
+import time
+
+import numpy as np
+
+from emociones import ETIQUETAS
+from tabla_personas import DESCONOCIDO
+from config import RESUMEN_VENTANA, RESUMEN_MIN_S, RESUMEN_REFRESCO_S
+
+# Última casilla: emociones fuera de ETIQUETAS ("N/A" si el modelo falló)
+_ETIQUETAS = list(ETIQUETAS) + ["N/A"]
+_INDICE = {e: i for i, e in enumerate(ETIQUETAS)}
+_OTRA = len(ETIQUETAS)
+
+
+class AnaliticaCamara:
+    """Una por sesión (= por cámara). La usa sólo el bucle de stream()."""
+
+    def __init__(self, cam_id: int, ventana: int = RESUMEN_VENTANA,
+                 min_s: float = RESUMEN_MIN_S, refresco_s: float = RESUMEN_REFRESCO_S):
+        self.cam_key    = f"camara_{cam_id}"
+        self.min_s      = min_s
+        self.refresco_s = refresco_s
+        n = len(_ETIQUETAS)
+        self._anillo = np.zeros((max(1, ventana), n), dtype=np.int32)   # conocidos por frame
+        self._suma   = np.zeros(n, dtype=np.int64)                      # suma del anillo
+        self._pos    = 0
+        self._enviado = None     # firma del último resumen emitido
+        self._t_envio = 0.0
+
+    def actualizar(self, faces: list, ahora: float = None):
+        """Incorpora el frame; devuelve el resumen si toca emitirlo, si no None."""
+        ahora = time.monotonic() if ahora is None else ahora
+        n = len(_ETIQUETAS)
+        if faces:
+            emoc = np.fromiter((_INDICE.get(f["emocion"], _OTRA) for f in faces), np.int64, len(faces))
+            conocido = np.fromiter((f["persona_id"] != DESCONOCIDO for f in faces), bool, len(faces))
+            conocidos  = np.bincount(emoc[conocido], minlength=n)
+            visitantes = np.bincount(emoc[~conocido], minlength=n)
+        else:
+            conocido   = np.zeros(0, dtype=bool)
+            conocidos  = visitantes = np.zeros(n, dtype=np.int64)
+
+        # Ventana de tendencia: entra este frame, sale el más viejo
+        self._suma += conocidos - self._anillo[self._pos]
+        self._anillo[self._pos] = conocidos
+        self._pos = (self._pos + 1) % len(self._anillo)
+
+        personalizados = tuple(
+            (f["nombre"], f["emocion"]) for f, c in zip(faces, conocido) if c
+        )
+        firma = (conocidos.tobytes(), visitantes.tobytes(), self._suma.tobytes(), personalizados)
+
+        transcurrido = ahora - self._t_envio
+        if firma != self._enviado:
+            if transcurrido < self.min_s:
+                return None      # se emite en un frame posterior (la firma sigue distinta)
+        elif transcurrido < self.refresco_s:
+            return None
+        self._enviado, self._t_envio = firma, ahora
+        return self._armar(conocidos + visitantes, visitantes, dict(personalizados), int(conocido.sum()))
+
+    def _armar(self, total, visitantes, personalizados, n_conocidos) -> dict:
+        summary = {
+            "emociones_conteo": {_ETIQUETAS[i]: int(total[i]) for i in np.flatnonzero(total)},
+            "dominante_por_camara": "",
+            "tendencia": "",
+            "personalizados": personalizados,
+            "visitantes": {_ETIQUETAS[i]: int(visitantes[i]) for i in np.flatnonzero(visitantes)},
+            "personas_por_area": {self.cam_key: n_conocidos},
+            "visitantes_por_area": {self.cam_key: int(visitantes.sum())},
+        }
+        if total.any():
+            d = int(total.argmax())
+            summary["dominante_por_camara"] = f"{_ETIQUETAS[d]} ({int(total[d])} personas)"
+        suma_total = int(self._suma.sum())
+        if suma_total:
+            d = int(self._suma.argmax())
+            summary["tendencia"] = f"{_ETIQUETAS[d]} ({self._suma[d] / suma_total * 100:.0f}%)"
+        return summary
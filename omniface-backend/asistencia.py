@@ -1,18 +1,13 @@
 #omniface-backend/asistencia.py
 from fastapi import APIRouter, HTTPException
-import mysql.connector
 from mysql.connector import Error
+from database import get_connection
 from datetime import timedelta, time as datetime_time
 
 router = APIRouter(prefix="/asistencia", tags=["Asistencia"])
 
 def _conn_cursor():
-    conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="omniface",
-    )
+    conn = get_connection()     # del pool; conn.close() la devuelve
     return conn, conn.cursor(dictionary=True)
 
 def _normalize_hora(rows):
@@ -65,9 +60,8 @@ def historial(usuario_id: int):
         conn.close()
 @router.get("/salida/historial/{usuario_id}")
 def salidas_historial(usuario_id: int):
+    conn, cursor = _conn_cursor()
     try:
-        conn = mysql.connector.connect(host="localhost", user="root", password="", database="omniface")
-        cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT s.nombre, s.foto_path, s.fecha, s.hora, d.nombre AS departamento
             FROM salidas s
@@ -75,9 +69,9 @@ def salidas_historial(usuario_id: int):
             WHERE s.usuario_id = %s
             ORDER BY s.fecha DESC, s.hora DESC
         """, (usuario_id,))
-        resultados = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return resultados
+        return cursor.fetchall()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
\ No newline at end of file
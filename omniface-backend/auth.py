@@ -14,41 +14,49 @@ auth_router = APIRouter(prefix="/auth", tags=["Autenticación"])
 def registrar(usuario: UsuarioRegistro):  
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT id FROM usuarios WHERE correo = %s", (usuario.correo,))
-    if cursor.fetchone():
-        raise HTTPException(status_code=409, detail="Correo ya registrado")
+    try:
+        cursor.execute("SELECT id FROM usuarios WHERE correo = %s", (usuario.correo,))
+        if cursor.fetchone():
+            raise HTTPException(status_code=409, detail="Correo ya registrado")
 
-    hash_clave = hash_password(usuario.contraseña)
-    cursor.execute("""
-        INSERT INTO usuarios (nombre, correo, contrasena_hash, rol)
-        VALUES (%s, %s, %s, %s)
-    """, (usuario.nombre, usuario.correo, hash_clave, "admin"))
-    conn.commit()
-    return {"mensaje": "Usuario registrado correctamente"}
+        hash_clave = hash_password(usuario.contraseña)
+        cursor.execute("""
+            INSERT INTO usuarios (nombre, correo, contrasena_hash, rol)
+            VALUES (%s, %s, %s, %s)
+        """, (usuario.nombre, usuario.correo, hash_clave, "admin"))
+        conn.commit()
+        return {"mensaje": "Usuario registrado correctamente"}
+    finally:
+        cursor.close()
+        conn.close()
 
 @auth_router.post("/login")
 def login(datos: UsuarioLogin):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM usuarios WHERE correo = %s", (datos.correo,))
-    usuario = cursor.fetchone()
+    try:
+        cursor.execute("SELECT * FROM usuarios WHERE correo = %s", (datos.correo,))
+        usuario = cursor.fetchone()
 
-    if not usuario or not verify_password(datos.contraseña, usuario["contrasena_hash"]):
-        raise HTTPException(status_code=401, detail="Credenciales incorrectas")
+        if not usuario or not verify_password(datos.contraseña, usuario["contrasena_hash"]):
+            raise HTTPException(status_code=401, detail="Credenciales incorrectas")
 
-    payload = {
-        "sub": usuario["correo"],
-        "id": usuario["id"],
-        "rol": usuario["rol"]
-    }
+        payload = {
+            "sub": usuario["correo"],
+            "id": usuario["id"],
+            "rol": usuario["rol"]
+        }
 
-    return {
-        "access_token": create_access_token(payload),
-        "refresh_token": create_refresh_token(payload),
-        "nombre": usuario["nombre"],
-        "correo": usuario["correo"],
-        "rol": usuario["rol"]
-    }
+        return {
+            "access_token": create_access_token(payload),
+            "refresh_token": create_refresh_token(payload),
+            "nombre": usuario["nombre"],
+            "correo": usuario["correo"],
+            "rol": usuario["rol"]
+        }
+    finally:
+        cursor.close()
+        conn.close()
 
 @auth_router.post("/refrescar-token")
 async def refrescar_token(request: Request):
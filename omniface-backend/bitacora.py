@@ -0,0 +1,95 @@
+# ✅ omniface-backend/bitacora.py
+"""
+Logging del backend (reemplaza los print con prefijo [DEBUG]/[ERROR]).
+
+Cada módulo pide su logger con `obtener(__name__)`; todos cuelgan de
+"omniface" y comparten un handler en stderr con una línea por mensaje:
+hora, nivel, módulo y el texto con los datos como `clave=valor`.
+
+Los mensajes por frame o por lote pasan por `Muestreado`: con el nivel
+apagado la llamada vuelve en el primer `if` sin formatear nada; con el
+nivel activo cada clave sale a lo sumo una vez cada LOG_MUESTREO_S y
+avisa cuántos mensajes se omitieron entre medio.
+
+El nivel se cambia en caliente (global o por módulo) con `cambiar_nivel`,
+expuesto en PUT /recon/log para administradores.
+"""
+import logging
+import sys
+import time
+from threading import Lock
+
+from config import LOG_NIVEL, LOG_MUESTREO_S
+
+RAIZ = "omniface"
+NIVELES = ("DEBUG", "INFO", "WARNING", "ERROR", "NOTSET")   # NOTSET: el módulo hereda
+_FORMATO = "%(asctime)s %(levelname)-7s %(name)s %(message)s"
+
+
+def configurar(nivel: str = LOG_NIVEL):
+    """Instala el handler (una sola vez) y fija el nivel global."""
+    raiz = logging.getLogger(RAIZ)
+    if not raiz.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter(_FORMATO))
+        raiz.addHandler(handler)
+        raiz.propagate = False      # no duplicar en el logger raíz de uvicorn
+    raiz.setLevel(nivel)
+
+
+def obtener(nombre: str) -> logging.Logger:
+    return logging.getLogger(f"{RAIZ}.{nombre}")
+
+
+def cambiar_nivel(nivel: str, modulo: str = None) -> dict:
+    """Cambia el nivel global o el de un módulo; devuelve los niveles vigentes."""
+    nivel = nivel.upper()
+    if nivel not in NIVELES or (nivel == "NOTSET" and not modulo):
+        raise ValueError(f"Nivel de log no válido: {nivel}")
+    logging.getLogger(f"{RAIZ}.{modulo}" if modulo else RAIZ).setLevel(nivel)
+    return niveles()
+
+
+def niveles() -> dict:
+    res = {RAIZ: logging.getLevelName(logging.getLogger(RAIZ).level)}
+    for nombre, logger in logging.Logger.manager.loggerDict.items():
+        if (nombre.startswith(RAIZ + ".") and isinstance(logger, logging.Logger)
+                and logger.level != logging.NOTSET):
+            res[nombre] = logging.getLevelName(logger.level)
+    return res
+
+
+class Muestreado:
+    """Envoltura de un logger que limita cada clave a un mensaje por intervalo."""
+
+    def __init__(self, logger: logging.Logger, intervalo: float = LOG_MUESTREO_S):
+        self.logger    = logger
+        self.intervalo = intervalo
+        self._lock     = Lock()
+        self._ultimo   = {}     # clave → monotonic del último mensaje emitido
+        self._omitidos = {}     # clave → mensajes descartados desde entonces
+
+    def debug(self, clave: str, msg: str, *args):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._emitir(logging.DEBUG, clave, msg, args)
+
+    def warning(self, clave: str, msg: str, *args):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._emitir(logging.WARNING, clave, msg, args)
+
+    def error(self, clave: str, msg: str, *args):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._emitir(logging.ERROR, clave, msg, args)
+
+    def _emitir(self, nivel: int, clave: str, msg: str, args: tuple):
+        ahora = time.monotonic()
+        with self._lock:
+            ultimo = self._ultimo.get(clave)
+            if ultimo is not None and ahora - ultimo < self.intervalo:
+                self._omitidos[clave] = self._omitidos.get(clave, 0) + 1
+                return
+            self._ultimo[clave] = ahora
+            omitidos = self._omitidos.pop(clave, 0)
+        if omitidos:
+            msg, args = msg + " omitidos=%d", args + (omitidos,)
+        self.logger.log(nivel, msg, *args)
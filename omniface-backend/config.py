@@ -3,3 +3,107 @@ SECRET_KEY = "clave_muy_secreta_omniface_2025"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 600
 REFRESH_TOKEN_EXPIRE_DAYS = 30
+
+# ── Reconocimiento en vivo ──
+RECON_MAX_BATCH   = 8     # frames máximos por lote de inferencia
+RECON_MAX_WAIT_MS = 10    # espera máxima para completar un lote (ms)
+
+# ── Emociones ──
+EMOCION_BACKEND     = "auto"                 # "auto" | "onnx" | "keras"
+EMOCION_MODELO_H5   = "emotion_model.h5"
+EMOCION_MODELO_ONNX = "emotion_model.onnx"   # python emociones.py convertir
+
+# ── Tracking de rostros ──
+TRACK_IOU_MIN      = 0.3    # IoU mínimo para asociar una detección a un track
+TRACK_MAX_PERDIDOS = 15     # frames sin detección antes de descartar el track
+TRACK_REFRESCO_S   = 3.0    # re-embedding periódico de tracks confiables
+TRACK_CONF_MIN     = 0.65   # por debajo se considera identidad incierta
+TRACK_REINTENTO_S  = 0.5    # re-embedding de tracks inciertos
+
+# ── Identidad por track (votación + histéresis) ──
+IDENT_VENTANA        = 5      # embeddings promediados por track
+IDENT_UMBRAL_ENTRADA = 0.60   # similitud para adoptar un nombre
+IDENT_UMBRAL_SALIDA  = 0.45   # similitud bajo la cual se suelta el nombre
+
+# ── Perfil de inferencia por cámara ──
+# roi: (x1, y1, x2, y2) en fracciones 0-1 del frame (p. ej. sólo la puerta)
+# stride: analizar 1 de cada N frames capturados
+# malla: overlay MediaPipe en la vista "anotado": "off" | "contornos" | "completo"
+PERFIL_CAMARA_DEFAULT = {
+    "ancho": 960, "alto": 540, "fps": 20,
+    "det_size": (480, 480),
+    "roi": None,
+    "stride": 1,
+    "malla": "off",
+}
+PERFILES_CAMARA = {
+    # 0: {"roi": (0.25, 0.0, 0.75, 1.0), "det_size": (320, 320), "stride": 2},
+    # 1: {"malla": "contornos"},
+}
+
+# ── Control de admisión (backpressure) ──
+RECON_FPS_MAX           = 20     # fps analizados máximos por sesión
+RECON_FPS_MIN           = 2      # piso garantizado por sesión bajo carga
+RECON_UTILIZACION       = 0.85   # fracción de la capacidad del worker que se reparte
+RECON_COLA_MAX          = 32     # trabajos en cola; si está llena se descarta el frame
+RECON_COLA_OBJETIVO     = 4      # por encima se reduce el reparto a la mitad
+RECON_FRAME_MAX_EDAD_MS = 500    # el worker descarta frames más viejos que esto
+
+# ── Difusión (varios visores por cámara) ──
+HUB_COLA_SUSCRIPTOR = 2   # frames pendientes por visor; si se llena se descarta el más viejo
+
+# ── Malla facial (MediaPipe) ──
+MALLA_INTERVALO_S = 0.2   # FaceMesh como máximo 5 veces/s por track; entre medio se reusa
+
+# ── Base de datos ──
+DB_POOL_SIZE = 8   # conexiones del pool compartido (máx. 32 en mysql.connector)
+
+# ── Presencia (escritura diferida de estado_persona) ──
+PRESENCIA_FLUSH_S   = 2.0   # volcado periódico de estados y últimos avistamientos
+PRESENCIA_FLUSH_MAX = 200   # o antes, si hay tantas personas pendientes
+
+# ── Sumidero de eventos (asistencias / salidas) ──
+EVENTOS_COLA_MAX     = 1000                  # eventos en memoria antes de rechazar
+EVENTOS_LOTE_MAX     = 50                    # filas por INSERT
+EVENTOS_DIARIO_DIR   = "eventos_pendientes"  # eventos aún no confirmados en la BD
+EVENTOS_REINTENTO_S  = 2.0                   # espera entre reintentos si la BD falla
+EVENTOS_MAX_INTENTOS = 5                     # fallos no transitorios de un lote antes de partirlo
+EVENTOS_FALLIDOS_DIR = "eventos_fallidos"    # eventos que ni solos se pudieron insertar
+
+# ── Antirrebote de salidas ──
+SALIDA_VENTANA_S  = 2.0    # duración de un pase: se emite el mejor recorte de la ventana
+SALIDA_COOLDOWN_S = 60.0   # sin nuevo pase mientras se la siga viendo y hasta N s después
+
+# ── Resumen por cámara (analitica.py) ──
+RESUMEN_VENTANA    = 5     # frames de la ventana de tendencia
+RESUMEN_MIN_S      = 0.2   # como máximo 5 resúmenes/s aunque cambie en cada frame
+RESUMEN_REFRESCO_S = 2.0   # sin cambios, se reenvía cada N s para visores nuevos
+
+# ── Logging (bitacora.py) ──
+LOG_NIVEL      = "INFO"   # DEBUG | INFO | WARNING | ERROR; se cambia en caliente con PUT /recon/log
+LOG_MUESTREO_S = 5.0      # mensajes por frame/lote: uno por clave cada N s
+
+# ── Modelos por usuario (almacen_modelo.py) ──
+MODELOS_DIR      = "modelo_final"   # = "carpeta_salida" de configuracion.json
+MODELO_VERSIONES = 3                # versiones publicadas que se conservan
+MODELO_VIGILANCIA_S = 2.0   # cada cuánto se revisa actual.json para cargar versiones nuevas
+TABLA_PERSONAS_TTL_S = 60.0  # nombres / departamentos / horarios se releen al menos cada N s
+
+# ── Tipo de índice por tamaño del padrón (indices.py) ──
+INDICE_HNSW_DESDE           = 5000     # vectores a partir de los cuales se usa HNSW
+INDICE_IVFPQ_DESDE          = 50000    # … e IVF-PQ
+INDICE_HNSW_M               = 32       # vecinos por nodo del grafo
+INDICE_HNSW_EF_CONSTRUCCION = 200
+INDICE_HNSW_EF_BUSQUEDA     = 64       # más alto = más recall, más latencia
+INDICE_IVF_NLIST            = 0        # listas invertidas; 0 = 4·√n
+INDICE_IVF_NPROBE           = 16       # listas visitadas por consulta
+INDICE_PQ_M                 = 64       # subcuantizadores = bytes por vector (512 / 64 = 8 dims c/u)
+INDICE_REPORTE_CONSULTAS    = 1000     # consultas del reporte recall/latencia
+INDICE_REPORTE_INCREMENTAL  = 100      # … en corridas incrementales (0 = se conserva el reporte anterior)
+INDICE_REPORTE_RUIDO        = 0.02     # ruido gaussiano sobre cada consulta (≈ rostro en vivo)
+
+# ── Varias imágenes por persona (indices.buscar_identidad) ──
+IDENT_AGREGACION        = "max"   # max | media | centroide: cómo se junta el puntaje de las imágenes de una persona
+IDENT_VECINOS           = 10      # vecinos recuperados por consulta para agregar ("media")
+IDENT_FILTRO_PROTOTIPOS = 0.25    # primer paso contra los centroides: por debajo, desconocido sin
+                                  # buscar en el índice completo (0 = apagado); < IDENT_UMBRAL_SALIDA
@@ -1,10 +1,42 @@
 # ✅ omniface-backend/database.py
+from threading import Lock
+
 import mysql.connector
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+
+from config import DB_POOL_SIZE
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "",
+    "database": "omniface",
+}
+
+# Pool compartido por todo el proceso (se crea al primer uso).
+# conn.close() sobre una conexión del pool la devuelve al pool.
+_pool = None
+_pool_lock = Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="omniface",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+    return _pool
+
 
 def get_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="omniface"
-    )
+    try:
+        return _get_pool().get_connection()
+    except PoolError:
+        # Pool agotado (muchos endpoints a la vez): conexión suelta como antes
+        return mysql.connector.connect(**DB_CONFIG)
@@ -4,6 +4,7 @@ from database import get_connection
 from protected import verificar_token, DatosToken
 from datetime import time as dt_time, timedelta
 import mysql.connector
+from tabla_personas import TablaPersonas
 
 departamentos_router = APIRouter(prefix="/departamentos", tags=["Departamentos"])
 
@@ -104,6 +105,7 @@ def modificar_departamento(
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Departamento no encontrado")
         conn.commit()
+        TablaPersonas.invalidar(usuario.id)   # horas Temprano/Tarde en vivo
         return JSONResponse(content={"mensaje": "Departamento actualizado"})
     except mysql.connector.Error as e:
         print(f"[ERROR] Modificar departamento: {str(e)}")
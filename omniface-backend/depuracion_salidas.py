@@ -0,0 +1,75 @@
+# ✅ omniface-backend/depuracion_salidas.py
+"""
+Antirrebote de salidas por persona y cámara.
+
+Un "pase" empieza la primera vez que se ve a una persona conocida y dura
+SALIDA_VENTANA_S (o menos, si deja de verse antes). Durante el pase sólo se
+guarda el mejor recorte según calidad_rostro (nitidez × iluminación); al
+cerrarse se emite una única salida con ese recorte.
+
+Después, mientras la persona siga apareciendo en la cámara y hasta
+SALIDA_COOLDOWN_S después de la última vez que se la vio, no se abre otro
+pase: quedarse frente a la puerta no genera más filas ni más JPEG.
+"""
+from config import SALIDA_VENTANA_S, SALIDA_COOLDOWN_S
+
+
+class Pase:
+    __slots__ = ("clave", "inicio", "ultimo_visto", "puntaje", "recorte", "datos")
+
+    def __init__(self, clave, ahora: float):
+        self.clave        = clave
+        self.inicio       = ahora
+        self.ultimo_visto = ahora
+        self.puntaje      = -1.0
+        self.recorte      = None
+        self.datos        = None     # lo que el llamador necesite para el evento
+
+
+class DepuradorSalidas:
+    """Uno por sesión (= por cámara). Lo usa sólo el bucle de stream()."""
+
+    def __init__(self, ventana: float = SALIDA_VENTANA_S, cooldown: float = SALIDA_COOLDOWN_S):
+        self.ventana   = ventana
+        self.cooldown  = cooldown
+        self._abiertos = {}     # clave → Pase
+        self._bloqueo  = {}     # clave → monotonic hasta el que no se abre otro pase
+        self._proxima_poda = 0.0
+
+    def observar(self, clave, ahora: float, puntaje: float, recorte_fn, datos=None):
+        """
+        Registra que `clave` se vio con calidad `puntaje`. `recorte_fn()` sólo
+        se llama si este frame pasa a ser el mejor del pase.
+        """
+        if ahora >= self._proxima_poda:
+            self.podar(ahora)
+        if clave not in self._abiertos:
+            if self._bloqueo.get(clave, 0.0) > ahora:
+                self._bloqueo[clave] = ahora + self.cooldown   # sigue a la vista
+                return
+            self._abiertos[clave] = Pase(clave, ahora)
+        pase = self._abiertos[clave]
+        pase.ultimo_visto = ahora
+        if puntaje > pase.puntaje:
+            pase.puntaje = puntaje
+            pase.recorte = recorte_fn()
+            pase.datos   = datos
+
+    def listos(self, ahora: float, todos: bool = False) -> list:
+        """Pases cerrados (ventana cumplida o persona ausente), listos para emitir."""
+        return [
+            p for p in self._abiertos.values()
+            if todos or ahora - p.inicio >= self.ventana or ahora - p.ultimo_visto >= self.ventana
+        ]
+
+    def confirmar(self, pase: Pase, emitido: bool = True):
+        """Cierra el pase y activa el cooldown; si no se pudo emitir queda abierto."""
+        if not emitido:
+            return
+        self._abiertos.pop(pase.clave, None)
+        self._bloqueo[pase.clave] = pase.ultimo_visto + self.cooldown
+
+    def podar(self, ahora: float):
+        """Olvida los cooldowns vencidos; observar() la llama cada `cooldown` segundos."""
+        self._bloqueo = {k: t for k, t in self._bloqueo.items() if t > ahora}
+        self._proxima_poda = ahora + self.cooldown
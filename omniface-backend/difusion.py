@@ -0,0 +1,202 @@
+# ✅ omniface-backend/difusion.py
+"""
+Difusión de una cámara a varios visores.
+
+Un CamaraHub por (user_id, cam_id, modo) corre una sola RecognitionSession:
+la inferencia se hace una vez por frame y el resultado se publica a todos los
+WebSocket suscritos. Dibujo, imencode y serialización son perezosos: cada
+frame se anota / codifica sólo si algún visor pide esa vista y se serializa
+a lo sumo una vez por (protocolo, vista); el resultado se comparte.
+
+Cada visor tiene su propia cola corta (HUB_COLA_SUSCRIPTOR): si no alcanza a
+enviar, se descarta su frame más viejo y el resto de los visores no se
+entera.
+
+Crear la sesión lee la BD (asistencias del día), carga el modelo y abre la
+cámara: se hace en un hilo aparte para no frenar los demás streams del
+event loop.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from recognition_core import RecognitionSession
+from transporte import serializar, enviar, dumps, codificar_jpeg
+from config import HUB_COLA_SUSCRIPTOR
+from bitacora import obtener
+from metricas import Metricas
+
+log = obtener(__name__)
+
+
+class Paquete:
+    """Un frame procesado; imagen y serialización se calculan al primer uso."""
+    __slots__ = ("meta", "frame", "anotar", "_jpeg", "_cache")
+
+    def __init__(self, meta: dict, frame, anotar):
+        self.meta   = meta
+        self.frame  = frame
+        self.anotar = anotar       # () → copia del frame con overlays
+        self._jpeg  = {}
+        self._cache = {}
+
+    def jpeg(self, vista: str) -> bytes:
+        if vista == "datos":
+            return b""
+        buf = self._jpeg.get(vista)
+        if buf is None:
+            img = self.anotar() if vista == "anotado" else self.frame
+            with Metricas.medir("codificacion"):
+                buf = self._jpeg[vista] = codificar_jpeg(img)
+        return buf
+
+    def para(self, protocolo: str, vista: str):
+        clave = (protocolo, vista)
+        datos = self._cache.get(clave)
+        if datos is None:
+            datos = self._cache[clave] = serializar(protocolo, self.meta, self.jpeg(vista))
+        return datos
+
+
+class Suscriptor:
+    def __init__(self, ws, protocolo: str, vista: str, video_fps: float):
+        self.ws           = ws
+        self.protocolo    = protocolo
+        self.vista        = vista
+        self.intervalo    = 1.0 / video_fps if video_fps > 0 else 0.0
+        self.ultimo_video = 0.0
+        self.cola         = asyncio.Queue(maxsize=HUB_COLA_SUSCRIPTOR)
+        self.descartados  = 0
+
+    def vista_actual(self) -> str:
+        """Con video_fps, los frames entre dos imágenes viajan como "datos"."""
+        if self.vista == "datos" or not self.intervalo:
+            return self.vista
+        ahora = time.monotonic()
+        if ahora - self.ultimo_video < self.intervalo:
+            return "datos"
+        self.ultimo_video = ahora
+        return self.vista
+
+    def ofrecer(self, paquete):
+        """Encola sin bloquear; si el visor va atrasado se pierde el frame más viejo."""
+        if self.cola.full():
+            self.cola.get_nowait()
+            self.descartados += 1
+        self.cola.put_nowait(paquete)
+
+
+class CamaraHub:
+    """Productor único (RecognitionSession.stream) → N suscriptores."""
+
+    def __init__(self, clave, sesion: RecognitionSession):
+        self.clave        = clave
+        self.sesion       = sesion
+        self.suscriptores = set()
+        self.refs         = 0
+        self.error        = None
+        self._tarea       = asyncio.get_running_loop().create_task(self._producir())
+
+    @property
+    def activo(self) -> bool:
+        return not self._tarea.done()
+
+    async def _producir(self):
+        try:
+            await self.sesion.stream(self.publicar)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception("Hub %s detenido: %s", self.clave, e)
+            self.error = str(e)
+            for s in self.suscriptores:
+                s.ofrecer(None)        # fin de transmisión
+
+    def publicar(self, meta: dict, frame, anotar):
+        paquete = Paquete(meta, frame, anotar)
+        for s in self.suscriptores:
+            s.ofrecer(paquete)
+
+    async def atender(self, ws, protocolo: str, vista: str = "anotado", video_fps: float = 0.0):
+        """Envía los frames del hub a `ws` hasta que se desconecte o el hub falle."""
+        s = Suscriptor(ws, protocolo, vista, video_fps)
+        self.suscriptores.add(s)
+        try:
+            if self.activo:
+                while (paquete := await s.cola.get()) is not None:
+                    datos = paquete.para(protocolo, s.vista_actual())
+                    with Metricas.medir("envio"):
+                        await enviar(ws, datos)
+            if self.error:
+                await ws.send_text(dumps({"type": "error", "detail": self.error}).decode("utf-8"))
+        finally:
+            self.suscriptores.discard(s)
+            if s.descartados:
+                log.debug("Hub %s: visor descartó %d frames", self.clave, s.descartados)
+
+    async def cerrar(self):
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        await self.sesion.close()
+
+
+class HubManager:
+    """
+    Devuelve el CamaraHub de (user_id, cam_id, modo), como VideoManager con
+    las cámaras. Todo corre en el event loop, así que no hace falta lock;
+    sólo la construcción de la sesión va a un hilo (uno, así VideoManager e
+    InferenceManager se siguen creando de a una sesión por vez).
+    """
+    _hubs: dict = {}
+    _creando: dict = {}       # clave → Task que construye el hub (visores simultáneos la comparten)
+    _constructor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sesiones")
+
+    @classmethod
+    async def get(cls, user_id: int, cam_id: int, modo: str) -> CamaraHub:
+        clave = (user_id, cam_id, modo)
+        hub = cls._hubs.get(clave)
+        if hub is None or not hub.activo:
+            tarea = cls._creando.get(clave)
+            if tarea is None:
+                tarea = cls._creando[clave] = asyncio.get_running_loop().create_task(cls._crear(clave))
+            # RecognitionSession puede lanzar (modelo inexistente, etc.)
+            hub = await asyncio.shield(tarea)
+        hub.refs += 1
+        return hub
+
+    @classmethod
+    async def _crear(cls, clave) -> CamaraHub:
+        try:
+            sesion = await asyncio.get_running_loop().run_in_executor(
+                cls._constructor, RecognitionSession, *clave
+            )
+            hub = cls._hubs[clave] = CamaraHub(clave, sesion)
+            return hub
+        finally:
+            cls._creando.pop(clave, None)
+
+    @classmethod
+    async def release(cls, hub: CamaraHub):
+        hub.refs -= 1
+        if hub.refs > 0:
+            return
+        if cls._hubs.get(hub.clave) is hub:
+            del cls._hubs[hub.clave]
+        await hub.cerrar()
+
+    @classmethod
+    def resumen(cls, usuario_id: int = None) -> dict:
+        """Visores por hub; con `usuario_id`, sólo los hubs de ese usuario."""
+        return {
+            f"{uid}/camara_{cam}/{modo}": len(hub.suscriptores)
+            for (uid, cam, modo), hub in list(cls._hubs.items())
+            if usuario_id is None or uid == usuario_id
+        }
+
+
+Metricas.medidor("omniface_hubs_activos", "Cámaras transmitiendo (un hub por usuario/cámara/modo)",
+                 lambda: len(HubManager._hubs))
+Metricas.medidor("omniface_visores", "WebSockets conectados a algún hub",
+                 lambda: sum(len(h.suscriptores) for h in list(HubManager._hubs.values())))
@@ -0,0 +1,126 @@
+# ✅ omniface-backend/emociones.py
+"""
+Clasificación de emociones por lotes.
+
+Todos los rostros de un lote de inferencia se recortan, se apilan en un solo
+tensor (N, 48, 48, 1) y se clasifican en una única llamada al modelo.
+
+Backends:
+  • "onnx"  → onnxruntime sobre emotion_model.onnx (no necesita TensorFlow)
+  • "keras" → tensorflow.keras sobre emotion_model.h5
+  • "auto"  → onnx si existe el .onnx y onnxruntime está instalado, si no keras
+
+Para generar el .onnx (una sola vez, en una máquina con TensorFlow):
+    python emociones.py convertir
+"""
+import os
+import sys
+import cv2
+import numpy as np
+from config import EMOCION_BACKEND, EMOCION_MODELO_H5, EMOCION_MODELO_ONNX
+
+ETIQUETAS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
+TAM_ENTRADA = 48
+
+
+def preprocesar(frame, bbox):
+    """Recorte BGR → gris 48×48 normalizado, o None si el bbox queda vacío."""
+    x1, y1, x2, y2 = map(int, bbox)
+    face_region = frame[max(0, y1):y2, max(0, x1):x2]
+    if face_region.size == 0:
+        return None
+    gray = cv2.cvtColor(face_region, cv2.COLOR_BGR2GRAY)
+    gray = cv2.convertScaleAbs(gray, alpha=1.2, beta=10)
+    resized = cv2.resize(gray, (TAM_ENTRADA, TAM_ENTRADA))
+    return resized.astype('float32') / 255.0
+
+
+class EmotionClassifier:
+    """Envoltura común para los backends keras / onnx."""
+
+    def __init__(self, backend: str, modelo):
+        self.backend = backend
+        self.modelo  = modelo
+        if backend == "onnx":
+            self._input_name = modelo.get_inputs()[0].name
+
+    # ---------- carga ----------
+    @classmethod
+    def cargar(cls, backend: str = EMOCION_BACKEND,
+               ruta_h5: str = EMOCION_MODELO_H5, ruta_onnx: str = EMOCION_MODELO_ONNX):
+        if backend == "auto":
+            backend = "onnx" if os.path.exists(ruta_onnx) and cls._hay_onnxruntime() else "keras"
+
+        if backend == "onnx":
+            import onnxruntime
+            sess = onnxruntime.InferenceSession(
+                ruta_onnx, providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
+            )
+            return cls("onnx", sess)
+
+        if backend == "keras":
+            from tensorflow.keras.models import load_model  # sólo si se usa keras
+            return cls("keras", load_model(ruta_h5))
+
+        raise ValueError(f"Backend de emociones desconocido: {backend}")
+
+    @staticmethod
+    def _hay_onnxruntime() -> bool:
+        try:
+            import onnxruntime  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    # ---------- inferencia ----------
+    def predecir(self, lote: np.ndarray) -> np.ndarray:
+        """lote (N, 48, 48, 1) float32 → probabilidades (N, 7)."""
+        if len(lote) == 0:
+            return np.zeros((0, len(ETIQUETAS)), dtype=np.float32)
+        if self.backend == "onnx":
+            return self.modelo.run(None, {self._input_name: lote})[0]
+        # model(x) evita el costo fijo de predict() (callbacks, tf.data, …)
+        return np.asarray(self.modelo(lote, training=False))
+
+    def clasificar(self, frames, caras):
+        """
+        Emoción de cada rostro de un lote en una sola llamada.
+
+        `caras` es [(idx_frame, Face), …]; devuelve (etiquetas, probs) alineados
+        con `caras`. Los rostros sin recorte válido quedan como "N/A" / None.
+        """
+        etiquetas = ["N/A"] * len(caras)
+        probs     = [None] * len(caras)
+        recortes, posiciones = [], []
+        for k, (i, r) in enumerate(caras):
+            img = preprocesar(frames[i], r.bbox)
+            if img is not None:
+                recortes.append(img)
+                posiciones.append(k)
+        if not recortes:
+            return etiquetas, probs
+
+        lote = np.stack(recortes)[..., np.newaxis]
+        pred = self.predecir(lote)
+        for k, p in zip(posiciones, pred):
+            etiquetas[k] = ETIQUETAS[int(np.argmax(p))]
+            probs[k] = p
+        return etiquetas, probs
+
+
+def convertir_a_onnx(ruta_h5: str = EMOCION_MODELO_H5, ruta_onnx: str = EMOCION_MODELO_ONNX):
+    """Exporta el .h5 a ONNX con lote dinámico (requiere tensorflow + tf2onnx)."""
+    import tensorflow as tf
+    import tf2onnx
+    modelo = tf.keras.models.load_model(ruta_h5)
+    spec = (tf.TensorSpec((None, TAM_ENTRADA, TAM_ENTRADA, 1), tf.float32, name="entrada"),)
+    tf2onnx.convert.from_keras(modelo, input_signature=spec, output_path=ruta_onnx)
+    print(f"[INFO] Modelo de emociones exportado a {ruta_onnx}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "convertir":
+        convertir_a_onnx()
+    else:
+        print("Uso: python emociones.py convertir")
+        sys.exit(1)
@@ -0,0 +1,180 @@
+# ✅ omniface-backend/enrolamiento.py
+"""
+Pipeline de enrolamiento por etapas (lo usa generar_embeddings.py).
+
+  1. revisión    ProcessPoolExecutor: decodifica cada imagen y aplica los
+                 filtros que no necesitan el modelo (resolución, enfoque,
+                 oscuridad). Escala con los núcleos: cada proceso tiene su
+                 propio intérprete, sin GIL compartido.
+  2. inferencia  el proceso principal, único dueño del modelo: detección
+                 en lote, pose y embeddings en lote (inferencia_lote.py)
+                 de hasta `lote` imágenes aprobadas.
+  3. colector    deja cada resultado en la posición de su imagen: la salida
+                 queda alineada con la entrada aunque las revisiones
+                 terminen en otro orden.
+
+Mientras corre la inferencia los procesos siguen revisando. A lo sumo
+`lote + 2·n_procesos` imágenes decodificadas esperan en memoria: si la
+inferencia se atrasa no se piden más decodificaciones.
+
+Este módulo no tiene efectos al importarse: los procesos hijos (spawn en
+Windows) sólo necesitan `revisar`.
+"""
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+import numpy as np
+from insightface.app.common import Face
+from tqdm import tqdm
+
+from inferencia_lote import detectar_lote, embeddings_lote
+
+POSE_MAXIMA = 30          # grados de yaw / pitch / roll
+OSCURIDAD_MINIMA = 40     # brillo medio en gris
+
+
+# ========= VALIDACIONES ==========
+def imagen_borrosa(img, umbral_enfoque):
+    gris = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.Laplacian(gris, cv2.CV_64F).var() < umbral_enfoque
+
+def imagen_oscura(img):
+    return np.mean(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)) < OSCURIDAD_MINIMA
+
+def rostro_centrado(rostro, shape):
+    x1, y1, x2, y2 = rostro.bbox.astype(int)
+    h, w = shape[:2]
+    return x1 > 10 and y1 > 10 and x2 < w - 10 and y2 < h - 10
+
+def guardar_fallo(carpeta_errores, img, archivo, motivo):
+    if carpeta_errores:
+        cv2.imwrite(os.path.join(carpeta_errores, motivo, archivo), img)
+
+
+# ========= ETAPA 1: revisión (en los procesos) ==========
+def _iniciar_proceso():
+    cv2.setNumThreads(1)      # el paralelismo ya lo dan los procesos
+
+
+def revisar(pos, url, archivo, umbral_enfoque, resolucion_minima, carpeta_errores):
+    """(pos, img, error): img es None si la imagen no pasó los filtros."""
+    try:
+        img = cv2.imread(url)
+        if img is None or img.ndim != 3 or img.shape[2] != 3:
+            return pos, None, "formato inválido"
+        if img.shape[0] < resolucion_minima[1] or img.shape[1] < resolucion_minima[0]:
+            guardar_fallo(carpeta_errores, img, archivo, "resolucion")
+            return pos, None, "resolución baja"
+        if imagen_borrosa(img, umbral_enfoque):
+            guardar_fallo(carpeta_errores, img, archivo, "borrosas")
+            return pos, None, "borrosa"
+        if imagen_oscura(img):
+            guardar_fallo(carpeta_errores, img, archivo, "oscura")
+            return pos, None, "oscura"
+        return pos, img, None
+    except Exception:
+        return pos, None, f"error:\n{traceback.format_exc(limit=1)}"
+
+
+class PipelineEnrolamiento:
+    """
+    `procesar([(url, archivo), …])` → [(embedding, error, norma), …] en el
+    mismo orden; `archivo` es el nombre con el que se guarda si se rechaza.
+    """
+
+    def __init__(self, app, n_procesos: int = 0, lote: int = 32, carpeta_errores: str = None,
+                 umbral_enfoque: float = 40.0, resolucion_minima=(100, 100)):
+        self.app               = app
+        self.n_procesos        = min(61, n_procesos or os.cpu_count() or 1)   # 61: tope de Windows
+        self.lote              = max(1, lote)
+        self.carpeta_errores   = carpeta_errores
+        self.umbral_enfoque    = umbral_enfoque
+        self.resolucion_minima = tuple(resolucion_minima)
+        self.max_en_espera     = self.lote + 2 * self.n_procesos
+        self.pose_model        = app.models.get("landmark_3d_68")
+
+    # ========= ETAPA 2: inferencia (este proceso) ==========
+    def _inferir(self, lote):
+        """[(pos, archivo, img)] → [(pos, (embedding, error, norma))]."""
+        try:
+            return self._inferir_lote(lote)
+        except Exception:
+            error = f"error:\n{traceback.format_exc(limit=1)}"
+            return [(pos, (None, error, None)) for pos, _, _ in lote]
+
+    def _inferir_lote(self, lote):
+        salida = []
+        aprobadas, caras = [], []         # imágenes con rostro válido y su Face
+        detecciones = detectar_lote(self.app.det_model, [img for _, _, img in lote])
+        for (pos, archivo, img), (bboxes, kpss) in zip(lote, detecciones):
+            if bboxes.shape[0] == 0:
+                guardar_fallo(self.carpeta_errores, img, archivo, "sin_rostro")
+                salida.append((pos, (None, "sin rostro", None)))
+                continue
+            rostro = Face(bbox=bboxes[0, 0:4], kps=kpss[0] if kpss is not None else None,
+                          det_score=bboxes[0, 4])
+            if not rostro_centrado(rostro, img.shape):
+                guardar_fallo(self.carpeta_errores, img, archivo, "cortado")
+                salida.append((pos, (None, "rostro fuera de marco", None)))
+                continue
+            if self.pose_model is not None:
+                self.pose_model.get(img, rostro)
+                if any(abs(a) > POSE_MAXIMA for a in rostro.pose):
+                    guardar_fallo(self.carpeta_errores, img, archivo, "pose")
+                    salida.append((pos, (None, "pose incorrecta", None)))
+                    continue
+            caras.append((len(aprobadas), rostro))
+            aprobadas.append((pos, archivo, img))
+
+        embeddings = embeddings_lote(self.app.models["recognition"], [img for _, _, img in aprobadas], caras)
+        for (pos, archivo, img), emb in zip(aprobadas, embeddings):
+            if np.isnan(emb).any():
+                salida.append((pos, (None, "embedding inválido", None)))
+                continue
+            norma = np.linalg.norm(emb)
+            if not (20.0 < norma < 30.0):
+                guardar_fallo(self.carpeta_errores, img, archivo, "norma")
+                salida.append((pos, (None, "norma inválida", None)))
+                continue
+            salida.append((pos, (emb.astype(np.float32), None, norma)))
+        return salida
+
+    # ========= ETAPA 3: colector ==========
+    def procesar(self, imagenes):
+        resultados = [None] * len(imagenes)
+        tareas = iter(enumerate(imagenes))
+        en_vuelo, listas = set(), []      # revisiones pendientes / aprobadas esperando lote
+        quedan = True
+        with ProcessPoolExecutor(max_workers=self.n_procesos, initializer=_iniciar_proceso) as pool, \
+                tqdm(total=len(imagenes)) as barra:
+            while True:
+                while quedan and len(en_vuelo) + len(listas) < self.max_en_espera:
+                    siguiente = next(tareas, None)
+                    if siguiente is None:
+                        quedan = False
+                        break
+                    pos, (url, archivo) = siguiente
+                    en_vuelo.add(pool.submit(revisar, pos, url, archivo, self.umbral_enfoque,
+                                             self.resolucion_minima, self.carpeta_errores))
+                if not en_vuelo and not listas:
+                    break
+
+                if en_vuelo and len(listas) < self.lote:
+                    hechas, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                    for futuro in hechas:
+                        pos, img, error = futuro.result()
+                        if img is None:
+                            resultados[pos] = (None, error, None)
+                            barra.update()
+                        else:
+                            listas.append((pos, imagenes[pos][1], img))
+
+                # lote lleno, o lo que quede cuando ya no hay revisiones en curso
+                if len(listas) >= self.lote or (listas and not en_vuelo):
+                    lote, listas = listas[:self.lote], listas[self.lote:]
+                    for pos, resultado in self._inferir(lote):
+                        resultados[pos] = resultado
+                    barra.update(len(lote))
+        return resultados
@@ -0,0 +1,261 @@
+# ✅ omniface-backend/eventos.py
+"""
+Sumidero asíncrono de eventos de asistencia / salida.
+
+stream() sólo arma el evento y lo encola (sin tocar disco ni MySQL). Un hilo
+escritor, por cada lote:
+  1. codifica y guarda el recorte JPEG de cada evento,
+  2. deja el evento en el diario (EVENTOS_DIARIO_DIR/<evento_id>.json),
+  3. inserta las filas con un INSERT IGNORE por tabla (executemany),
+  4. borra del diario los eventos confirmados.
+
+Entrega al menos una vez: al arrancar (hook de startup en main.py) se
+re-encolan los eventos que quedaron en el diario y, si la BD falla, el lote
+se reintenta. Cada fila lleva un
+`evento_id` con índice UNIQUE (migraciones/001_evento_id.sql), así que un
+reintento nunca duplica registros. Un evento que se pierde antes de llegar
+al diario (caída con la cola llena en memoria) no quedó en la BD, de modo
+que la persona se vuelve a registrar la próxima vez que se la vea.
+
+Una BD caída (errores de conexión) se reintenta sin límite. Cualquier otro
+error (p. ej. falta aplicar la migración) cuenta: tras EVENTOS_MAX_INTENTOS
+el lote se parte en dos para aislar al evento culpable, y un evento que
+falla solo pasa de EVENTOS_DIARIO_DIR a EVENTOS_FALLIDOS_DIR con el error.
+Así la cola nunca queda trabada. Para reintentarlos, moverlos de vuelta al
+diario y reiniciar.
+"""
+import json
+import os
+import queue
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from threading import Thread, Lock, Event
+
+import cv2
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
+
+from database import get_connection
+from config import (
+    EVENTOS_COLA_MAX, EVENTOS_LOTE_MAX, EVENTOS_DIARIO_DIR, EVENTOS_REINTENTO_S,
+    EVENTOS_MAX_INTENTOS, EVENTOS_FALLIDOS_DIR,
+)
+from bitacora import obtener
+from metricas import Metricas
+
+log = obtener(__name__)
+
+_SQL = {
+    "asistencia": ("""
+        INSERT IGNORE INTO asistencias
+        (evento_id, persona_id, usuario_id, departamento_id, nombre, estado, tipo, foto_path, fecha, hora)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    """, ("evento_id", "persona_id", "usuario_id", "departamento_id", "nombre",
+          "estado", "tipo", "foto_path", "fecha", "hora")),
+    "salida": ("""
+        INSERT IGNORE INTO salidas
+        (evento_id, persona_id, usuario_id, departamento_id, nombre, foto_path, fecha, hora)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+    """, ("evento_id", "persona_id", "usuario_id", "departamento_id", "nombre",
+          "foto_path", "fecha", "hora")),
+}
+
+
+class SumideroEventos:
+    """Estado global (clase) como Presencia."""
+    _cola = queue.Queue(maxsize=EVENTOS_COLA_MAX)
+    _lock = Lock()
+    _hilo: Thread = None
+    _parar = Event()
+    _diario = Path(EVENTOS_DIARIO_DIR)
+    _fallidos = Path(EVENTOS_FALLIDOS_DIR)
+
+    @classmethod
+    def iniciar(cls):
+        """Arranca el escritor, que primero re-encola lo que haya en el diario."""
+        cls._asegurar_hilo()
+
+    # ---------- productor (event loop) ----------
+    @classmethod
+    def publicar(cls, evento: dict, recorte=None) -> bool:
+        """
+        Encola sin bloquear. `evento["tipo_evento"]` es "asistencia" o "salida".
+        Devuelve False si la cola está llena (el llamador puede reintentar luego).
+        """
+        evento.setdefault("evento_id", uuid.uuid4().hex)
+        cls._asegurar_hilo()
+        try:
+            cls._cola.put_nowait((evento, recorte))
+            return True
+        except queue.Full:
+            log.error("Cola de eventos llena, se descarta %s de %s", evento["tipo_evento"], evento["nombre"])
+            return False
+
+    # ---------- escritor ----------
+    @classmethod
+    def _asegurar_hilo(cls):
+        if cls._hilo is None or not cls._hilo.is_alive():
+            with cls._lock:
+                if cls._hilo is None or not cls._hilo.is_alive():
+                    cls._parar.clear()
+                    cls._hilo = Thread(target=cls._bucle, name="eventos", daemon=True)
+                    cls._hilo.start()
+
+    @classmethod
+    def _bucle(cls):
+        recuperados = cls._recuperar_diario()
+        lotes = deque(recuperados[i:i + EVENTOS_LOTE_MAX]
+                      for i in range(0, len(recuperados), EVENTOS_LOTE_MAX))
+        while True:
+            if not lotes:
+                lote = cls._tomar_lote()
+                if not lote:
+                    if cls._parar.is_set() and cls._cola.empty():
+                        return
+                    continue
+                lotes.append(cls._preparar(lote))
+
+            eventos = lotes.popleft()
+            error = cls._escribir(eventos)
+            if error is None:
+                for ev in eventos:
+                    (cls._diario / f"{ev['evento_id']}.json").unlink(missing_ok=True)
+            elif cls._parar.is_set():
+                return                                    # quedan en el diario
+            elif len(eventos) > 1:
+                mitad = len(eventos) // 2
+                log.warning("Lote de %d eventos sigue fallando, se parte en dos", len(eventos))
+                lotes.extendleft((eventos[mitad:], eventos[:mitad]))
+            else:
+                cls._apartar(eventos[0], error)
+
+    @classmethod
+    def _tomar_lote(cls) -> list:
+        """Hasta EVENTOS_LOTE_MAX (evento, recorte) de la cola; espera poco si está vacía."""
+        try:
+            lote = [cls._cola.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(lote) < EVENTOS_LOTE_MAX:
+            try:
+                lote.append(cls._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    @classmethod
+    def _preparar(cls, lote: list) -> list:
+        """Guarda los recortes y anota cada evento en el diario antes de la BD."""
+        eventos = []
+        for evento, recorte in lote:
+            if recorte is not None:
+                cls._guardar_captura(evento["foto_path"], recorte)
+            cls._anotar_diario(evento)
+            eventos.append(evento)
+        return eventos
+
+    @classmethod
+    def _escribir(cls, eventos: list):
+        """
+        Inserta el lote con reintentos. Devuelve None si se escribió, o el
+        último error tras EVENTOS_MAX_INTENTOS fallos que no son de conexión
+        (o si se pidió parar mientras esperaba).
+        """
+        intentos = 0
+        while True:
+            try:
+                cls._insertar(eventos)
+                return None
+            except Exception as e:
+                Metricas.contar("omniface_bd_errores_total", tabla="eventos")
+                if not isinstance(e, (InterfaceError, OperationalError, PoolError)):
+                    intentos += 1
+                log.error("Inserción de %d eventos falló (intento %d/%d): %s",
+                          len(eventos), intentos, EVENTOS_MAX_INTENTOS, e)
+                if intentos >= EVENTOS_MAX_INTENTOS or cls._parar.wait(EVENTOS_REINTENTO_S):
+                    return e
+
+    @classmethod
+    def _apartar(cls, evento: dict, error: Exception):
+        """Saca del diario un evento que no entra en la BD ni solo."""
+        cls._fallidos.mkdir(parents=True, exist_ok=True)
+        destino = cls._fallidos / f"{evento['evento_id']}.json"
+        with open(destino, "w", encoding="utf-8") as f:
+            json.dump({**evento, "error": str(error)}, f, ensure_ascii=False)
+        (cls._diario / f"{evento['evento_id']}.json").unlink(missing_ok=True)
+        Metricas.contar("omniface_eventos_fallidos_total", tipo=evento.get("tipo_evento"))
+        log.error("Evento %s (%s de %s) apartado en %s: %s", evento["evento_id"],
+                  evento.get("tipo_evento"), evento.get("nombre"), destino, error)
+
+    @staticmethod
+    def _guardar_captura(path_foto: str, recorte):
+        try:
+            Path(path_foto).parent.mkdir(parents=True, exist_ok=True)
+            cv2.imwrite(path_foto, recorte)
+        except Exception as e:
+            log.error("No se pudo guardar captura %s: %s", path_foto, e)
+
+    @classmethod
+    def _anotar_diario(cls, evento: dict):
+        cls._diario.mkdir(parents=True, exist_ok=True)
+        destino = cls._diario / f"{evento['evento_id']}.json"
+        tmp = destino.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(evento, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, destino)
+
+    @classmethod
+    def _recuperar_diario(cls) -> list:
+        if not cls._diario.exists():
+            return []
+        pendientes = []
+        for p in sorted(cls._diario.glob("*.json")):
+            try:
+                with open(p, encoding="utf-8") as f:
+                    pendientes.append(json.load(f))
+            except (OSError, ValueError) as e:
+                log.error("Evento ilegible en el diario %s: %s", p, e)
+        if pendientes:
+            log.info("Reintentando %d eventos pendientes del diario", len(pendientes))
+        return pendientes
+
+    @staticmethod
+    def _insertar(eventos: list):
+        escritas = {}
+        with Metricas.medir("bd"):
+            conn = get_connection()
+            try:
+                cursor = conn.cursor()
+                for tipo, (sql, campos) in _SQL.items():
+                    filas = [tuple(ev.get(c) for c in campos) for ev in eventos if ev["tipo_evento"] == tipo]
+                    if filas:
+                        cursor.executemany(sql, filas)
+                        escritas[tipo] = len(filas)
+                conn.commit()
+                cursor.close()
+            finally:
+                conn.close()
+        for tipo, n in escritas.items():
+            Metricas.contar("omniface_bd_filas_total", n, tabla=tipo)
+
+    @classmethod
+    def detener(cls, timeout: float = 5.0):
+        """Vacía la cola antes de apagar; lo que no alcance queda en el diario."""
+        cls._parar.set()
+        if cls._hilo is not None:
+            cls._hilo.join(timeout=timeout)
+
+    @classmethod
+    def pendientes(cls) -> int:
+        return cls._cola.qsize()
+
+
+def nuevo_evento(tipo_evento: str, **campos) -> dict:
+    return {"tipo_evento": tipo_evento, "evento_id": uuid.uuid4().hex, "creado": time.time(), **campos}
+
+
+Metricas.medidor("omniface_eventos_pendientes", "Eventos en cola esperando al escritor",
+                 SumideroEventos.pendientes)
@@ -1,6 +1,5 @@
 # ✅ omniface-backend/generar_embeddings.py
 import os
-import cv2
 import faiss
 import json
 import pickle
@@ -8,20 +7,23 @@ import logging
 import traceback
 import numpy as np
 import sys
-import csv
 import pymysql
-from tqdm import tqdm
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
 from logging.handlers import RotatingFileHandler
 from insightface.app import FaceAnalysis
+from enrolamiento import PipelineEnrolamiento
+from almacen_modelo import AlmacenEmbeddings, publicar, version_actual
+from indices import construir, tipo_para, tipo_de, admite_incremental, reporte
+from config import INDICE_REPORTE_INCREMENTAL
 
 # ========= CONFIG ==========
 CONFIG_PATH = "configuracion.json"
 DEFAULT_CONFIG = {
     "carpeta_imagenes": "imagenes_optimizadas",
     "carpeta_salida": "modelo_flatip",
-    "n_hilos": 8,
+    "n_procesos": 0,          # procesos de decodificación y filtros; 0 = uno por núcleo
+    "lote_inferencia": 32,    # imágenes por llamada al modelo
     "use_gpu": True,
     "umbral_enfoque": 40.0,
     "resolucion_minima": [100, 100],
@@ -32,177 +34,248 @@ with open(CONFIG_PATH, "r", encoding="utf-8") as f:
     user_config = json.load(f)
 config = {**DEFAULT_CONFIG, **user_config}
 
-# ========= PARÁMETROS ==========
-if len(sys.argv) != 2:
-    print("Uso: python generar_embeddings.py <usuario_id>")
-    sys.exit(1)
-
-USUARIO_ID = int(sys.argv[1])
-
-# ========= BASE DE DATOS ==========
-conn = pymysql.connect(host="localhost", user="root", password="", database="omniface")
-cursor = conn.cursor()
-cursor.execute("SELECT nombre_completo, imagen_mejorada FROM personas WHERE usuario_id = %s", (USUARIO_ID,))
-personas = [(nombre, os.path.join(config["carpeta_imagenes"], ruta)) for nombre, ruta in cursor.fetchall()]
-if not personas:
-    print(f"No hay imágenes para el usuario {USUARIO_ID}")
-    sys.exit(1)
-
-# ========= RUTAS ==========
-CARPETA_SALIDA = os.path.join(config["carpeta_salida"], f"usuario_{USUARIO_ID}")
-# Eliminar carpeta anterior si ya existe para sobrescribir (ANTES de crear logging)
-if os.path.exists(CARPETA_SALIDA):
-    import shutil
-    shutil.rmtree(CARPETA_SALIDA)
-CARPETA_ERRORES = os.path.join(CARPETA_SALIDA, "errores")
-os.makedirs(CARPETA_SALIDA, exist_ok=True)
-if config["guardar_rechazadas"]:
-    for sub in ["borrosas", "sin_rostro", "cortado", "resolucion", "oscura", "norma", "pose"]:
-        os.makedirs(os.path.join(CARPETA_ERRORES, sub), exist_ok=True)
-
-# ========= LOGGING ==========
-LOG_PATH = os.path.join(CARPETA_SALIDA, "procesamiento.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        RotatingFileHandler(LOG_PATH, maxBytes=5*1024*1024, backupCount=3),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-
-# ========= MODELO ==========
-try:
-    app = FaceAnalysis(name="antelopev2", providers=['CUDAExecutionProvider' if config["use_gpu"] else 'CPUExecutionProvider'])
-    app.prepare(ctx_id=0 if config["use_gpu"] else -1)
-except Exception:
-    logging.error(f"Error cargando modelo:\n{traceback.format_exc()}")
-    sys.exit(1)
-
-# ========= VALIDACIONES ==========
-def imagen_borrosa(img):
-    gris = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    return cv2.Laplacian(gris, cv2.CV_64F).var() < config["umbral_enfoque"]
-
-def imagen_oscura(img):
-    return np.mean(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)) < 40
-
-def rostro_centrado(rostro, shape):
-    x1, y1, x2, y2 = rostro.bbox.astype(int)
-    h, w = shape[:2]
-    return x1 > 10 and y1 > 10 and x2 < w - 10 and y2 < h - 10
-
-def guardar_fallo(img, nombre_archivo, motivo):
-    if config["guardar_rechazadas"]:
-        ruta = os.path.join(CARPETA_ERRORES, motivo, nombre_archivo)
-        cv2.imwrite(ruta, img)
-
-# ========= PROCESAR ==========
-def procesar_imagen(nombre, url):
-    try:
-        img = cv2.imread(url)
-        if img is None or img.shape[2] != 3:
-            return None, None, "formato inválido", None
-
-        if img.shape[0] < config["resolucion_minima"][1] or img.shape[1] < config["resolucion_minima"][0]:
-            guardar_fallo(img, nombre + ".jpg", "resolucion")
-            return None, None, "resolución baja", None
+# Los procesos de revisión de enrolamiento.py se crean con spawn en Windows e
+# importan este archivo como __mp_main__: argumentos, BD y modelo sólo acá.
+if __name__ == "__main__":
+    # ========= PARÁMETROS ==========
+    # Por defecto es incremental: sólo se embeben las imágenes nuevas o cambiadas
+    # (almacen.pkl) y el índice publicado se actualiza con remove_ids/add_with_ids.
+    # --completo vuelve a procesar todas las imágenes.
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3 and sys.argv[2] != "--completo"):
+        print("Uso: python generar_embeddings.py <usuario_id> [--completo]")
+        sys.exit(1)
 
-        if imagen_borrosa(img):
-            guardar_fallo(img, nombre + ".jpg", "borrosas")
-            return None, None, "borrosa", None
+    USUARIO_ID = int(sys.argv[1])
+    COMPLETO = len(sys.argv) == 3
 
-        if imagen_oscura(img):
-            guardar_fallo(img, nombre + ".jpg", "oscura")
-            return None, None, "oscura", None
+    # ========= BASE DE DATOS ==========
+    conn = pymysql.connect(host="localhost", user="root", password="", database="omniface")
+    cursor = conn.cursor()
+    # Una fila por imagen de referencia: la mejorada de cada persona + las de personas_imagenes
+    cursor.execute("""
+        SELECT id, nombre_completo, imagen_mejorada FROM personas
+        WHERE usuario_id = %s AND imagen_mejorada IS NOT NULL
+        UNION ALL
+        SELECT p.id, p.nombre_completo, pi.imagen FROM personas_imagenes AS pi
+        JOIN personas AS p ON p.id = pi.persona_id
+        WHERE p.usuario_id = %s
+    """, (USUARIO_ID, USUARIO_ID))
+    personas = [(pid, nombre, os.path.join(config["carpeta_imagenes"], ruta)) for pid, nombre, ruta in cursor.fetchall()]
+    if not personas:
+        print(f"No hay imágenes para el usuario {USUARIO_ID}")
+        sys.exit(1)
 
-        rostros = app.get(img)
-        if not rostros:
-            guardar_fallo(img, nombre + ".jpg", "sin_rostro")
-            return None, None, "sin rostro", None
+    # ========= RUTAS ==========
+    CARPETA_SALIDA = os.path.join(config["carpeta_salida"], f"usuario_{USUARIO_ID}")
+    # No se borra: ahí viven el almacén de embeddings y las versiones publicadas
+    CARPETA_ERRORES = os.path.join(CARPETA_SALIDA, "errores")
+    os.makedirs(CARPETA_SALIDA, exist_ok=True)
+    if config["guardar_rechazadas"]:
+        for sub in ["borrosas", "sin_rostro", "cortado", "resolucion", "oscura", "norma", "pose"]:
+            os.makedirs(os.path.join(CARPETA_ERRORES, sub), exist_ok=True)
 
-        rostro = rostros[0]
-        if not rostro_centrado(rostro, img.shape):
-            guardar_fallo(img, nombre + ".jpg", "cortado")
-            return None, None, "rostro fuera de marco", None
+    # ========= LOGGING ==========
+    LOG_PATH = os.path.join(CARPETA_SALIDA, "procesamiento.log")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            RotatingFileHandler(LOG_PATH, maxBytes=5*1024*1024, backupCount=3),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 
-        yaw, pitch, roll = rostro.pose
-        if abs(yaw) > 30 or abs(pitch) > 30 or abs(roll) > 30:
-            guardar_fallo(img, nombre + ".jpg", "pose")
-            return None, None, "pose incorrecta", None
 
-        emb = rostro.embedding
-        if emb is None or np.isnan(emb).any():
-            return None, None, "embedding inválido", None
+    # ========= MODELO ==========
+    try:
+        app = FaceAnalysis(name="antelopev2", providers=['CUDAExecutionProvider' if config["use_gpu"] else 'CPUExecutionProvider'])
+        app.prepare(ctx_id=0 if config["use_gpu"] else -1)
+    except Exception:
+        logging.error(f"Error cargando modelo:\n{traceback.format_exc()}")
+        sys.exit(1)
 
-        norma = np.linalg.norm(emb)
-        if not (20.0 < norma < 30.0):
-            guardar_fallo(img, nombre + ".jpg", "norma")
-            return None, None, "norma inválida", None
+# ========= EMBEDDINGS (incremental) ==========
+def actualizar_almacen(almacen, personas, pipeline, completo=False):
+    """
+    `personas`: [(persona_id, nombre, ruta_imagen)], una fila por imagen.
+    Embebe sólo las imágenes nuevas o cambiadas (todas con `completo`), quita
+    las que ya no están en la BD y las personas borradas. Devuelve
+    (cambiados, eliminados) como sets de persona_id: cambia una imagen, se
+    rehacen los vectores de la persona.
+    """
+    referencias = defaultdict(set)          # persona_id → rutas de sus imágenes
+    for pid, _, url in personas:
+        referencias[pid].add(url)
+    eliminados = set(almacen.personas) - set(referencias)
+    for pid in eliminados:
+        almacen.quitar(pid)
+    cambiados = {pid for pid, rutas in referencias.items() if almacen.podar_imagenes(pid, rutas)}
 
-        return nombre, emb.astype(np.float32), None, norma
+    pendientes = [p for p in personas if completo or not almacen.vigente(p[0], p[2])]
+    # archivo de rechazo: <nombre>_<imagen> para no pisar las otras imágenes de la persona
+    resultados = pipeline.procesar([
+        (url, f"{nombre}_{os.path.splitext(os.path.basename(url))[0]}.jpg") for _, nombre, url in pendientes
+    ])
+    for (pid, nombre, url), (emb, error, norma) in zip(pendientes, resultados):
+        almacen.poner(pid, url, nombre, emb, error, norma)
 
-    except Exception:
-        return None, None, f"error:\n{traceback.format_exc(limit=1)}", None
-
-# ========= EMBEDDINGS ==========
-def generar_embeddings():
-    nombres, embeddings, errores = [], [], []
-    with ThreadPoolExecutor(max_workers=config["n_hilos"]) as executor:
-        resultados = list(tqdm(executor.map(lambda p: procesar_imagen(p[0], p[1]), personas), total=len(personas)))
-    for nombre, emb, error, norma in resultados:
-        if error:
-            errores.append({"nombre": nombre, "error": error, "norma": norma})
-        else:
-            nombres.append(nombre)
-            embeddings.append(emb)
-    return np.array(embeddings, dtype=np.float32), nombres, errores
+    # Un cambio de nombre no requiere re-embeber
+    for pid, nombre, _ in personas:
+        almacen.personas[pid]["nombre"] = nombre
+    return cambiados | {p[0] for p in pendientes}, eliminados
 
 # ========= FAISS ==========
-def crear_indice_faiss(embeddings):
+# Las etiquetas del índice son persona_id: el reconocimiento resuelve nombre,
+# foto y departamento con tabla_personas.TablaPersonas. El tipo (flat / hnsw /
+# ivfpq) depende del tamaño del padrón, ver indices.py.
+def crear_indice_faiss(embeddings, ids):
+    index = construir(embeddings, ids)
+    logging.info(f"Índice {tipo_de(index)} construido con {index.ntotal} vectores")
+    return index
+
+def actualizar_indice(almacen, cambiados, eliminados, carpeta_salida, completo=False):
+    """
+    Parte del índice vigente: quita lo eliminado/cambiado y agrega lo
+    re-embebido. remove_ids(persona_id) saca todas las imágenes de la
+    persona, así que se vuelven a agregar todas las que sigan siendo válidas.
+    """
+    ids, _, embeddings = almacen.validos()
     faiss.normalize_L2(embeddings)
-    d = embeddings.shape[1]
-    index = faiss.IndexFlatIP(d)
-    if config["use_gpu"] and hasattr(faiss, "StandardGpuResources"):
-        res = faiss.StandardGpuResources()
-        index = faiss.index_cpu_to_gpu(res, 0, index)
-    index.add(embeddings)
+    previa = version_actual(carpeta_salida)
+    index = None
+    if previa is not None and not completo:
+        try:
+            index = faiss.read_index(str(previa / "faiss.index"))
+        except RuntimeError:
+            logging.warning("No se pudo leer el índice vigente, se reconstruye")
+    etiquetado = isinstance(index, (faiss.IndexIDMap, faiss.IndexIVFPQ))   # no None ni modelo viejo
+    if not etiquetado or tipo_de(index) != tipo_para(len(ids)) or not admite_incremental(index):
+        # primera versión, modelo viejo, --completo, cambio de tipo por tamaño o HNSW
+        return crear_indice_faiss(embeddings, ids)
+
+    quitar = np.array(sorted(cambiados | eliminados), dtype=np.int64)
+    if len(quitar):
+        index.remove_ids(quitar)
+    nuevos = np.isin(ids, quitar)
+    if nuevos.any():
+        index.add_with_ids(embeddings[nuevos], ids[nuevos])
+    if index.ntotal != len(ids):
+        logging.warning(f"Índice ({index.ntotal}) y almacén ({len(ids)}) no coinciden, se reconstruye")
+        return crear_indice_faiss(embeddings, ids)
     return index
 
+def actualizar_prototipos(almacen, cambiados, eliminados, personas_validas, carpeta_salida, completo=False):
+    """
+    Centroide por persona (primer paso barato del reconocimiento en vivo).
+    Como actualizar_indice: parte de los prototipos vigentes y sólo rehace
+    los de `cambiados | eliminados`; `personas_validas` es cuántos tiene que
+    haber al final.
+    """
+    previa = version_actual(carpeta_salida)
+    prototipos = None
+    if previa is not None and not completo and (previa / "prototipos.index").exists():
+        try:
+            prototipos = faiss.read_index(str(previa / "prototipos.index"))
+        except RuntimeError:
+            logging.warning("No se pudieron leer los prototipos vigentes, se reconstruyen")
+    if (prototipos is None or tipo_de(prototipos) != tipo_para(personas_validas)
+            or not admite_incremental(prototipos)):
+        ids_proto, _, centroides = almacen.centroides()
+        return construir(centroides, ids_proto)
+
+    quitar = np.array(sorted(cambiados | eliminados), dtype=np.int64)
+    if len(quitar):
+        prototipos.remove_ids(quitar)
+    ids_proto, _, centroides = almacen.centroides(cambiados)
+    if len(ids_proto):
+        prototipos.add_with_ids(centroides, ids_proto)
+    if prototipos.ntotal != personas_validas:
+        logging.warning(f"Prototipos ({prototipos.ntotal}) y personas ({personas_validas}) no coinciden, se reconstruyen")
+        ids_proto, _, centroides = almacen.centroides()
+        return construir(centroides, ids_proto)
+    return prototipos
+
+def reporte_version(index, embeddings, ids, carpeta_salida, incremental):
+    """Recall/latencia completo; en corridas incrementales una muestra (o el reporte anterior)."""
+    if not incremental:
+        return reporte(index, embeddings, ids)
+    if INDICE_REPORTE_INCREMENTAL > 0:
+        return reporte(index, embeddings, ids, consultas=INDICE_REPORTE_INCREMENTAL)
+    previa = version_actual(carpeta_salida)
+    try:
+        with open(previa / "reporte_indice.json", "r", encoding="utf-8") as f:
+            # "de_version": versión en la que se midió (se arrastra entre corridas)
+            return {"de_version": previa.name, **json.load(f), "vectores": int(index.ntotal)}
+    except (OSError, ValueError):
+        return {"tipo": tipo_de(index), "vectores": int(index.ntotal)}
+
 # ========= GUARDAR ==========
-def guardar_resultado(nombres, embeddings, index, errores, duracion):
-    ruta_modelo = os.path.join(CARPETA_SALIDA, "faiss.index")
-    faiss.write_index(faiss.index_gpu_to_cpu(index), ruta_modelo)
-    # Guardar embeddings + nombres juntos
-    with open(os.path.join(CARPETA_SALIDA, "embeddings.pkl"), "wb") as f:
-        pickle.dump({"nombres": nombres, "embeddings": embeddings}, f)
-
-    # Guardar solo los nombres por separado (para producción)
-    with open(os.path.join(CARPETA_SALIDA, "nombres.pkl"), "wb") as f:
-        pickle.dump(nombres, f)
-    with open(os.path.join(CARPETA_SALIDA, "errores.json"), "w", encoding="utf-8") as f:
-        json.dump(errores, f, indent=2, ensure_ascii=False)
+def guardar_resultado(almacen, index, cambiados, eliminados, duracion, carpeta_salida, usuario_id, conn,
+                      completo=False):
+    ids, nombres, embeddings = almacen.validos()
+    errores = almacen.errores()
+    incremental = not completo and version_actual(carpeta_salida) is not None
+    normalizados = embeddings.copy()
+    faiss.normalize_L2(normalizados)
+    rep = reporte_version(index, normalizados, ids, carpeta_salida, incremental)
+    prototipos = actualizar_prototipos(almacen, cambiados, eliminados, len(np.unique(ids)),
+                                       carpeta_salida, completo)
+    rep["personas"] = int(prototipos.ntotal)
+    logging.info(f"Reporte del índice: {json.dumps(rep)}")
+
+    def escribir(destino):
+        os.makedirs(destino)
+        faiss.write_index(index, os.path.join(destino, "faiss.index"))
+        faiss.write_index(prototipos, os.path.join(destino, "prototipos.index"))
+        # Guardar embeddings + nombres juntos (analítica del modelo)
+        with open(os.path.join(destino, "embeddings.pkl"), "wb") as f:
+            pickle.dump({"nombres": nombres, "ids": ids, "embeddings": embeddings}, f)
+        with open(os.path.join(destino, "nombres.pkl"), "wb") as f:
+            pickle.dump(nombres, f)
+        with open(os.path.join(destino, "errores.json"), "w", encoding="utf-8") as f:
+            json.dump(errores, f, indent=2, ensure_ascii=False)
+        # recall vs. latencia contra la búsqueda exacta (GET /personas/reporte_indice)
+        with open(os.path.join(destino, "reporte_indice.json"), "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+
+    # Primero la versión (atómica), después el almacén: si se corta entre
+    # medio, la próxima corrida re-embebe esas personas y queda consistente
+    version = publicar(carpeta_salida, escribir)
+    almacen.guardar()
+    ruta_modelo = os.path.join(version, "faiss.index")
 
     # ✅ Eliminar modelos anteriores del mismo usuario
-    cursor.execute("DELETE FROM modelos_generados WHERE usuario_id = %s", (USUARIO_ID,))
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM modelos_generados WHERE usuario_id = %s", (usuario_id,))
     # Guardar en la BD
     cursor.execute("""
         INSERT INTO modelos_generados (usuario_id, ruta_modelo, fecha, cantidad_embeddings, cantidad_descartados, tiempo_total_segundos, ruta_errores)
         VALUES (%s, %s, NOW(), %s, %s, %s, %s)
-    """, (USUARIO_ID, ruta_modelo, len(nombres), len(errores), duracion, os.path.join(CARPETA_SALIDA, "errores.json")))
+    """, (usuario_id, ruta_modelo, len(ids), len(errores), duracion, os.path.join(version, "errores.json")))
     conn.commit()
+    cursor.close()
 
 # ========= MAIN ==========
 if __name__ == "__main__":
-    debug_muestras = []
     inicio = datetime.now()
 
-    embeddings, nombres, errores = generar_embeddings()
-    if len(embeddings) == 0:
+    almacen = AlmacenEmbeddings.cargar(CARPETA_SALIDA)
+    pipeline = PipelineEnrolamiento(
+        app, n_procesos=config["n_procesos"], lote=config["lote_inferencia"],
+        carpeta_errores=CARPETA_ERRORES if config["guardar_rechazadas"] else None,
+        umbral_enfoque=config["umbral_enfoque"], resolucion_minima=config["resolucion_minima"],
+    )
+    cambiados, eliminados = actualizar_almacen(almacen, personas, pipeline, COMPLETO)
+    if not len(almacen.validos()[0]):
         logging.error("No se generaron embeddings válidos.")
         sys.exit(1)
+    if not cambiados and not eliminados and version_actual(CARPETA_SALIDA) is not None:
+        almacen.guardar()      # sólo pudo cambiar algún nombre o mtime
+        logging.info("Sin cambios en las imágenes: se mantiene la versión vigente")
+        sys.exit(0)
 
-    index = crear_indice_faiss(embeddings)
-    guardar_resultado(nombres, embeddings, index, errores, (datetime.now() - inicio).total_seconds())
-    logging.info(f"Finalizado: {len(nombres)} embeddings generados. Errores: {len(errores)}")
+    index = actualizar_indice(almacen, cambiados, eliminados, CARPETA_SALIDA, COMPLETO)
+    guardar_resultado(almacen, index, cambiados, eliminados, (datetime.now() - inicio).total_seconds(),
+                      CARPETA_SALIDA, USUARIO_ID, conn, COMPLETO)
+    logging.info(f"Finalizado: {len(cambiados)} embebidos, {len(eliminados)} eliminados, "
+                 f"{index.ntotal} en el índice. Errores: {len(almacen.errores())}")
@@ -0,0 +1,168 @@
+# ✅ omniface-backend/indices.py
+"""
+Tipo de índice FAISS según el tamaño del padrón.
+
+    flat    IndexIDMap(IndexFlatIP): exacto; la búsqueda crece lineal con n
+            y cada vector ocupa 512 float32 (2 KB)
+    hnsw    IndexIDMap(IndexHNSWFlat): grafo, búsqueda sublineal; no admite
+            remove_ids, así que los cambios reconstruyen desde el almacén
+    ivfpq   IndexIVFPQ: listas invertidas + cuantización de producto;
+            INDICE_PQ_M bytes por vector, admite remove_ids / add_with_ids
+
+Siempre producto interno sobre vectores normalizados (= coseno) y etiquetas
+= persona_id; una persona con varias imágenes aparece con la misma etiqueta
+varias veces y `buscar_identidad` junta esos puntajes (IDENT_AGREGACION).
+El índice de prototipos (un centroide por persona) es el primer paso barato:
+descarta las caras que no se parecen a nadie antes del índice completo.
+`reporte` compara el índice contra la búsqueda exacta
+(recall@1, recall@k y latencia por consulta) y se guarda con cada versión.
+"""
+import time
+
+import faiss
+import numpy as np
+
+from config import (
+    INDICE_HNSW_DESDE, INDICE_IVFPQ_DESDE, INDICE_HNSW_M, INDICE_HNSW_EF_CONSTRUCCION,
+    INDICE_HNSW_EF_BUSQUEDA, INDICE_IVF_NLIST, INDICE_IVF_NPROBE, INDICE_PQ_M,
+    INDICE_REPORTE_CONSULTAS, INDICE_REPORTE_RUIDO,
+    IDENT_AGREGACION, IDENT_VECINOS, IDENT_FILTRO_PROTOTIPOS,
+)
+
+
+def tipo_para(n: int) -> str:
+    if n >= INDICE_IVFPQ_DESDE:
+        return "ivfpq"
+    if n >= INDICE_HNSW_DESDE:
+        return "hnsw"
+    return "flat"
+
+
+def tipo_de(index) -> str:
+    """Tipo de un índice ya construido (o leído del disco)."""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    interno = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return "hnsw" if isinstance(interno, faiss.IndexHNSW) else "flat"
+
+
+def admite_incremental(index) -> bool:
+    return tipo_de(index) in ("flat", "ivfpq")
+
+
+def construir(embeddings: np.ndarray, ids: np.ndarray, tipo: str = None):
+    """`embeddings` ya normalizados (float32, n×d); `ids` int64."""
+    n, d = embeddings.shape
+    tipo = tipo or tipo_para(n)
+    if tipo == "hnsw":
+        interno = faiss.IndexHNSWFlat(d, INDICE_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        interno.hnsw.efConstruction = INDICE_HNSW_EF_CONSTRUCCION
+        interno.hnsw.efSearch = INDICE_HNSW_EF_BUSQUEDA
+        index = faiss.IndexIDMap(interno)
+    elif tipo == "ivfpq":
+        nlist = INDICE_IVF_NLIST or max(1, int(4 * np.sqrt(n)))
+        cuantizador = faiss.IndexFlatIP(d)
+        index = faiss.IndexIVFPQ(cuantizador, d, nlist, INDICE_PQ_M, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+        index.nprobe = min(INDICE_IVF_NPROBE, nlist)    # se guarda con el índice
+    else:
+        index = faiss.IndexIDMap(faiss.IndexFlatIP(d))
+    index.add_with_ids(embeddings, ids)
+    return index
+
+
+def agregar(D: np.ndarray, I: np.ndarray, modo: str):
+    """
+    Mejor identidad por consulta a partir de sus k vecinos (D, I de search).
+    max: el vecino más parecido; media: promedio de los vecinos de cada
+    persona entre los k recuperados. Devuelve (similitud, persona_id).
+    """
+    if modo != "media" or I.shape[1] == 1:
+        return D[:, 0], I[:, 0]
+    validos = I >= 0
+    misma   = (I[:, :, None] == I[:, None, :]) & validos[:, None, :]      # q×k×k
+    suma    = np.where(misma, D[:, None, :], 0).sum(axis=2)
+    media   = np.where(validos, suma / np.maximum(misma.sum(axis=2), 1), -np.inf)
+    mejor   = media.argmax(axis=1)
+    filas   = np.arange(len(I))
+    return media[filas, mejor].astype(np.float32), I[filas, mejor]
+
+
+def buscar_identidad(index, prototipos, consultas: np.ndarray, modo: str = IDENT_AGREGACION,
+                     k: int = IDENT_VECINOS, filtro: float = IDENT_FILTRO_PROTOTIPOS):
+    """
+    (similitud, persona_id) por consulta (normalizadas). Con `prototipos`
+    (puede ser None en modelos viejos) primero se compara contra los
+    centroides: en modo "centroide" ese es el resultado; si no, las consultas
+    por debajo de `filtro` se quedan con ese puntaje y no tocan `index`.
+    """
+    if prototipos is None and modo == "centroide":
+        modo = "max"
+    if prototipos is not None and (modo == "centroide" or filtro > 0):
+        Dp, Ip = prototipos.search(consultas, 1)
+        if modo == "centroide":
+            return Dp[:, 0], Ip[:, 0]
+        sims, pids = Dp[:, 0].copy(), Ip[:, 0].copy()
+        candidatas = np.flatnonzero(sims >= filtro)
+    else:
+        sims = np.full(len(consultas), -1.0, dtype=np.float32)
+        pids = np.full(len(consultas), -1, dtype=np.int64)
+        candidatas = np.arange(len(consultas))
+    if len(candidatas):
+        k = max(1, min(k, index.ntotal)) if modo == "media" else 1
+        D, I = index.search(consultas[candidatas], k)
+        sims[candidatas], pids[candidatas] = agregar(D, I, modo)
+    return sims, pids
+
+
+def _latencias_ms(index, consultas: np.ndarray, k: int) -> np.ndarray:
+    tiempos = np.empty(len(consultas))
+    for i in range(len(consultas)):
+        t = time.perf_counter()
+        index.search(consultas[i:i + 1], k)
+        tiempos[i] = (time.perf_counter() - t) * 1000
+    return tiempos
+
+
+def reporte(index, embeddings: np.ndarray, ids: np.ndarray, k: int = 5, semilla: int = 0,
+            consultas: int = INDICE_REPORTE_CONSULTAS) -> dict:
+    """
+    Recall y latencia de `index` contra la búsqueda exacta sobre los mismos
+    `embeddings` (normalizados, fila i ↔ ids[i]). Las consultas (a lo sumo
+    `consultas`) son vectores del padrón con ruido gaussiano, como un rostro
+    visto en vivo.
+    """
+    n, d = embeddings.shape
+    if n == 0:
+        return {"tipo": tipo_de(index), "vectores": 0}
+    k = min(k, n)
+    rng = np.random.default_rng(semilla)
+    muestra = rng.choice(n, size=min(n, max(1, consultas)), replace=False)
+    consultas = embeddings[muestra] + rng.normal(0, INDICE_REPORTE_RUIDO, (len(muestra), d)).astype(np.float32)
+    faiss.normalize_L2(consultas)
+
+    exacto = faiss.IndexFlatIP(d)
+    exacto.add(embeddings)
+    _, I_ref = exacto.search(consultas, k)
+    I_ref = ids[I_ref]                      # posiciones → persona_id
+    _, I = index.search(consultas, k)
+
+    recall_1 = float(np.mean(I[:, 0] == I_ref[:, 0]))
+    # por identidades distintas: con varias imágenes por persona una etiqueta se repite
+    recall_k = float(np.mean([len(set(a) & set(b)) / len(set(b)) for a, b in zip(I, I_ref)]))
+    lat, lat_ref = _latencias_ms(index, consultas, k), _latencias_ms(exacto, consultas, k)
+    return {
+        "tipo": tipo_de(index),
+        "vectores": int(index.ntotal),
+        "consultas": int(len(consultas)),
+        "k": int(k),
+        "recall_1": round(recall_1, 4),
+        f"recall_{k}": round(recall_k, 4),
+        "latencia_ms": {"p50": round(float(np.percentile(lat, 50)), 4),
+                        "p95": round(float(np.percentile(lat, 95)), 4)},
+        "latencia_exacta_ms": {"p50": round(float(np.percentile(lat_ref, 50)), 4),
+                               "p95": round(float(np.percentile(lat_ref, 95)), 4)},
+        "bytes": int(faiss.serialize_index(index).nbytes),
+        "bytes_exacto": int(n * d * 4),
+    }
+
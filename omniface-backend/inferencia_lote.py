@@ -0,0 +1,139 @@
+# ✅ omniface-backend/inferencia_lote.py
+"""
+Inferencia por lotes sobre los modelos de InsightFace.
+
+FaceAnalysis.get() procesa un frame a la vez y, por cada rostro, corre todos
+los modelos cargados (landmarks, género/edad, reconocimiento). Aquí se separan
+las etapas para poder agruparlas entre varios frames:
+
+  • detección  → un solo session.run de SCRFD para todos los frames
+  • alineación → norm_crop con los 5 puntos clave del detector
+  • embeddings → un solo get_feat de ArcFace con todos los recortes
+"""
+import cv2
+import numpy as np
+from insightface.app.common import Face
+from insightface.model_zoo.scrfd import distance2bbox, distance2kps
+from insightface.utils import face_align
+
+
+def _admite_lote(session) -> bool:
+    """True si la primera dimensión de entrada del ONNX es dinámica."""
+    dim = session.get_inputs()[0].shape[0]
+    return not isinstance(dim, int) or dim <= 0
+
+
+def _letterbox(img, input_size):
+    """Mismo redimensionado que SCRFD.detect: escala y rellena abajo/derecha."""
+    w_in, h_in = input_size
+    im_ratio = float(img.shape[0]) / img.shape[1]
+    if im_ratio > float(h_in) / w_in:
+        new_h = h_in
+        new_w = int(new_h / im_ratio)
+    else:
+        new_w = w_in
+        new_h = int(new_w * im_ratio)
+    escala = float(new_h) / img.shape[0]
+    det_img = np.zeros((h_in, w_in, 3), dtype=np.uint8)
+    det_img[:new_h, :new_w, :] = cv2.resize(img, (new_w, new_h))
+    return det_img, escala
+
+
+def _centros(det, h, w, stride):
+    key = (h, w, stride)
+    centros = det.center_cache.get(key)
+    if centros is None:
+        centros = np.stack(np.mgrid[:h, :w][::-1], axis=-1).astype(np.float32)
+        centros = (centros * stride).reshape((-1, 2))
+        if det._num_anchors > 1:
+            centros = np.stack([centros] * det._num_anchors, axis=1).reshape((-1, 2))
+        if len(det.center_cache) < 100:
+            det.center_cache[key] = centros
+    return centros
+
+
+def _decodificar(det, net_outs, b, input_h, input_w, escala):
+    """Decodifica la salida b-ésima del lote (equivalente a SCRFD.forward + detect)."""
+    scores_l, bboxes_l, kpss_l = [], [], []
+    fmc = det.fmc
+    for idx, stride in enumerate(det._feat_stride_fpn):
+        scores = net_outs[idx][b]
+        bbox_preds = net_outs[idx + fmc][b] * stride
+        centros = _centros(det, input_h // stride, input_w // stride, stride)
+        pos = np.where(scores >= det.det_thresh)[0]
+        scores_l.append(scores[pos])
+        bboxes_l.append(distance2bbox(centros, bbox_preds)[pos])
+        if det.use_kps:
+            kps_preds = net_outs[idx + fmc * 2][b] * stride
+            kpss = distance2kps(centros, kps_preds)
+            kpss_l.append(kpss.reshape((kpss.shape[0], -1, 2))[pos])
+
+    scores = np.vstack(scores_l).ravel()
+    order = scores.argsort()[::-1]
+    bboxes = np.vstack(bboxes_l) / escala
+    pre_det = np.hstack((bboxes, scores[:, None])).astype(np.float32, copy=False)[order, :]
+    keep = det.nms(pre_det)
+    kpss = None
+    if det.use_kps:
+        kpss = (np.vstack(kpss_l) / escala)[order, :, :][keep, :, :]
+    return pre_det[keep, :], kpss
+
+
+def detectar_lote(det_model, frames, input_size=None):
+    """
+    Detecta rostros en varios frames con una sola pasada del detector.
+
+    Devuelve una lista [(bboxes, kpss), …] alineada con `frames`, con el mismo
+    formato que SCRFD.detect. Si el ONNX no admite lote se recurre a detect()
+    frame a frame.
+    """
+    input_size = tuple(input_size or det_model.input_size)
+    if len(frames) == 1 or not (det_model.batched and _admite_lote(det_model.session)):
+        return [det_model.detect(f, input_size=input_size) for f in frames]
+
+    letter = [_letterbox(f, input_size) for f in frames]
+    mean = det_model.input_mean
+    blob = cv2.dnn.blobFromImages(
+        [img for img, _ in letter], 1.0 / det_model.input_std, input_size,
+        (mean, mean, mean), swapRB=True
+    )
+    net_outs = det_model.session.run(det_model.output_names, {det_model.input_name: blob})
+    input_h, input_w = blob.shape[2], blob.shape[3]
+    return [
+        _decodificar(det_model, net_outs, b, input_h, input_w, escala)
+        for b, (_, escala) in enumerate(letter)
+    ]
+
+
+def caras_desde_detecciones(detecciones):
+    """[(bboxes, kpss), …] → lista plana [(idx_frame, Face), …]."""
+    caras = []
+    for i, (bboxes, kpss) in enumerate(detecciones):
+        for j in range(bboxes.shape[0]):
+            caras.append((i, Face(
+                bbox=bboxes[j, 0:4],
+                kps=kpss[j] if kpss is not None else None,
+                det_score=bboxes[j, 4]
+            )))
+    return caras
+
+
+def embeddings_lote(rec_model, frames, caras):
+    """
+    Alinea todos los rostros y calcula sus embeddings en una sola llamada.
+
+    `caras` es la lista [(idx_frame, Face), …]; devuelve un array (N, D) float32
+    y además deja cada vector en `face.embedding`, como hace FaceAnalysis.get.
+    """
+    if not caras:
+        return np.zeros((0, 512), dtype=np.float32)
+    size = rec_model.input_size[0]
+    recortes = [face_align.norm_crop(frames[i], landmark=f.kps, image_size=size) for i, f in caras]
+    if _admite_lote(rec_model.session):
+        feats = rec_model.get_feat(recortes)
+    else:
+        feats = np.vstack([rec_model.get_feat(r) for r in recortes])
+    feats = np.asarray(feats, dtype=np.float32).reshape(len(caras), -1)
+    for (_, f), e in zip(caras, feats):
+        f.embedding = e
+    return feats
@@ -1,6 +1,7 @@
 # ✅ omniface-backend/main.py
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from auth import auth_router
 from protected import usuarios_router
@@ -10,8 +11,30 @@ from departamentos import departamentos_router
 from recon_live import router as recon_router
 from asistencia import router as asistencia_router
 from salida import router as salida_router  # El nuevo
+from presencia import Presencia
+from eventos import SumideroEventos
+from modelo_usuario import ModeloManager
+from bitacora import configurar as configurar_log
+from metricas import Metricas
+
+configurar_log()   # nivel inicial: config.LOG_NIVEL
 app = FastAPI(title="OMNIFACE Backend")
 
+@app.on_event("startup")
+def reanudar_pendientes():
+    SumideroEventos.iniciar()   # re-encola los eventos del diario sin esperar a uno nuevo
+
+@app.on_event("shutdown")
+def volcar_pendientes():
+    Presencia.detener()         # escribe los estado_persona pendientes
+    SumideroEventos.detener()   # asistencias / salidas encoladas (el resto queda en el diario)
+    ModeloManager.detener()     # vigilante de versiones nuevas del modelo
+
+# 📈 Métricas del pipeline (formato de texto de Prometheus)
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return PlainTextResponse(Metricas.exponer(), media_type="text/plain; version=0.0.4")
+
 # 🔐 CORS: permitir origenes frontend
 app.add_middleware(
     CORSMiddleware,
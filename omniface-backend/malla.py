@@ -0,0 +1,119 @@
+# ✅ omniface-backend/malla.py
+"""
+Overlay opcional de MediaPipe Face Mesh para la vista "anotado".
+
+Niveles (perfil de cámara, clave "malla"):
+  • "off"       → no se importa mediapipe ni se construye el FaceMesh
+  • "contornos" → ojos, cejas, labios y óvalo
+  • "completo"  → teselado + contornos + iris
+
+FaceMesh corre como máximo una vez cada MALLA_INTERVALO_S por track; entre
+corridas se reutilizan los landmarks de la última. Como están normalizados
+al recorte del rostro, se vuelven a dibujar sobre el bbox actual del track.
+"""
+import time
+import cv2
+from config import MALLA_INTERVALO_S
+from bitacora import obtener
+from metricas import Metricas
+
+log = obtener(__name__)
+
+NIVELES = ("off", "contornos", "completo")
+_MARGEN = 20          # px alrededor del bbox para que FaceMesh encuentre el rostro
+_CACHE_MAX = 64       # tracks en cache antes de purgar los viejos
+_CACHE_TTL_S = 5.0
+
+_mp = None
+
+
+def _mediapipe():
+    """Importa mediapipe recién cuando algún nivel lo necesita."""
+    global _mp
+    if _mp is None:
+        import mediapipe
+        _mp = mediapipe
+    return _mp
+
+
+def _recorte(frame, bbox):
+    x1, y1, x2, y2 = map(int, bbox)
+    y1 = max(0, y1 - _MARGEN)
+    x1 = max(0, x1 - _MARGEN)
+    y2 = min(frame.shape[0], y2 + _MARGEN)
+    x2 = min(frame.shape[1], x2 + _MARGEN)
+    return frame[y1:y2, x1:x2]
+
+
+class MallaFacial:
+    """Malla por sesión; el FaceMesh se comparte entre todas (singleton de clase)."""
+    _face_mesh = None
+
+    def __init__(self, nivel: str = "off", intervalo: float = MALLA_INTERVALO_S):
+        if nivel not in NIVELES:
+            raise ValueError(f"Nivel de malla desconocido: {nivel}")
+        self.nivel     = nivel
+        self.intervalo = intervalo
+        self._cache    = {}       # track_id → (monotonic, landmarks | None)
+
+    @classmethod
+    def _get_face_mesh(cls):
+        if cls._face_mesh is None:
+            log.info("Cargando MediaPipe Face Mesh")
+            cls._face_mesh = _mediapipe().solutions.face_mesh.FaceMesh(
+                static_image_mode=True,       # cada llamada es un recorte distinto
+                max_num_faces=1,              # un rostro por recorte
+                refine_landmarks=True,        # Refina iris y detalles
+                min_detection_confidence=0.5
+            )
+        return cls._face_mesh
+
+    def _landmarks(self, rgb_face, track_id, ahora):
+        previo = self._cache.get(track_id)
+        if track_id is not None and previo and ahora - previo[0] < self.intervalo:
+            return previo[1]
+        results = self._get_face_mesh().process(rgb_face)
+        lm = results.multi_face_landmarks[0] if results.multi_face_landmarks else None
+        if track_id is not None:
+            if len(self._cache) >= _CACHE_MAX:
+                self._cache = {k: v for k, v in self._cache.items() if ahora - v[0] < _CACHE_TTL_S}
+            self._cache[track_id] = (ahora, lm)
+        return lm
+
+    def dibujar(self, frame, bbox, track_id=None):
+        """Dibuja la malla del rostro `bbox` sobre `frame` según el nivel."""
+        if self.nivel == "off":
+            return
+        with Metricas.medir("malla"):
+            self._dibujar(frame, bbox, track_id)
+
+    def _dibujar(self, frame, bbox, track_id):
+        face_region = _recorte(frame, bbox)
+        if face_region.size == 0:
+            return
+
+        rgb_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2RGB)
+        lm = self._landmarks(rgb_face, track_id, time.monotonic())
+        if lm is None:
+            return
+
+        mp = _mediapipe()
+        conexiones = mp.solutions.face_mesh
+        estilos = mp.solutions.drawing_styles
+        capas = [(conexiones.FACEMESH_CONTOURS, estilos.get_default_face_mesh_contours_style())]
+        if self.nivel == "completo":
+            capas.insert(0, (conexiones.FACEMESH_TESSELATION,
+                             estilos.get_default_face_mesh_tesselation_style()))
+            capas.append((conexiones.FACEMESH_IRISES,
+                          estilos.get_default_face_mesh_iris_connections_style()))
+        for conexion, estilo in capas:
+            mp.solutions.drawing_utils.draw_landmarks(
+                image=rgb_face,
+                landmark_list=lm,
+                connections=conexion,
+                landmark_drawing_spec=None,
+                connection_drawing_spec=estilo
+            )
+
+        # Convertir de vuelta a BGR y copiar al frame original
+        face_region[:] = cv2.cvtColor(rgb_face, cv2.COLOR_RGB2BGR)
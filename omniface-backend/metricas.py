@@ -0,0 +1,147 @@
+# ✅ omniface-backend/metricas.py
+"""
+Métricas del pipeline en el formato de texto de Prometheus (GET /metrics).
+
+Sin dependencias nuevas: contadores e histogramas en memoria bajo un lock,
+y medidores (gauges) que se calculan al exponer con funciones registradas
+por cada módulo (cola del worker, sesiones, visores, fps de captura…).
+
+Series principales:
+  omniface_etapa_segundos{etapa}         latencia por etapa: deteccion, embedding,
+                                         faiss, emocion, malla, codificacion, envio, bd
+  omniface_lote_frames / _lote_rostros   tamaño de cada lote del worker
+  omniface_frames_analizados_total{camara}
+  omniface_frames_descartados_total{motivo}   cola llena o frame viejo
+  omniface_bd_filas_total{tabla}         filas escritas por los escritores diferidos
+  omniface_bd_errores_total{tabla}
+  omniface_eventos_fallidos_total{tipo}  eventos que no se pudieron insertar ni solos
+Los medidores se listan con Metricas.medidor(...) donde se registran.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+_TAMANO   = (1, 2, 4, 8, 16, 32, 64)
+
+_HISTOGRAMAS = {
+    "omniface_etapa_segundos": ("Latencia por etapa del pipeline", _LATENCIA),
+    "omniface_lote_frames":    ("Frames por lote del worker", _TAMANO),
+    "omniface_lote_rostros":   ("Rostros por lote del worker", _TAMANO),
+}
+_CONTADORES = {
+    "omniface_frames_analizados_total":  "Frames procesados por el worker",
+    "omniface_frames_descartados_total": "Frames descartados antes de inferir",
+    "omniface_bd_filas_total":           "Filas escritas en la BD por los escritores diferidos",
+    "omniface_bd_errores_total":         "Escrituras en lote que fallaron",
+    "omniface_eventos_fallidos_total":   "Eventos apartados en EVENTOS_FALLIDOS_DIR",
+}
+
+
+def _clave(etiquetas: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _formatear(etiquetas: tuple, extra: tuple = ()) -> str:
+    pares = etiquetas + extra
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+
+class _Histograma:
+    __slots__ = ("cubetas", "conteos", "suma", "n")
+
+    def __init__(self, cubetas):
+        self.cubetas = cubetas
+        self.conteos = [0] * (len(cubetas) + 1)    # la última es +Inf
+        self.suma    = 0.0
+        self.n       = 0
+
+    def observar(self, valor: float):
+        self.conteos[bisect_left(self.cubetas, valor)] += 1
+        self.suma += valor
+        self.n    += 1
+
+
+class Metricas:
+    """Registro global (clase) como ControlAdmision."""
+    _lock = Lock()
+    _contadores: dict = {}     # (nombre, etiquetas) → valor
+    _histogramas: dict = {}    # (nombre, etiquetas) → _Histograma
+    _medidores: dict = {}      # nombre → (ayuda, fn)
+
+    # ---------- registro ----------
+    @classmethod
+    def contar(cls, nombre: str, valor: float = 1, **etiquetas):
+        clave = (nombre, _clave(etiquetas))
+        with cls._lock:
+            cls._contadores[clave] = cls._contadores.get(clave, 0) + valor
+
+    @classmethod
+    def observar(cls, nombre: str, valor: float, **etiquetas):
+        clave = (nombre, _clave(etiquetas))
+        with cls._lock:
+            h = cls._histogramas.get(clave)
+            if h is None:
+                h = cls._histogramas[clave] = _Histograma(_HISTOGRAMAS[nombre][1])
+            h.observar(valor)
+
+    @classmethod
+    @contextmanager
+    def medir(cls, etapa: str):
+        """Mide el bloque en omniface_etapa_segundos{etapa=…}."""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observar("omniface_etapa_segundos", time.perf_counter() - t, etapa=etapa)
+
+    @classmethod
+    def medidor(cls, nombre: str, ayuda: str, fn):
+        """
+        `fn()` se llama al exponer y devuelve un número o una lista de
+        (etiquetas: dict, valor) para series con etiquetas.
+        """
+        cls._medidores[nombre] = (ayuda, fn)
+
+    # ---------- exposición ----------
+    @classmethod
+    def exponer(cls) -> str:
+        lineas = []
+        with cls._lock:
+            contadores  = dict(cls._contadores)
+            histogramas = {k: (list(h.conteos), h.suma, h.n) for k, h in cls._histogramas.items()}
+
+        for nombre, ayuda in _CONTADORES.items():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+            for (n, etq), valor in sorted(contadores.items()):
+                if n == nombre:
+                    lineas.append(f"{nombre}{_formatear(etq)} {valor}")
+
+        for nombre, (ayuda, cubetas) in _HISTOGRAMAS.items():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} histogram"]
+            for (n, etq), (conteos, suma, total) in sorted(histogramas.items()):
+                if n != nombre:
+                    continue
+                acumulado = 0
+                for limite, c in zip(cubetas + (float("inf"),), conteos):
+                    acumulado += c
+                    le = "+Inf" if limite == float("inf") else repr(limite)
+                    lineas.append(f"{nombre}_bucket{_formatear(etq, (('le', le),))} {acumulado}")
+                lineas.append(f"{nombre}_sum{_formatear(etq)} {suma}")
+                lineas.append(f"{nombre}_count{_formatear(etq)} {total}")
+
+        for nombre, (ayuda, fn) in sorted(cls._medidores.items()):
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge"]
+            try:
+                valor = fn()
+            except Exception:
+                continue          # un medidor roto no tumba el resto
+            if isinstance(valor, (int, float)):
+                lineas.append(f"{nombre} {valor}")
+            else:
+                for etiquetas, v in valor:
+                    lineas.append(f"{nombre}{_formatear(_clave(etiquetas))} {v}")
+        return "\n".join(lineas) + "\n"
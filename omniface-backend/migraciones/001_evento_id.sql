@@ -0,0 +1,11 @@
+-- ✅ omniface-backend/migraciones/001_evento_id.sql
+-- Clave de idempotencia para el sumidero de eventos (eventos.py):
+-- un evento reintentado tras una caída o un fallo de BD se ignora en vez de duplicarse.
+
+ALTER TABLE asistencias
+  ADD COLUMN evento_id CHAR(32) NULL,
+  ADD UNIQUE KEY uq_asistencias_evento (evento_id);
+
+ALTER TABLE salidas
+  ADD COLUMN evento_id CHAR(32) NULL,
+  ADD UNIQUE KEY uq_salidas_evento (evento_id);
@@ -0,0 +1,15 @@
+-- ✅ omniface-backend/migraciones/002_personas_imagenes.sql
+-- Imágenes de referencia adicionales por persona (generar_embeddings.py):
+-- cada una aporta un embedding etiquetado con el persona_id, además de imagen_mejorada.
+-- `imagen` es relativa a imagenes_optimizadas, igual que personas.imagen_mejorada.
+
+CREATE TABLE personas_imagenes (
+  id INT(11) NOT NULL AUTO_INCREMENT,
+  persona_id INT(11) NOT NULL,
+  usuario_id INT(11) NOT NULL,
+  imagen VARCHAR(255) NOT NULL,
+  creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id),
+  KEY idx_personas_imagenes_usuario (usuario_id),
+  CONSTRAINT personas_imagenes_ibfk_1 FOREIGN KEY (persona_id) REFERENCES personas (id) ON DELETE CASCADE
+);
@@ -0,0 +1,214 @@
+# ✅ omniface-backend/modelo_usuario.py
+"""
+Modelos de usuario versionados con reemplazo en caliente.
+
+Un ModeloUsuario es una versión inmutable: índice FAISS (etiquetas =
+persona_id, una fila por imagen de referencia) + índice de prototipos (un
+centroide por persona, opcional) + TablaPersonas + la firma de actual.json
+de la que salió. El
+worker toma el modelo vigente una vez por lote y tenant, y la sesión una vez
+por frame. Todo lo que se resuelve con esa referencia es consistente aunque
+mientras tanto se publique otra versión.
+
+Cuando generar_embeddings.py publica una versión nueva, un hilo vigilante
+la carga en segundo plano (/recon/reload_model la relee en el acto aunque
+actual.json no haya cambiado) y la publica reemplazando el diccionario de
+vigentes entero (copy-on-write). Los lectores no toman locks ni esperan la
+carga, y las cámaras no se reinician.
+La versión anterior se libera cuando suelta su última referencia (el lote
+o frame que la estaba usando). Las sesiones retienen el modelo de su
+usuario (`retener` / `soltar`); cuando se cierra la última, el usuario sale
+de los vigentes y su modelo deja de ocupar memoria.
+
+La TablaPersonas no se ata a la versión del índice: renombrar a alguien,
+cambiarlo de departamento o editar las horas de un departamento no genera
+una versión nueva. El vigilante relee la tabla cuando personas.py o
+departamentos.py la invalidan, o cada TABLA_PERSONAS_TTL_S, y publica la
+misma versión con la tabla nueva (`con_tabla`).
+"""
+import time
+import pickle
+import weakref
+from pathlib import Path
+from threading import Thread, Lock, Event
+
+import faiss
+
+from almacen_modelo import puntero, version_actual
+from indices import buscar_identidad
+from tabla_personas import TablaPersonas
+from bitacora import obtener
+from metricas import Metricas
+from config import MODELOS_DIR, MODELO_VIGILANCIA_S, TABLA_PERSONAS_TTL_S
+
+log = obtener(__name__)
+
+
+def _carpeta(user_id: int) -> Path:
+    return Path(MODELOS_DIR) / f"usuario_{user_id}"
+
+
+def _firma(user_id: int):
+    """(firma, versionado): mtime de actual.json o, en modelos viejos, del faiss.index suelto."""
+    base = _carpeta(user_id)
+    try:
+        return puntero(base).stat().st_mtime_ns, True
+    except FileNotFoundError:
+        return (base / "faiss.index").stat().st_mtime_ns, False
+
+
+def _con_ids(index, ids):
+    """Índice plano etiquetado por posición → IndexIDMap etiquetado por persona_id."""
+    vectores = index.reconstruct_n(0, index.ntotal)
+    validos = ids >= 0
+    if not validos.all():
+        log.warning("%d embeddings sin persona en la BD, se omiten", int((~validos).sum()))
+    nuevo = faiss.IndexIDMap(faiss.IndexFlatIP(index.d))
+    nuevo.add_with_ids(vectores[validos], ids[validos])
+    return nuevo
+
+
+class ModeloUsuario:
+    """Una versión cargada; no se modifica después de publicada."""
+    __slots__ = ("user_id", "version", "firma", "index", "prototipos", "tabla", "__weakref__")
+
+    def __init__(self, user_id: int, version: str, firma, index, prototipos, tabla: TablaPersonas):
+        self.user_id    = user_id
+        self.version    = version
+        self.firma      = firma
+        self.index      = index
+        self.prototipos = prototipos
+        self.tabla      = tabla
+        weakref.finalize(self, log.debug, "Modelo liberado usuario=%s version=%s", user_id, version)
+
+    def con_tabla(self, tabla: TablaPersonas) -> "ModeloUsuario":
+        """Misma versión (índices compartidos) con otra TablaPersonas."""
+        return ModeloUsuario(self.user_id, self.version, self.firma, self.index, self.prototipos, tabla)
+
+    @classmethod
+    def cargar(cls, user_id: int) -> "ModeloUsuario":
+        """Lee la versión vigente del disco + metadatos de personas (una consulta)."""
+        TablaPersonas.tomar_invalidada(user_id)   # la tabla se lee ahora mismo
+        firma, versionado = _firma(user_id)
+        carpeta = version_actual(_carpeta(user_id)) if versionado else _carpeta(user_id)
+        index = faiss.read_index(str(carpeta / "faiss.index"))
+        tabla = TablaPersonas.cargar(user_id)
+        if not isinstance(index, (faiss.IndexIDMap, faiss.IndexIVFPQ)):
+            # Modelo generado antes de las etiquetas por persona_id
+            with open(carpeta / "nombres.pkl", "rb") as f:
+                nombres = pickle.load(f)
+            index = _con_ids(index, tabla.ids_por_nombre(nombres))
+        ruta_prototipos = carpeta / "prototipos.index"
+        prototipos = faiss.read_index(str(ruta_prototipos)) if ruta_prototipos.exists() else None
+        version = carpeta.name if versionado else "sin_version"
+        log.info("Modelo cargado usuario=%s version=%s embeddings=%d prototipos=%d personas=%d",
+                 user_id, version, index.ntotal, prototipos.ntotal if prototipos else 0, len(tabla))
+        return cls(user_id, version, firma, index, prototipos, tabla)
+
+    def buscar(self, consultas):
+        """(similitud, persona_id) por consulta, agregando las imágenes de cada persona."""
+        return buscar_identidad(self.index, self.prototipos, consultas)
+
+
+class ModeloManager:
+    """Estado global (clase) como HubManager; lecturas sin lock."""
+    _vigentes: dict = {}      # user_id → ModeloUsuario (se reemplaza entero al publicar)
+    _sesiones: dict = {}      # user_id → sesiones abiertas que usan su modelo
+    _carga_lock = Lock()      # una carga a la vez (constructor, vigilante o reload)
+    _hilo: Thread = None
+    _parar = Event()
+
+    @classmethod
+    def actual(cls, user_id: int) -> ModeloUsuario:
+        """Versión vigente; la primera vez se carga acá (falla si no hay modelo)."""
+        modelo = cls._vigentes.get(user_id)
+        if modelo is None:
+            modelo = cls.recargar(user_id)
+        return modelo
+
+    @classmethod
+    def retener(cls, user_id: int) -> ModeloUsuario:
+        """Como `actual`, y mantiene el modelo en memoria hasta el `soltar` de la sesión."""
+        with cls._carga_lock:
+            cls._sesiones[user_id] = cls._sesiones.get(user_id, 0) + 1
+        try:
+            return cls.actual(user_id)
+        except Exception:
+            cls.soltar(user_id)
+            raise
+
+    @classmethod
+    def soltar(cls, user_id: int):
+        """La sesión se cerró; sin sesiones, el modelo del usuario se descarta."""
+        with cls._carga_lock:
+            n = cls._sesiones.get(user_id, 0) - 1
+            if n > 0:
+                cls._sesiones[user_id] = n
+                return
+            cls._sesiones.pop(user_id, None)
+            cls._olvidar(user_id)
+
+    @classmethod
+    def _olvidar(cls, user_id: int):
+        # con _carga_lock tomado
+        if user_id in cls._vigentes:
+            cls._vigentes = {k: v for k, v in cls._vigentes.items() if k != user_id}
+            log.info("Modelo descargado usuario=%s (sin sesiones)", user_id)
+
+    @classmethod
+    def recargar(cls, user_id: int, forzar: bool = False) -> ModeloUsuario:
+        """Carga la versión del disco (si cambió, o siempre con `forzar`) y la publica."""
+        with cls._carga_lock:
+            previo = cls._vigentes.get(user_id)
+            if not forzar and previo is not None and previo.firma == _firma(user_id)[0]:
+                return previo
+            nuevo = ModeloUsuario.cargar(user_id)
+            cls._vigentes = {**cls._vigentes, user_id: nuevo}
+        cls._asegurar_hilo()
+        return nuevo
+
+    @classmethod
+    def refrescar_tabla(cls, user_id: int):
+        """Relee personas / departamentos y los publica sin recargar el índice."""
+        tabla = TablaPersonas.cargar(user_id)
+        with cls._carga_lock:
+            previo = cls._vigentes.get(user_id)
+            if previo is not None:
+                cls._vigentes = {**cls._vigentes, user_id: previo.con_tabla(tabla)}
+        log.debug("Tabla de personas releída usuario=%s personas=%d", user_id, len(tabla))
+
+    # ---------- vigilante ----------
+    @classmethod
+    def _asegurar_hilo(cls):
+        if cls._hilo is None or not cls._hilo.is_alive():
+            with cls._carga_lock:
+                if cls._hilo is None or not cls._hilo.is_alive():
+                    cls._parar.clear()
+                    cls._hilo = Thread(target=cls._bucle, name="modelos", daemon=True)
+                    cls._hilo.start()
+
+    @classmethod
+    def _bucle(cls):
+        while not cls._parar.wait(MODELO_VIGILANCIA_S):
+            with cls._carga_lock:
+                # cargados sin sesión (reload_model, último lote de una sesión ya cerrada)
+                for user_id in [u for u in cls._vigentes if not cls._sesiones.get(u)]:
+                    cls._olvidar(user_id)
+            for user_id, modelo in list(cls._vigentes.items()):
+                try:
+                    if _firma(user_id)[0] != modelo.firma:
+                        cls.recargar(user_id)
+                    elif (TablaPersonas.tomar_invalidada(user_id)
+                          or time.monotonic() - modelo.tabla.cargada > TABLA_PERSONAS_TTL_S):
+                        cls.refrescar_tabla(user_id)
+                except Exception as e:
+                    # se sigue usando la versión anterior; se reintenta en la próxima vuelta
+                    log.error("No se pudo recargar el modelo usuario=%s: %s", user_id, e)
+
+    @classmethod
+    def detener(cls):
+        cls._parar.set()
+
+
+Metricas.medidor("omniface_modelos_cargados", "Modelos FAISS de usuario vigentes en memoria",
+                 lambda: len(ModeloManager._vigentes))
@@ -19,6 +19,8 @@ from sklearn.manifold import TSNE
 from sklearn.cluster import KMeans
 from fastapi import Query
 from typing import Optional, List, Union
+from indices import construir as construir_indice
+from tabla_personas import TablaPersonas
 
 # --------------------------
 personas_router = APIRouter(prefix="/personas", tags=["Personas"])
@@ -38,92 +40,102 @@ async def registrar_persona(
      # 1.  Validar que el departamento exista y sea del usuario
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id FROM departamentos WHERE id = %s AND usuario_id = %s",
-        (departamentos_id, usuario.id)
-    )
-    if cursor.fetchone() is None:
-        raise HTTPException(status_code=400, detail="Departamento inválido")
-    extension = os.path.splitext(imagen.filename)[1].lower()
-    if extension not in [".jpg", ".jpeg", ".png"]:
-        raise HTTPException(status_code=400, detail="Formato de imagen inválido")
+    try:
+        cursor.execute(
+            "SELECT id FROM departamentos WHERE id = %s AND usuario_id = %s",
+            (departamentos_id, usuario.id)
+        )
+        if cursor.fetchone() is None:
+            raise HTTPException(status_code=400, detail="Departamento inválido")
+        extension = os.path.splitext(imagen.filename)[1].lower()
+        if extension not in [".jpg", ".jpeg", ".png"]:
+            raise HTTPException(status_code=400, detail="Formato de imagen inválido")
 
-    # Sanitizar nombre para nombre del archivo
-    nombre_sanitizado = (
-        nombre_completo.strip()
-        .lower()
-        .replace(" ", "_")
-        .replace("á", "a").replace("é", "e")
-        .replace("í", "i").replace("ó", "o").replace("ú", "u")
-    )
+        # Sanitizar nombre para nombre del archivo
+        nombre_sanitizado = (
+            nombre_completo.strip()
+            .lower()
+            .replace(" ", "_")
+            .replace("á", "a").replace("é", "e")
+            .replace("í", "i").replace("ó", "o").replace("ú", "u")
+        )
 
-    # Crear carpeta del usuario
-    carpeta_usuario = os.path.join(CARPETA_IMAGENES, f"usuario_{usuario.id}")
-    os.makedirs(carpeta_usuario, exist_ok=True)
+        # Crear carpeta del usuario
+        carpeta_usuario = os.path.join(CARPETA_IMAGENES, f"usuario_{usuario.id}")
+        os.makedirs(carpeta_usuario, exist_ok=True)
 
-    # Generar nombre único con timestamp
-    nombre_archivo = f"{nombre_sanitizado}{extension}"
-    ruta = os.path.join(carpeta_usuario, nombre_archivo)
+        # Generar nombre único con timestamp
+        nombre_archivo = f"{nombre_sanitizado}{extension}"
+        ruta = os.path.join(carpeta_usuario, nombre_archivo)
 
-    # Guardar imagen en disco
-    with open(ruta, "wb") as buffer:
-        shutil.copyfileobj(imagen.file, buffer)
+        # Guardar imagen en disco
+        with open(ruta, "wb") as buffer:
+            shutil.copyfileobj(imagen.file, buffer)
 
-    # Ruta relativa a guardar en la BD
-    ruta_relativa = f"usuario_{usuario.id}/{nombre_archivo}"
+        # Ruta relativa a guardar en la BD
+        ruta_relativa = f"usuario_{usuario.id}/{nombre_archivo}"
 
-    # Guardar en base de datos
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO personas (usuario_id, nombre_completo, departamentos_id, codigo_app, imagen_original)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (usuario.id, nombre_completo, departamentos_id, codigo_app, ruta_relativa))
-    conn.commit()
+        # Guardar en base de datos (misma conexión de la validación)
+        cursor.execute("""
+            INSERT INTO personas (usuario_id, nombre_completo, departamentos_id, codigo_app, imagen_original)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (usuario.id, nombre_completo, departamentos_id, codigo_app, ruta_relativa))
+        conn.commit()
+        TablaPersonas.invalidar(usuario.id)
 
-    return JSONResponse(status_code=200, content={"mensaje": "Persona registrada correctamente"})
+        return JSONResponse(status_code=200, content={"mensaje": "Persona registrada correctamente"})
+    finally:
+        cursor.close()
+        conn.close()
 
 # 🟢 GET /personas/listar
 @personas_router.get("/listar")
 def listar_personas(usuario: DatosToken = Depends(verificar_token)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT p.id,
-               p.nombre_completo,
-               d.nombre          AS departamento,
-               p.departamentos_id,  
-               p.codigo_app,
-               p.imagen_original,
-               p.imagen_mejorada,
-               p.imagen_mejorada_listo,
-               p.creado_en
-        FROM personas  AS p
-        JOIN departamentos AS d ON p.departamentos_id = d.id
-        WHERE p.usuario_id = %s
-        ORDER BY p.creado_en DESC
-    """, (usuario.id,))
-    personas = cursor.fetchall()
-
-    # Añadir rutas completas a imágenes
-    for p in personas:
-        if p["imagen_mejorada_listo"] and p["imagen_mejorada"]:
-            p["imagen_url"] = f"/imagenes_optimizadas/{p['imagen_mejorada']}"
-        else:
-            p["imagen_url"] = f"/imagenes_originales/{p['imagen_original']}"
+    try:
+        cursor.execute("""
+            SELECT p.id,
+                   p.nombre_completo,
+                   d.nombre          AS departamento,
+                   p.departamentos_id,  
+                   p.codigo_app,
+                   p.imagen_original,
+                   p.imagen_mejorada,
+                   p.imagen_mejorada_listo,
+                   p.creado_en
+            FROM personas  AS p
+            JOIN departamentos AS d ON p.departamentos_id = d.id
+            WHERE p.usuario_id = %s
+            ORDER BY p.creado_en DESC
+        """, (usuario.id,))
+        personas = cursor.fetchall()
 
-    return {"personas": personas}
+        # Añadir rutas completas a imágenes
+        for p in personas:
+            if p["imagen_mejorada_listo"] and p["imagen_mejorada"]:
+                p["imagen_url"] = f"/imagenes_optimizadas/{p['imagen_mejorada']}"
+            else:
+                p["imagen_url"] = f"/imagenes_originales/{p['imagen_original']}"
+
+        return {"personas": personas}
+    finally:
+        cursor.close()
+        conn.close()
 
 @personas_router.post("/mejorar")
 def mejorar_imagenes(usuario: DatosToken = Depends(verificar_token)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT id, imagen_original FROM personas
-        WHERE usuario_id = %s AND imagen_mejorada_listo = FALSE
-    """, (usuario.id,))
-    pendientes = cursor.fetchall()
+    try:
+        cursor.execute("""
+            SELECT id, imagen_original FROM personas
+            WHERE usuario_id = %s AND imagen_mejorada_listo = FALSE
+        """, (usuario.id,))
+        pendientes = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
 
     if not pendientes:
         return {"mensaje": "No hay imágenes por mejorar", "total": 0, "archivos": []}
@@ -131,16 +143,23 @@ def mejorar_imagenes(usuario: DatosToken = Depends(verificar_token)):
     lista_relativa = [p["imagen_original"] for p in pendientes]  # Ej: usuario_5/juan_172345.jpg
 
     try:
-        # Enviar rutas relativas al script
+        # Enviar rutas relativas al script (sin conexión del pool tomada: tarda)
         proceso = subprocess.run(
             ["python", "mejorar_imagenes.py"],
             input=json.dumps(lista_relativa).encode("utf-8"),
             capture_output=True,
             check=True,
         )
-        resultado = json.loads(proceso.stdout.decode("utf-8"))
-        procesadas = resultado.get("procesadas", [])
+    except subprocess.CalledProcessError as e:
+        print("STDOUT:", e.stdout.decode("utf-8", errors="ignore"))
+        print("STDERR:", e.stderr.decode("utf-8", errors="ignore"))
+        raise HTTPException(status_code=500, detail="Error al ejecutar el script de mejora")
+    resultado = json.loads(proceso.stdout.decode("utf-8"))
+    procesadas = resultado.get("procesadas", [])
 
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
         for archivo_rel in procesadas:
             cursor.execute("""
                 UPDATE personas
@@ -155,43 +174,139 @@ def mejorar_imagenes(usuario: DatosToken = Depends(verificar_token)):
             "total": len(procesadas),
             "archivos": procesadas
         }
-
-    except subprocess.CalledProcessError as e:
-        print("STDOUT:", e.stdout.decode("utf-8", errors="ignore"))
-        print("STDERR:", e.stderr.decode("utf-8", errors="ignore"))
-        raise HTTPException(status_code=500, detail="Error al ejecutar el script de mejora")
+    finally:
+        cursor.close()
+        conn.close()
 
 # 🔴 DELETE /personas/eliminar/{persona_id}
 @personas_router.delete("/eliminar/{persona_id}")
 def eliminar_persona(persona_id: int = Path(...), usuario: DatosToken = Depends(verificar_token)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
+    try:
+        # Buscar la persona
+        cursor.execute("""
+            SELECT imagen_original, imagen_mejorada, imagen_mejorada_listo
+            FROM personas WHERE id = %s AND usuario_id = %s
+        """, (persona_id, usuario.id))
+        persona = cursor.fetchone()
+
+        if not persona:
+            raise HTTPException(status_code=404, detail="Persona no encontrada")
+
+        # Eliminar imágenes del sistema
+        ruta_original = os.path.join("imagenes_originales", persona["imagen_original"])
+        if os.path.exists(ruta_original):
+            os.remove(ruta_original)
+
+        if persona["imagen_mejorada_listo"] and persona["imagen_mejorada"]:
+            ruta_mejorada = os.path.join("imagenes_optimizadas", persona["imagen_mejorada"])
+            if os.path.exists(ruta_mejorada):
+                os.remove(ruta_mejorada)
+
+        # Imágenes de referencia adicionales (las filas caen por ON DELETE CASCADE)
+        cursor.execute("SELECT imagen FROM personas_imagenes WHERE persona_id = %s", (persona_id,))
+        for ref in cursor.fetchall():
+            ruta_ref = os.path.join("imagenes_optimizadas", ref["imagen"])
+            if os.path.exists(ruta_ref):
+                os.remove(ruta_ref)
+
+        # Eliminar en la base de datos
+        cursor.execute("DELETE FROM personas WHERE id = %s AND usuario_id = %s", (persona_id, usuario.id))
+        conn.commit()
+        TablaPersonas.invalidar(usuario.id)   # la cámara deja de nombrarla sin esperar al modelo
+
+        return JSONResponse(content={"mensaje": "Persona eliminada correctamente"})
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# 🔵 POST /personas/{persona_id}/imagenes
+# Imagen de referencia adicional: entra tal cual al modelo (sin mejora), con
+# el mismo persona_id que la principal, en la próxima generación del modelo.
+@personas_router.post("/{persona_id}/imagenes")
+def agregar_imagen_referencia(
+    persona_id: int = Path(...),
+    imagen: UploadFile = Form(...),
+    usuario: DatosToken = Depends(verificar_token)
+):
+    extension = os.path.splitext(imagen.filename)[1].lower()
+    if extension not in [".jpg", ".jpeg", ".png"]:
+        raise HTTPException(status_code=400, detail="Formato de imagen inválido")
 
-    # Buscar la persona
-    cursor.execute("""
-        SELECT imagen_original, imagen_mejorada, imagen_mejorada_listo
-        FROM personas WHERE id = %s AND usuario_id = %s
-    """, (persona_id, usuario.id))
-    persona = cursor.fetchone()
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT id FROM personas WHERE id = %s AND usuario_id = %s", (persona_id, usuario.id))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Persona no encontrada")
 
-    if not persona:
-        raise HTTPException(status_code=404, detail="Persona no encontrada")
+        carpeta = os.path.join("imagenes_optimizadas", f"usuario_{usuario.id}", "referencias")
+        os.makedirs(carpeta, exist_ok=True)
+        nombre_archivo = f"persona_{persona_id}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}{extension}"
+        with open(os.path.join(carpeta, nombre_archivo), "wb") as buffer:
+            shutil.copyfileobj(imagen.file, buffer)
 
-    # Eliminar imágenes del sistema
-    ruta_original = os.path.join("imagenes_originales", persona["imagen_original"])
-    if os.path.exists(ruta_original):
-        os.remove(ruta_original)
+        ruta_relativa = f"usuario_{usuario.id}/referencias/{nombre_archivo}"
+        cursor.execute("""
+            INSERT INTO personas_imagenes (persona_id, usuario_id, imagen)
+            VALUES (%s, %s, %s)
+        """, (persona_id, usuario.id, ruta_relativa))
+        conn.commit()
 
-    if persona["imagen_mejorada_listo"] and persona["imagen_mejorada"]:
-        ruta_mejorada = os.path.join("imagenes_optimizadas", persona["imagen_mejorada"])
-        if os.path.exists(ruta_mejorada):
-            os.remove(ruta_mejorada)
+        return {"id": cursor.lastrowid, "imagen_url": f"/imagenes_optimizadas/{ruta_relativa}"}
+    finally:
+        cursor.close()
+        conn.close()
 
-    # Eliminar en la base de datos
-    cursor.execute("DELETE FROM personas WHERE id = %s AND usuario_id = %s", (persona_id, usuario.id))
-    conn.commit()
+# 🟢 GET /personas/{persona_id}/imagenes
+@personas_router.get("/{persona_id}/imagenes")
+def listar_imagenes_referencia(persona_id: int = Path(...), usuario: DatosToken = Depends(verificar_token)):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT id, imagen, creado_en FROM personas_imagenes
+            WHERE persona_id = %s AND usuario_id = %s
+            ORDER BY creado_en
+        """, (persona_id, usuario.id))
+        imagenes = cursor.fetchall()
+        for img in imagenes:
+            img["imagen_url"] = f"/imagenes_optimizadas/{img['imagen']}"
+        return {"imagenes": imagenes}
+    finally:
+        cursor.close()
+        conn.close()
+
+# 🔴 DELETE /personas/{persona_id}/imagenes/{imagen_id}
+@personas_router.delete("/{persona_id}/imagenes/{imagen_id}")
+def eliminar_imagen_referencia(
+    persona_id: int = Path(...),
+    imagen_id: int = Path(...),
+    usuario: DatosToken = Depends(verificar_token)
+):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT imagen FROM personas_imagenes
+            WHERE id = %s AND persona_id = %s AND usuario_id = %s
+        """, (imagen_id, persona_id, usuario.id))
+        ref = cursor.fetchone()
+        if not ref:
+            raise HTTPException(status_code=404, detail="Imagen no encontrada")
+
+        ruta = os.path.join("imagenes_optimizadas", ref["imagen"])
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        cursor.execute("DELETE FROM personas_imagenes WHERE id = %s", (imagen_id,))
+        conn.commit()
 
-    return JSONResponse(content={"mensaje": "Persona eliminada correctamente"})
+        return JSONResponse(content={"mensaje": "Imagen eliminada correctamente"})
+    finally:
+        cursor.close()
+        conn.close()
 
 
 def guardar_imagen(imagen: UploadFile, nombre_completo: str, usuario_id: int) -> str:
@@ -234,120 +349,132 @@ async def modificar_persona(
 ):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
-    cursor.execute(
-        "SELECT id FROM departamentos WHERE id=%s AND usuario_id=%s",
-        (departamentos_id, usuario.id)
-    )
-    if cursor.fetchone() is None:
-        raise HTTPException(status_code=400, detail="Departamento inválido")
-
-    # 🧠 Verificar existencia y propiedad
-    cursor.execute("SELECT * FROM personas WHERE id = %s AND usuario_id = %s", (persona_id, usuario.id))
-    persona = cursor.fetchone()
-    if not persona:
-        raise HTTPException(status_code=404, detail="Persona no encontrada")
-
-    imagen_cambiada = imagen_cambiada.lower() == "true"
-    nueva_ruta_relativa = persona["imagen_original"]  # mantener si no cambia imagen
-
-    if imagen_cambiada and imagen:
-        extension = os.path.splitext(imagen.filename)[1].lower()
-        if extension not in [".jpg", ".jpeg", ".png"]:
-            raise HTTPException(status_code=400, detail="Formato de imagen inválido")
-
-        nombre_sanitizado = (
-            nombre_completo.strip()
-            .lower()
-            .replace(" ", "_")
-            .replace("á", "a").replace("é", "e")
-            .replace("í", "i").replace("ó", "o").replace("ú", "u")
+    try:
+        cursor.execute(
+            "SELECT id FROM departamentos WHERE id=%s AND usuario_id=%s",
+            (departamentos_id, usuario.id)
         )
+        if cursor.fetchone() is None:
+            raise HTTPException(status_code=400, detail="Departamento inválido")
+
+        # 🧠 Verificar existencia y propiedad
+        cursor.execute("SELECT * FROM personas WHERE id = %s AND usuario_id = %s", (persona_id, usuario.id))
+        persona = cursor.fetchone()
+        if not persona:
+            raise HTTPException(status_code=404, detail="Persona no encontrada")
+
+        imagen_cambiada = imagen_cambiada.lower() == "true"
+        nueva_ruta_relativa = persona["imagen_original"]  # mantener si no cambia imagen
+
+        if imagen_cambiada and imagen:
+            extension = os.path.splitext(imagen.filename)[1].lower()
+            if extension not in [".jpg", ".jpeg", ".png"]:
+                raise HTTPException(status_code=400, detail="Formato de imagen inválido")
+
+            nombre_sanitizado = (
+                nombre_completo.strip()
+                .lower()
+                .replace(" ", "_")
+                .replace("á", "a").replace("é", "e")
+                .replace("í", "i").replace("ó", "o").replace("ú", "u")
+            )
+
+            # 📁 Crear carpeta del usuario
+            carpeta_usuario = os.path.join(CARPETA_IMAGENES, f"usuario_{usuario.id}")
+            os.makedirs(carpeta_usuario, exist_ok=True)
+
+            # 📝 Generar nombre único (por timestamp)
+            nombre_archivo = f"{nombre_sanitizado}{int(datetime.now().timestamp())}{extension}"
+            ruta_absoluta = os.path.join(carpeta_usuario, nombre_archivo)
+
+            # 💾 Guardar imagen
+            try:
+                with open(ruta_absoluta, "wb") as buffer:
+                    shutil.copyfileobj(imagen.file, buffer)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"No se pudo guardar la imagen: {str(e)}")
+
+            # 🗑️ Eliminar imagen anterior
+            anterior = os.path.join(CARPETA_IMAGENES, persona["imagen_original"])
+            if os.path.exists(anterior):
+                os.remove(anterior)
+
+            # 🗑️ Eliminar imagen mejorada
+            if persona["imagen_mejorada"]:
+                mejorada = os.path.join("imagenes_optimizadas", persona["imagen_mejorada"])
+                if os.path.exists(mejorada):
+                    os.remove(mejorada)
+
+            # ✅ Nueva ruta relativa
+            nueva_ruta_relativa = f"usuario_{usuario.id}/{nombre_archivo}"
+
+            # 🧠 Actualizar datos e invalidar mejora
+            cursor.execute("""
+                UPDATE personas
+                SET nombre_completo = %s, departamentos_id = %s, codigo_app = %s,
+                    imagen_original = %s, imagen_mejorada = NULL, imagen_mejorada_listo = FALSE
+                WHERE id = %s AND usuario_id = %s
+            """, (nombre_completo, departamentos_id, codigo_app, nueva_ruta_relativa, persona_id, usuario.id))
+        else:
+            # 🔁 Solo datos de texto
+            cursor.execute("""
+                UPDATE personas
+                SET nombre_completo = %s, departamentos_id = %s, codigo_app = %s
+                WHERE id = %s AND usuario_id = %s
+            """, (nombre_completo, departamentos_id, codigo_app, persona_id, usuario.id))
 
-        # 📁 Crear carpeta del usuario
-        carpeta_usuario = os.path.join(CARPETA_IMAGENES, f"usuario_{usuario.id}")
-        os.makedirs(carpeta_usuario, exist_ok=True)
-
-        # 📝 Generar nombre único (por timestamp)
-        nombre_archivo = f"{nombre_sanitizado}{int(datetime.now().timestamp())}{extension}"
-        ruta_absoluta = os.path.join(carpeta_usuario, nombre_archivo)
-
-        # 💾 Guardar imagen
-        try:
-            with open(ruta_absoluta, "wb") as buffer:
-                shutil.copyfileobj(imagen.file, buffer)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"No se pudo guardar la imagen: {str(e)}")
-
-        # 🗑️ Eliminar imagen anterior
-        anterior = os.path.join(CARPETA_IMAGENES, persona["imagen_original"])
-        if os.path.exists(anterior):
-            os.remove(anterior)
-
-        # 🗑️ Eliminar imagen mejorada
-        if persona["imagen_mejorada"]:
-            mejorada = os.path.join("imagenes_optimizadas", persona["imagen_mejorada"])
-            if os.path.exists(mejorada):
-                os.remove(mejorada)
-
-        # ✅ Nueva ruta relativa
-        nueva_ruta_relativa = f"usuario_{usuario.id}/{nombre_archivo}"
-
-        # 🧠 Actualizar datos e invalidar mejora
-        cursor.execute("""
-            UPDATE personas
-            SET nombre_completo = %s, departamentos_id = %s, codigo_app = %s,
-                imagen_original = %s, imagen_mejorada = NULL, imagen_mejorada_listo = FALSE
-            WHERE id = %s AND usuario_id = %s
-        """, (nombre_completo, departamentos_id, codigo_app, nueva_ruta_relativa, persona_id, usuario.id))
-    else:
-        # 🔁 Solo datos de texto
-        cursor.execute("""
-            UPDATE personas
-            SET nombre_completo = %s, departamentos_id = %s, codigo_app = %s
-            WHERE id = %s AND usuario_id = %s
-        """, (nombre_completo, departamentos_id, codigo_app, persona_id, usuario.id))
-
-    conn.commit()
-    return {"mensaje": "Persona modificada correctamente"}
+        conn.commit()
+        TablaPersonas.invalidar(usuario.id)   # nombre / departamento en vivo sin regenerar el modelo
+        return {"mensaje": "Persona modificada correctamente"}
+    finally:
+        cursor.close()
+        conn.close()
 
 # ✅ personas.py (al final)
 @personas_router.get("/notificaciones")
 async def obtener_notificaciones(usuario: DatosToken = Depends(verificar_token)):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT COUNT(*) FROM personas
-        WHERE usuario_id = %s AND imagen_mejorada_listo = FALSE
-    """, (usuario.id,))
-    total = cursor.fetchone()[0]
-    return {"pendientes": total}
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) FROM personas
+            WHERE usuario_id = %s AND imagen_mejorada_listo = FALSE
+        """, (usuario.id,))
+        total = cursor.fetchone()[0]
+        return {"pendientes": total}
+    finally:
+        cursor.close()
+        conn.close()
 
 # ✅ GET /personas/estado_modelo
 @personas_router.get("/estado_modelo")
 def estado_modelo(usuario: DatosToken = Depends(verificar_token)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
+    try:
+        # Conteo total de personas
+        cursor.execute("SELECT COUNT(*) AS total FROM personas WHERE usuario_id = %s", (usuario.id,))
+        total = cursor.fetchone()["total"]
 
-    # Conteo total de personas
-    cursor.execute("SELECT COUNT(*) AS total FROM personas WHERE usuario_id = %s", (usuario.id,))
-    total = cursor.fetchone()["total"]
-
-    # Total mejoradas
-    cursor.execute("SELECT COUNT(*) AS mejoradas FROM personas WHERE usuario_id = %s AND imagen_mejorada_listo = TRUE", (usuario.id,))
-    mejoradas = cursor.fetchone()["mejoradas"]
+        # Total mejoradas
+        cursor.execute("SELECT COUNT(*) AS mejoradas FROM personas WHERE usuario_id = %s AND imagen_mejorada_listo = TRUE", (usuario.id,))
+        mejoradas = cursor.fetchone()["mejoradas"]
 
-    # Última generación de modelo
-    cursor.execute("SELECT fecha FROM modelos_generados WHERE usuario_id = %s ORDER BY fecha DESC LIMIT 1", (usuario.id,))
-    fila = cursor.fetchone()
-    ultima_fecha = fila["fecha"].strftime("%Y-%m-%d %H:%M:%S") if fila else None
+        # Última generación de modelo
+        cursor.execute("SELECT fecha FROM modelos_generados WHERE usuario_id = %s ORDER BY fecha DESC LIMIT 1", (usuario.id,))
+        fila = cursor.fetchone()
+        ultima_fecha = fila["fecha"].strftime("%Y-%m-%d %H:%M:%S") if fila else None
 
-    return {
-        "total": total,
-        "mejoradas": mejoradas,
-        "faltan": total - mejoradas,
-        "ultima_fecha": ultima_fecha,
-        "hay_similares": False  # Por ahora en falso (puedes implementar luego con embeddings)
-    }
+        return {
+            "total": total,
+            "mejoradas": mejoradas,
+            "faltan": total - mejoradas,
+            "ultima_fecha": ultima_fecha,
+            "hay_similares": False  # Por ahora en falso (puedes implementar luego con embeddings)
+        }
+    finally:
+        cursor.close()
+        conn.close()
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 1️⃣  POST  /personas/registrar_modelo   (dispara generar_embeddings.py)
@@ -356,21 +483,24 @@ def estado_modelo(usuario: DatosToken = Depends(verificar_token)):
 def registrar_modelo(usuario: DatosToken = Depends(verificar_token)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
-
-    # ¿Hay personas optimizadas?
-    cursor.execute("""
-        SELECT COUNT(*) AS total,
-               SUM(imagen_mejorada_listo) AS optimizadas
-        FROM personas
-        WHERE usuario_id = %s
-    """, (usuario.id,))
-    fila = cursor.fetchone()
-    if fila["total"] == 0:
-        raise HTTPException(status_code=400, detail="No hay personas registradas")
-    if fila["total"] != fila["optimizadas"]:
-        raise HTTPException(status_code=400, detail="Existen imágenes sin optimizar")
-
-    # ── Ejecutar el script de embeddings ───────────────────────────────────────
+    try:
+        # ¿Hay personas optimizadas?
+        cursor.execute("""
+            SELECT COUNT(*) AS total,
+                   SUM(imagen_mejorada_listo) AS optimizadas
+            FROM personas
+            WHERE usuario_id = %s
+        """, (usuario.id,))
+        fila = cursor.fetchone()
+        if fila["total"] == 0:
+            raise HTTPException(status_code=400, detail="No hay personas registradas")
+        if fila["total"] != fila["optimizadas"]:
+            raise HTTPException(status_code=400, detail="Existen imágenes sin optimizar")
+    finally:
+        cursor.close()
+        conn.close()
+
+    # ── Ejecutar el script de embeddings (sin conexión del pool tomada: tarda) ──
     try:
         proc = subprocess.run(
             ["python", "generar_embeddings.py", str(usuario.id)],
@@ -386,20 +516,26 @@ def registrar_modelo(usuario: DatosToken = Depends(verificar_token)):
         print("STDERR:", e.stderr, file=sys.stderr)
         raise HTTPException(status_code=500, detail="Error al generar el modelo")
 
-    # ── Consultar el registro recién creado para devolver métricas ─────────────
-    cursor.execute("""
-        SELECT id, ruta_modelo, fecha, cantidad_embeddings,
-               cantidad_descartados, tiempo_total_segundos
-        FROM modelos_generados
-        WHERE usuario_id = %s
-        ORDER BY fecha DESC LIMIT 1
-    """, (usuario.id,))
-    modelo = cursor.fetchone()
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # ── Consultar el registro recién creado para devolver métricas ─────────────
+        cursor.execute("""
+            SELECT id, ruta_modelo, fecha, cantidad_embeddings,
+                   cantidad_descartados, tiempo_total_segundos
+            FROM modelos_generados
+            WHERE usuario_id = %s
+            ORDER BY fecha DESC LIMIT 1
+        """, (usuario.id,))
+        modelo = cursor.fetchone()
 
-    return {
-        "mensaje": "Modelo generado correctamente",
-        "modelo": modelo
-    }
+        return {
+            "mensaje": "Modelo generado correctamente",
+            "modelo": modelo
+        }
+    finally:
+        cursor.close()
+        conn.close()
 
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -414,30 +550,59 @@ def errores_modelo(
 ):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
+    try:
+        # Seleccionar el modelo
+        if modelo_id:
+            cursor.execute("""
+                SELECT ruta_errores FROM modelos_generados
+                WHERE id = %s AND usuario_id = %s
+            """, (modelo_id, usuario.id))
+        else:
+            cursor.execute("""
+                SELECT ruta_errores FROM modelos_generados
+                WHERE usuario_id = %s ORDER BY fecha DESC LIMIT 1
+            """, (usuario.id,))
+        fila = cursor.fetchone()
+        if not fila or not fila["ruta_errores"]:
+            raise HTTPException(status_code=404, detail="No se encontró el modelo o no hay errores")
 
-    # Seleccionar el modelo
-    if modelo_id:
-        cursor.execute("""
-            SELECT ruta_errores FROM modelos_generados
-            WHERE id = %s AND usuario_id = %s
-        """, (modelo_id, usuario.id))
-    else:
+        ruta_errores = FilePath(fila["ruta_errores"])
+        if not ruta_errores.exists():
+            raise HTTPException(status_code=404, detail="Archivo de errores no encontrado")
+
+        with open(ruta_errores, "r", encoding="utf-8") as f:
+            errores = json.load(f)
+
+        return {"errores": errores}
+    finally:
+        cursor.close()
+        conn.close()
+
+# ────────────────────────────────────────────────────────────────
+# 2️⃣b GET /personas/reporte_indice   (recall vs. latencia del índice)
+# ────────────────────────────────────────────────────────────────
+@personas_router.get("/reporte_indice")
+def reporte_indice(usuario: DatosToken = Depends(verificar_token)):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
         cursor.execute("""
-            SELECT ruta_errores FROM modelos_generados
+            SELECT ruta_modelo FROM modelos_generados
             WHERE usuario_id = %s ORDER BY fecha DESC LIMIT 1
         """, (usuario.id,))
-    fila = cursor.fetchone()
-    if not fila or not fila["ruta_errores"]:
-        raise HTTPException(status_code=404, detail="No se encontró el modelo o no hay errores")
-
-    ruta_errores = FilePath(fila["ruta_errores"])
-    if not ruta_errores.exists():
-        raise HTTPException(status_code=404, detail="Archivo de errores no encontrado")
+        fila = cursor.fetchone()
+        if not fila:
+            raise HTTPException(status_code=404, detail="No existe un modelo todavía")
 
-    with open(ruta_errores, "r", encoding="utf-8") as f:
-        errores = json.load(f)
+        ruta_reporte = FilePath(fila["ruta_modelo"]).parent / "reporte_indice.json"
+        if not ruta_reporte.exists():
+            raise HTTPException(status_code=404, detail="El modelo no tiene reporte de índice")
 
-    return {"errores": errores}
+        with open(ruta_reporte, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        cursor.close()
+        conn.close()
 
 # ────────────────────────────────────────────────────────────────
 # 3️⃣  POST /personas/generar_modelo_async
@@ -448,43 +613,46 @@ def errores_modelo(
 def generar_modelo_async(usuario: DatosToken = Depends(verificar_token)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
+    try:
+        # Comprobar que todas las imágenes están optimizadas
+        cursor.execute("""
+            SELECT p.id, p.nombre_completo, d.nombre AS departamento,
+            p.imagen_mejorada
+            FROM personas p
+            JOIN departamentos d ON p.departamentos_id = d.id
+            WHERE p.usuario_id = %s AND p.imagen_mejorada_listo = TRUE
+        """, (usuario.id,))
+        lista = cursor.fetchall()
+        if not lista:
+            raise HTTPException(status_code=400, detail="No hay imágenes optimizadas")
 
-    # Comprobar que todas las imágenes están optimizadas
-    cursor.execute("""
-        SELECT p.id, p.nombre_completo, d.nombre AS departamento,
-        p.imagen_mejorada
-        FROM personas p
-        JOIN departamentos d ON p.departamentos_id = d.id
-        WHERE p.usuario_id = %s AND p.imagen_mejorada_listo = TRUE
-    """, (usuario.id,))
-    lista = cursor.fetchall()
-    if not lista:
-        raise HTTPException(status_code=400, detail="No hay imágenes optimizadas")
-
-    # ➜ TIEMPO ESTIMADO - simple heurística (2 s/img + 5 s sobre-head)
-    estimado = len(lista) * 10 + 10
-
-    # Lanza el script sin bloquear
-    subprocess.Popen(
-        ["python", "generar_embeddings.py", str(usuario.id)],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL
-    )
+        # ➜ TIEMPO ESTIMADO - simple heurística (2 s/img + 5 s sobre-head)
+        estimado = len(lista) * 10 + 10
 
-    # Devuelve datos mínimos para la animación
-    personas_anim = [
-        {
-            "nombre": p["nombre_completo"],
-            "departamento": p["departamento"],  # Añade este campo
-            "imagen_url": f"/imagenes_optimizadas/{p['imagen_mejorada']}"
-        } for p in lista
-    ]
+        # Lanza el script sin bloquear
+        subprocess.Popen(
+            ["python", "generar_embeddings.py", str(usuario.id)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
 
-    return {
-        "mensaje": "Generación de modelo iniciada",
-        "estimado_segundos": estimado,
-        "personas": personas_anim
-    }
+        # Devuelve datos mínimos para la animación
+        personas_anim = [
+            {
+                "nombre": p["nombre_completo"],
+                "departamento": p["departamento"],  # Añade este campo
+                "imagen_url": f"/imagenes_optimizadas/{p['imagen_mejorada']}"
+            } for p in lista
+        ]
+
+        return {
+            "mensaje": "Generación de modelo iniciada",
+            "estimado_segundos": estimado,
+            "personas": personas_anim
+        }
+    finally:
+        cursor.close()
+        conn.close()
 
 
 # ───────────────────────────────────────────────────────────────
@@ -492,15 +660,18 @@ def generar_modelo_async(usuario: DatosToken = Depends(verificar_token)):
 def analitica_modelo(usuario: DatosToken = Depends(verificar_token)):
     conn   = get_connection()
     cursor = conn.cursor(dictionary=True)
-
-    # último modelo p/usuario
-    cursor.execute("""
-        SELECT ruta_modelo, ruta_errores
-        FROM modelos_generados
-        WHERE usuario_id = %s
-        ORDER BY fecha DESC LIMIT 1
-    """, (usuario.id,))
-    modelo = cursor.fetchone()
+    try:
+        # último modelo p/usuario
+        cursor.execute("""
+            SELECT ruta_modelo, ruta_errores
+            FROM modelos_generados
+            WHERE usuario_id = %s
+            ORDER BY fecha DESC LIMIT 1
+        """, (usuario.id,))
+        modelo = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
     if not modelo:
         raise HTTPException(status_code=404, detail="No existe un modelo todavía")
 
@@ -515,6 +686,9 @@ def analitica_modelo(usuario: DatosToken = Depends(verificar_token)):
 
     nombres   = data_pkl.get("nombres", [])
     embeds    = data_pkl.get("embeddings", [])
+    ids       = data_pkl.get("ids")               # persona_id por fila (se repite con varias imágenes)
+    if ids is None:
+        ids = np.arange(len(nombres))
     DIM       = 512
     if not nombres or not isinstance(embeds, (list, np.ndarray)):
         raise HTTPException(status_code=500, detail="embeddings.pkl corrupto")
@@ -531,7 +705,8 @@ def analitica_modelo(usuario: DatosToken = Depends(verificar_token)):
 
     # ── stats ───────────────────────────────────────────────────
     stats = {
-        "personas"   : len(nombres),
+        "personas"   : len(set(np.asarray(ids).tolist())),
+        "embeddings" : len(nombres),
         "rechazados" : len(rechazados),
         "dimension"  : DIM,
         "clusters"   : min(3, len(nombres)) if len(nombres) >= 3 else 1
@@ -553,16 +728,17 @@ def analitica_modelo(usuario: DatosToken = Depends(verificar_token)):
         for n, (x, y), c in zip(nombres, coords, labels)
     ]
 
-    # ── vecinos más cercanos ───────────────────────────────────
-    index = faiss.IndexFlatIP(DIM)
-    index.add(vectores)
+    # ── vecinos más cercanos (mismo tipo de índice que el modelo) ──
+    index = construir_indice(vectores, np.arange(len(vectores), dtype=np.int64))
     K = min(3, len(nombres)-1)
-    D, I = index.search(vectores, K+1)
+    D, I = index.search(vectores, min(len(vectores), 4 * (K+1)))   # margen para saltear la misma persona
     vecinos = []
     for i, nombre in enumerate(nombres):
-        for k in range(1, K+1):
-            j   = int(I[i][k])
-            sim = float(D[i][k])
+        # con índices aproximados el propio vector puede no salir primero
+        # y las otras imágenes de la misma persona no cuentan como vecinas
+        cercanos = [(int(j), float(d)) for j, d in zip(I[i], D[i])
+                    if j >= 0 and j != i and ids[j] != ids[i]][:K]
+        for j, sim in cercanos:
             vecinos.append({
                 "persona"   : nombre,
                 "vecino"    : nombres[j],
@@ -0,0 +1,161 @@
+# ✅ omniface-backend/presencia.py
+"""
+Tabla de presencia en memoria con escritura diferida a `estado_persona`.
+
+Las sesiones actualizan el diccionario en memoria (persona_id → estado) en
+cada frame analizado en que la persona está a la vista, así `timestamp` es
+el último avistamiento. Un hilo escritor junta las filas tocadas desde el
+último volcado (varias actualizaciones de una persona quedan en una fila) y
+las vuelca con un único INSERT … ON DUPLICATE KEY UPDATE cada
+PRESENCIA_FLUSH_S segundos, o antes si hay PRESENCIA_FLUSH_MAX personas
+pendientes. Si la escritura falla
+las filas vuelven a quedar pendientes para el siguiente intento.
+
+/recon/estados se responde desde esta misma tabla; cada usuario se carga
+desde la BD la primera vez que se consulta.
+"""
+from datetime import datetime
+from threading import Thread, Lock, Event
+
+from database import get_connection
+from config import PRESENCIA_FLUSH_S, PRESENCIA_FLUSH_MAX
+from bitacora import obtener
+from metricas import Metricas
+
+log = obtener(__name__)
+
+_UPSERT = """
+    INSERT INTO estado_persona (persona_id, emocion_actual, ubicacion_actual, timestamp_ultimo)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    emocion_actual = VALUES(emocion_actual),
+    ubicacion_actual = VALUES(ubicacion_actual),
+    timestamp_ultimo = VALUES(timestamp_ultimo)
+"""
+
+
+class Presencia:
+    """Estado global (clase) como ControlAdmision."""
+    _lock = Lock()
+    _estado: dict = {}        # persona_id → {"usuario_id", "nombre", "emocion", "ubicacion", "timestamp"}
+    _pendientes: set = set()  # persona_id con cambios sin escribir
+    _cargados: set = set()    # usuario_id ya leídos de la BD
+    _hilo: Thread = None
+    _despertar = Event()
+    _parar = Event()
+
+    # ---------- escritura (sesiones) ----------
+    @classmethod
+    def actualizar(cls, usuario_id: int, persona_id: int, nombre: str, emocion: str, ubicacion: str):
+        """Registra el estado actual y el último avistamiento; se vuelca en el próximo ciclo."""
+        ahora = datetime.now()
+        with cls._lock:
+            cls._estado[persona_id] = {
+                "usuario_id": usuario_id, "nombre": nombre,
+                "emocion": emocion, "ubicacion": ubicacion, "timestamp": ahora,
+            }
+            nueva = persona_id not in cls._pendientes
+            cls._pendientes.add(persona_id)
+            lleno = nueva and len(cls._pendientes) >= PRESENCIA_FLUSH_MAX
+        cls._asegurar_hilo()
+        if lleno:
+            cls._despertar.set()
+
+    # ---------- lectura (/recon/estados) ----------
+    @classmethod
+    def estados(cls, usuario_id: int) -> list:
+        if usuario_id not in cls._cargados:
+            cls._cargar(usuario_id)
+        with cls._lock:
+            return [
+                {"nombre": e["nombre"], "emocion": e["emocion"],
+                 "ubicacion": e["ubicacion"], "timestamp_ultimo": e["timestamp"]}
+                for e in cls._estado.values() if e["usuario_id"] == usuario_id
+            ]
+
+    @classmethod
+    def _cargar(cls, usuario_id: int):
+        conn = get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+              SELECT e.persona_id, p.nombre_completo as nombre, e.emocion_actual as emocion,
+                     e.ubicacion_actual as ubicacion, e.timestamp_ultimo
+              FROM estado_persona e
+              LEFT JOIN personas p ON e.persona_id = p.id
+              WHERE p.usuario_id = %s
+            """, (usuario_id,))
+            filas = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        with cls._lock:
+            for f in filas:
+                # lo que ya está en memoria es más nuevo que la BD
+                cls._estado.setdefault(f["persona_id"], {
+                    "usuario_id": usuario_id, "nombre": f["nombre"],
+                    "emocion": f["emocion"], "ubicacion": f["ubicacion"],
+                    "timestamp": f["timestamp_ultimo"],
+                })
+            cls._cargados.add(usuario_id)
+
+    # ---------- escritor ----------
+    @classmethod
+    def _asegurar_hilo(cls):
+        if cls._hilo is None or not cls._hilo.is_alive():
+            with cls._lock:
+                if cls._hilo is None or not cls._hilo.is_alive():
+                    cls._parar.clear()
+                    cls._hilo = Thread(target=cls._bucle, name="presencia", daemon=True)
+                    cls._hilo.start()
+
+    @classmethod
+    def _bucle(cls):
+        while not cls._parar.is_set():
+            cls._despertar.wait(PRESENCIA_FLUSH_S)
+            cls._despertar.clear()
+            cls.volcar()
+
+    @classmethod
+    def volcar(cls) -> int:
+        """Escribe en un solo lote las filas pendientes. Devuelve cuántas."""
+        with cls._lock:
+            ids, cls._pendientes = cls._pendientes, set()
+            filas = [
+                (pid, cls._estado[pid]["emocion"], cls._estado[pid]["ubicacion"], cls._estado[pid]["timestamp"])
+                for pid in ids
+            ]
+        if not filas:
+            return 0
+        try:
+            with Metricas.medir("bd"):
+                conn = get_connection()
+                try:
+                    cursor = conn.cursor()
+                    cursor.executemany(_UPSERT, filas)
+                    conn.commit()
+                    cursor.close()
+                finally:
+                    conn.close()
+        except Exception as e:
+            log.error("Volcado de estado_persona falló filas=%d: %s", len(filas), e)
+            Metricas.contar("omniface_bd_errores_total", tabla="estado_persona")
+            with cls._lock:
+                cls._pendientes |= ids     # se reintenta en el próximo ciclo
+            return 0
+        log.debug("estado_persona: %d filas volcadas", len(filas))
+        Metricas.contar("omniface_bd_filas_total", len(filas), tabla="estado_persona")
+        return len(filas)
+
+    @classmethod
+    def detener(cls):
+        """Último volcado al apagar el servidor."""
+        cls._parar.set()
+        cls._despertar.set()
+        if cls._hilo is not None:
+            cls._hilo.join(timeout=5)
+        cls.volcar()
+
+
+Metricas.medidor("omniface_presencia_pendientes", "Filas de estado_persona sin volcar",
+                 lambda: len(Presencia._pendientes))
@@ -28,28 +28,36 @@ def verificar_token(token: str = Depends(oauth2_scheme)) -> DatosToken:
 def obtener_nombre_desde_bd(usuario_id: int) -> str:
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT nombre FROM usuarios WHERE id = %s", (usuario_id,))
-    resultado = cursor.fetchone()
-    return resultado[0] if resultado else "Usuario"
+    try:
+        cursor.execute("SELECT nombre FROM usuarios WHERE id = %s", (usuario_id,))
+        resultado = cursor.fetchone()
+        return resultado[0] if resultado else "Usuario"
+    finally:
+        cursor.close()
+        conn.close()
 
 @usuarios_router.get("/perfil")
 def perfil_usuario(usuario: DatosToken = Depends(verificar_token)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT nombre, correo, imagen FROM usuarios WHERE id = %s", (usuario.id,))
-    datos = cursor.fetchone()
-    if not datos:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    return {
-        "mensaje": "Acceso concedido",
-        "usuario_id": usuario.id,
-        "correo": usuario.sub,
-        "rol": usuario.rol,
-        "imagen": datos["imagen"],  # ✅ Este es nuevo
-        "nombre": obtener_nombre_desde_bd(usuario.id)  # 👈 Agrega esta línea
+    try:
+        cursor.execute("SELECT nombre, correo, imagen FROM usuarios WHERE id = %s", (usuario.id,))
+        datos = cursor.fetchone()
+        if not datos:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        return {
+            "mensaje": "Acceso concedido",
+            "usuario_id": usuario.id,
+            "correo": usuario.sub,
+            "rol": usuario.rol,
+            "imagen": datos["imagen"],  # ✅ Este es nuevo
+            "nombre": obtener_nombre_desde_bd(usuario.id)  # 👈 Agrega esta línea
 
         
-    }
+        }
+    finally:
+        cursor.close()
+        conn.close()
 
 @usuarios_router.get("/panel-admin")
 def acceso_admin(usuario: DatosToken = Depends(verificar_token)):
@@ -3,112 +3,302 @@ os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"       # evita warning de MKL
 os.environ["OMP_NUM_THREADS"]      = "1"          # ↓ evita desbordar hilos
 os.environ["CUDA_MODULE_LOADING"]  = "LAZY"
 
-import cv2, faiss, pickle, time, base64, asyncio, queue 
-import numpy as np
+import cv2, faiss, time, asyncio, queue 
 from pathlib import Path
 from threading import Thread
-from typing import List, Tuple
 from insightface.app import FaceAnalysis
 import functools
-from datetime import datetime, time as dtime 
-from collections import defaultdict
+from datetime import datetime
+from collections import defaultdict, deque
 import uuid
-import mysql.connector
-import mediapipe as mp
-mp_face_mesh = mp.solutions.face_mesh
-mp_drawing = mp.solutions.drawing_utils
-mp_drawing_styles = mp.solutions.drawing_styles
 import torch
 torch.backends.cudnn.benchmark = True
 torch.set_num_threads(1)
 torch.cuda.set_per_process_memory_fraction(0.8)
-from tensorflow.keras.models import load_model  # Para cargar el .h5
+from emociones import EmotionClassifier
+from inferencia_lote import detectar_lote, caras_desde_detecciones, embeddings_lote
+from tracker import FaceTracker
+from admision import ControlAdmision
+from malla import MallaFacial
+from eventos import SumideroEventos, nuevo_evento
+from depuracion_salidas import DepuradorSalidas
+from analitica import AnaliticaCamara
+from registro_diario import RegistroDiario, clave_asistencia
+from tabla_personas import TablaPersonas, DESCONOCIDO
+from presencia import Presencia
+from bitacora import obtener, Muestreado
+from metricas import Metricas
+from modelo_usuario import ModeloManager
+from config import RECON_MAX_BATCH, RECON_MAX_WAIT_MS, PERFIL_CAMARA_DEFAULT, PERFILES_CAMARA
+from config import RECON_COLA_MAX, RECON_FRAME_MAX_EDAD_MS
 TH_SIMILARITY = 0.55
 
+log = obtener(__name__)
+_muestreo = Muestreado(log)   # mensajes por lote / por rostro
+
+def perfil_camara(cam_id: int) -> dict:
+    """Perfil de inferencia de la cámara (config.PERFILES_CAMARA sobre el default)."""
+    return {**PERFIL_CAMARA_DEFAULT, **PERFILES_CAMARA.get(cam_id, {})}
+
+def roi_en_pixeles(roi, shape):
+    """ROI en fracciones 0-1 → (x1, y1, x2, y2) en píxeles del frame."""
+    h, w = shape[:2]
+    if not roi:
+        return 0, 0, w, h
+    fx1, fy1, fx2, fy2 = roi
+    return int(fx1 * w), int(fy1 * h), max(int(fx2 * w), int(fx1 * w) + 1), max(int(fy2 * h), int(fy1 * h) + 1)
+
 # ────────────────────────────────────────────────
 #  Worker global de inferencia     (Paso 2)
 # ────────────────────────────────────────────────
 class InferenceWorker(Thread):
     """
-    Recibe (frame, future) de varias RecognitionSession,
-    procesa por lotes en GPU y resuelve los futures.
+    Planificador de inferencia único para todo el proceso.
+
+    Recibe (tenant_id, frame, tracker) de todas las RecognitionSession,
+    sin importar el usuario, y los procesa en lotes compartidos:
+    una pasada del detector para todos los frames, una pasada de
+    ArcFace para todos los rostros y un FAISS search por tenant.
+    El modelo vigente de cada tenant (índice con etiquetas = persona_id
+    + TablaPersonas) se pide a `resolver` una vez por lote.
+
+    Si el trabajo trae un FaceTracker, sólo se reconocen los tracks
+    que lo necesitan; el resto arrastra identidad y emoción.
+    La sesión recorta el ROI de su cámara antes de enviar, así por la
+    cola sólo viaja esa región, y manda el desplazamiento del recorte:
+    cajas y puntos vuelven en coordenadas del frame completo. El
+    det_size sale del perfil de la cámara (los lotes se agrupan por él).
+
+    La cola es acotada y los frames que esperaron más de
+    RECON_FRAME_MAX_EDAD_MS se descartan (future → None): ante
+    backpressure se prefieren frames frescos a ir atrasado.
     """
-    def __init__(self, face_app, face_mesh, index, nombres,emotion_model):
+    def __init__(self, face_app, emotion_model, resolver,
+                 max_batch: int = RECON_MAX_BATCH, max_wait_ms: float = RECON_MAX_WAIT_MS):
         super().__init__(daemon=True)
         self.face_app  = face_app
-        self.face_mesh = face_mesh 
-        self.index     = index
-        self.nombres   = nombres
         self.emotion_model = emotion_model
-        self.q_in = queue.Queue()   # (frame, future)
+        self.resolver  = resolver        # tenant_id → ModeloUsuario vigente
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait  = max(0.0, max_wait_ms / 1000.0)
+        self.max_edad  = RECON_FRAME_MAX_EDAD_MS / 1000.0
+        self.q_in = queue.Queue(maxsize=RECON_COLA_MAX)   # (tenant_id, frame, tracker, perfil, offset, t_envio, future, loop)
+        self.running = True
         self.start()
 
-    # Sesión llama → devuelve asyncio.Future
-    def submit(self, frame):
-        fut = asyncio.get_running_loop().create_future()
-        self.q_in.put((frame, fut))
+    # Sesión llama → devuelve asyncio.Future (None si la cola está llena)
+    # `frame` es el recorte del ROI; `offset` = (x, y) del recorte en el frame completo
+    def submit(self, tenant_id, frame, tracker=None, perfil=None, offset=(0, 0)):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        try:
+            self.q_in.put_nowait((tenant_id, frame, tracker, perfil, offset, time.monotonic(), fut, loop))
+        except queue.Full:
+            ControlAdmision.observar_descarte()
+            Metricas.contar("omniface_frames_descartados_total", motivo="cola")
+            fut.set_result(None)
         return fut
 
-    # Bucle permanente
-    def run(self):
-        while True:
-            frames, futs = [], []
+    def stop(self):
+        self.running = False
+
+    # Junta hasta max_batch trabajos esperando como mucho max_wait
+    def _recolectar(self):
+        try:
+            lote = [self.q_in.get(timeout=0.05)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + self.max_wait
+        while len(lote) < self.max_batch:
+            restante = limite - time.monotonic()
             try:
-                fr, fu = self.q_in.get(timeout=0.05)
-                frames.append(fr); futs.append(fu)
-                while not self.q_in.empty():
-                    fr, fu = self.q_in.get_nowait()
-                    frames.append(fr); futs.append(fu)
+                item = self.q_in.get(timeout=restante) if restante > 0 else self.q_in.get_nowait()
             except queue.Empty:
+                break
+            lote.append(item)
+        return lote
+
+    @staticmethod
+    def _resolver(fut, loop, res=None, exc=None):
+        # Los futures pertenecen al event loop: se resuelven desde allí
+        def _set():
+            if fut.cancelled():
+                return
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(res)
+        loop.call_soon_threadsafe(_set)
+
+    # Bucle permanente
+    def run(self):
+        while self.running:
+            lote = self._recolectar()
+            if not lote:
+                continue
+
+            # ---------- Descartar frames viejos ----------
+            t_inicio = time.monotonic()
+            frescos = []
+            for item in lote:
+                if t_inicio - item[5] > self.max_edad:
+                    self._resolver(item[6], item[7], None)
+                else:
+                    frescos.append(item)
+            if len(frescos) < len(lote):
+                ControlAdmision.observar_descarte(len(lote) - len(frescos))
+                Metricas.contar("omniface_frames_descartados_total", len(lote) - len(frescos), motivo="edad")
+            lote = frescos
+            if not lote:
                 continue
 
             # ---------- INFERENCIA LOTE ----------
-            batch_results = [self._infer_single(f) for f in frames]
+            trabajos = [(tid, fr, trk, pf, off) for tid, fr, trk, pf, off, _, _, _ in lote]
+            try:
+                batch_results = self._infer_batch(trabajos)
+            except Exception as e:
+                log.exception("Inferencia por lotes falló: %s", e)
+                batch_results = [e] * len(lote)
+            ControlAdmision.observar_lote(len(lote), time.monotonic() - t_inicio, self.q_in.qsize())
 
             # ---------- Resolver futures ----------
-            for fu, res in zip(futs, batch_results):
-                if not fu.cancelled():
-                    fu.set_result(res)
-
-    # Copia aquí tu antigua lógica de RecognitionSession._infer
-    def _infer_single(self, frame):
-        rostros = self.face_app.get(frame)
-        print(f"[DEBUG] Rostros detectados por InsightFace: {len(rostros)}")  # Log para depuración
-        if not rostros:
-            return []
-        embeds = np.array([r.embedding for r in rostros], np.float32)
+            for (_, _, _, _, _, _, fu, lp), res in zip(lote, batch_results):
+                if isinstance(res, Exception):
+                    self._resolver(fu, lp, exc=res)
+                else:
+                    self._resolver(fu, lp, res)
+
+    def _infer_batch(self, trabajos):
+        frames = [fr for _, fr, _, _, _ in trabajos]
+        detecciones = self._detectar(trabajos)
+        caras = caras_desde_detecciones(detecciones)
+        _muestreo.debug("lote", "lote frames=%d rostros=%d", len(frames), len(caras))
+        Metricas.observar("omniface_lote_frames", len(frames))
+        Metricas.observar("omniface_lote_rostros", len(caras))
+
+        # ---------- Tracking: qué rostros necesitan reconocimiento ----------
+        ahora  = time.monotonic()
+        tracks = [None] * len(caras)
+        inicio = 0
+        for i, (_, _, tracker, _, _) in enumerate(trabajos):
+            n = detecciones[i][0].shape[0]
+            if tracker is not None:
+                tracks[inicio:inicio + n] = tracker.actualizar(detecciones[i][0][:, :4])
+            inicio += n
+        pendientes = [k for k, t in enumerate(tracks) if t is None or t.necesita_reconocer(ahora)]
+
+        frescos, errores = self._reconocer(trabajos, frames, caras, pendientes, tracks)
+
+        # ---------- Coordenadas del recorte → frame completo ----------
+        for i, r in caras:
+            ox, oy = trabajos[i][4]
+            if ox or oy:
+                r.bbox = r.bbox + (ox, oy, ox, oy)
+                if r.kps is not None:
+                    r.kps = r.kps + (ox, oy)
+
+        # ---------- Armar resultado por frame ----------
+        resultados = [[] for _ in frames]
+        for k, (i, r) in enumerate(caras):
+            if i in errores:
+                continue
+            t = tracks[k]
+            cambio = False
+            if k in frescos:
+                candidato, nombre, sim, emocion, _ = frescos[k]
+                if t is not None:
+                    cambio = t.asignar(candidato, nombre, emocion, sim, ahora)
+                elif sim >= TH_SIMILARITY and candidato != DESCONOCIDO:
+                    face = self._armar_rostro(r, candidato, nombre, emocion, sim)
+                else:
+                    face = self._armar_rostro(r, DESCONOCIDO, "Desconocido", emocion, sim)
+            if t is not None:
+                face = t.como_rostro(r)
+                face["track_id"] = t.id
+            else:
+                face["track_id"] = None
+            face["cambio_identidad"] = cambio
+            resultados[i].append(face)
+        for i, e in errores.items():
+            resultados[i] = e
+        return resultados
+
+    # Detección agrupada por det_size (los frames ya son el ROI de cada cámara).
+    # Devuelve bboxes/kps en coordenadas del recorte.
+    def _detectar(self, trabajos):
+        detecciones = [None] * len(trabajos)
+        grupos = defaultdict(list)               # det_size → índices de trabajo
+        for i, (_, _, _, perfil, _) in enumerate(trabajos):
+            det_size = perfil["det_size"] if perfil else self.face_app.det_size
+            grupos[tuple(det_size)].append(i)
+
+        for det_size, idxs in grupos.items():
+            with Metricas.medir("deteccion"):
+                res = detectar_lote(self.face_app.det_model, [trabajos[i][1] for i in idxs], det_size)
+            for i, d in zip(idxs, res):
+                detecciones[i] = d
+        return detecciones
+
+    # Embedding + FAISS + emoción sólo para las caras `pendientes`.
+    # Las caras con track se buscan con la media de su ventana de embeddings.
+    def _reconocer(self, trabajos, frames, caras, pendientes, tracks):
+        frescos, errores = {}, {}
+        if not pendientes:
+            return frescos, errores
+        sub = [caras[k] for k in pendientes]
+        with Metricas.medir("embedding"):
+            embeds = embeddings_lote(self.face_app.models["recognition"], frames, sub).copy()
         faiss.normalize_L2(embeds)
-        D, I = self.index.search(embeds, 1)
-        faces = []
-        for r, d, i in zip(rostros, D.ravel(), I.ravel()):
-            sim = float(d)
-            name = self.nombres[i] if sim >= TH_SIMILARITY else "Desconocido"
-            x1, y1, x2, y2 = map(int, r.bbox)
-            emocion = "N/A"
-            if self.emotion_model is not None:
-                try:
-                    face_region = frame[y1:y2, x1:x2]
-                    if face_region.size > 0:
-                        gray = cv2.cvtColor(face_region, cv2.COLOR_BGR2GRAY)
-                        gray = cv2.convertScaleAbs(gray, alpha=1.2, beta=10)
-                        resized = cv2.resize(gray, (48, 48))
-                        resized = resized.astype('float32') / 255.0
-                        input_array = np.expand_dims(np.expand_dims(resized, axis=-1), axis=0)
-                        pred = self.emotion_model.predict(input_array, verbose=0)[0]
-                        emociones = ['Angry', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
-                        emocion = emociones[np.argmax(pred)]
-                        probs_str = ', '.join(f'{emociones[i]}: {float(pred[i]):.4f}' for i in range(len(emociones)))
-                        print(f"[DEBUG] Emoción probs para {name}: {{ {probs_str} }}")
-                except Exception as e:
-                    print(f"[ERROR] Fallo en detección de emoción para {name}: {e}")
-            faces.append({
-                "bbox": (x1, y1, x2, y2),
-                "nombre": name,
-                "emocion": emocion,
-                "r": r,
-                "confidence": sim
-            })
-        return faces
+        for j, k in enumerate(pendientes):
+            if tracks[k] is not None:
+                embeds[j] = tracks[k].embedding_medio(embeds[j].copy())
+        emociones, probs = self._emociones_lote(frames, sub)
+
+        # Un search por tenant, cada uno contra su propio índice
+        por_tenant = defaultdict(list)          # tenant_id → posiciones en `sub`
+        for j, (i, _) in enumerate(sub):
+            por_tenant[trabajos[i][0]].append(j)
+
+        for tenant_id, js in por_tenant.items():
+            try:
+                modelo = self.resolver(tenant_id)   # una versión para todo el lote
+                with Metricas.medir("faiss"):
+                    D, I = modelo.buscar(embeds[js])
+            except Exception as e:
+                _muestreo.error(f"modelo:{tenant_id}", "Modelo no disponible usuario=%s: %s", tenant_id, e)
+                for j in js:
+                    errores[sub[j][0]] = e
+                continue
+            for j, d, pid in zip(js, D, I):
+                pid = int(pid)                  # etiqueta del índice = persona_id
+                frescos[pendientes[j]] = (pid, modelo.tabla.nombre(pid), float(d), emociones[j], probs[j])
+        return frescos, errores
+
+    # Todas las caras del lote en una sola llamada al modelo de emociones
+    def _emociones_lote(self, frames, caras):
+        if self.emotion_model is None:
+            return ["N/A"] * len(caras), [None] * len(caras)
+        try:
+            with Metricas.medir("emocion"):
+                return self.emotion_model.clasificar(frames, caras)
+        except Exception as e:
+            _muestreo.error("emociones", "Fallo en detección de emoción del lote: %s", e)
+            return ["N/A"] * len(caras), [None] * len(caras)
+
+    def _infer_single(self, tenant_id, frame, tracker=None, perfil=None, offset=(0, 0)):
+        return self._infer_batch([(tenant_id, frame, tracker, perfil, offset)])[0]
+
+    @staticmethod
+    def _armar_rostro(r, persona_id, nombre, emocion, sim):
+        x1, y1, x2, y2 = map(int, r.bbox)
+        return {
+            "bbox": (x1, y1, x2, y2),
+            "persona_id": persona_id,
+            "nombre": nombre,
+            "emocion": emocion,
+            "r": r,
+            "confidence": sim
+        }
 
 def dibujar_esquinas(frame, x1, y1, x2, y2, color, grosor=2, largo=30, radio=8):
     esquinas = [
@@ -126,101 +316,49 @@ def dibujar_esquinas(frame, x1, y1, x2, y2, color, grosor=2, largo=30, radio=8):
         cv2.circle(frame, centro, radio, color, -1)
         cv2.circle(frame, centro, radio-2, (255, 255, 255), 1)
 
-def dibujar_landmarks(frame, bbox, face_mesh):
+def calidad_rostro(r, frame):
     """
-    Dibuja un enmallado facial detallado usando MediaPipe Face Mesh.
-    
-    Args:
-        frame: Imagen BGR de OpenCV donde se dibujará el enmallado.
-        bbox: Bounding box del rostro [x1, y1, x2, y2].
-        face_mesh: Instancia de MediaPipe FaceMesh.
+    Métricas de calidad del rostro detectado:
+    {"valido", "blur", "brillo", "puntaje"} o None si no hay región utilizable.
+    `puntaje` (nitidez × iluminación) sirve para elegir el mejor recorte.
     """
-    x1, y1, x2, y2 = map(int, bbox)
-    
-    # Expandir ligeramente el bbox para mejor detección (opcional, pero ayuda si el bbox es muy ajustado)
-    margin = 20
-    y1 = max(0, y1 - margin)
-    x1 = max(0, x1 - margin)
-    y2 = min(frame.shape[0], y2 + margin)
-    x2 = min(frame.shape[1], x2 + margin)
-    
-    face_region = frame[y1:y2, x1:x2]
-    if face_region.size == 0:
-        return
-    
-    # Convertir a RGB para procesar con MediaPipe
-    rgb_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2RGB)
-    
-    # Procesar con Face Mesh
-    results = face_mesh.process(rgb_face)
-    
-    if results.multi_face_landmarks:
-        for face_landmarks in results.multi_face_landmarks:
-            # Dibujar el mesh completo (tesselation)
-            mp_drawing.draw_landmarks(
-                image=rgb_face,
-                landmark_list=face_landmarks,
-                connections=mp_face_mesh.FACEMESH_TESSELATION,
-                landmark_drawing_spec=None,
-                connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_tesselation_style()
-            )
-            
-            # Dibujar contornos (ojos, labios, cejas, etc.)
-            mp_drawing.draw_landmarks(
-                image=rgb_face,
-                landmark_list=face_landmarks,
-                connections=mp_face_mesh.FACEMESH_CONTOURS,
-                landmark_drawing_spec=None,
-                connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_contours_style()
-            )
-            
-            # Dibujar iris (si refine_landmarks=True)
-            mp_drawing.draw_landmarks(
-                image=rgb_face,
-                landmark_list=face_landmarks,
-                connections=mp_face_mesh.FACEMESH_IRISES,
-                landmark_drawing_spec=None,
-                connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_iris_connections_style()
-            )
-    
-    # Convertir de vuelta a BGR y copiar al frame original
-    face_region[:] = cv2.cvtColor(rgb_face, cv2.COLOR_RGB2BGR)
-
-def es_rostro_valido(r, frame):
-    """Valida la calidad del rostro detectado"""
     try:
         if r is None or r.bbox is None:
-            return False
+            return None
             
         x1, y1, x2, y2 = map(int, r.bbox)
         
         # Tamaño mínimo
         if (x2 - x1) < 50 or (y2 - y1) < 50:
-            return False
+            return None
             
         # Extraer región del rostro del frame completo
-        face_region = frame[y1:y2, x1:x2]
+        face_region = frame[max(0, y1):y2, max(0, x1):x2]
         if face_region.size == 0:
-            return False
+            return None
             
-        # Verificar blur (varianza Laplaciana)
+        # Blur (varianza Laplaciana): >100 para bueno
         gray = cv2.cvtColor(face_region, cv2.COLOR_BGR2GRAY)
-        fm = cv2.Laplacian(gray, cv2.CV_64F).var()
-        print(f"[DEBUG] Blur fm: {fm}")  # Debería ser >100 para bueno
-        if fm < 100:  # Umbral para considerar borroso
-            return False
+        fm = float(cv2.Laplacian(gray, cv2.CV_64F).var())
             
-        # Verificar iluminación (valor promedio en HSV)
+        # Iluminación (valor promedio en HSV): >50 para bueno
         hsv = cv2.cvtColor(face_region, cv2.COLOR_BGR2HSV)
-        mean_v = hsv[...,2].mean()
-        print(f"[DEBUG] Iluminación mean_V: {mean_v}")  # >50 para bueno
-        if mean_v < 50:  # Valor/V muy bajo
-            return False
-            
-        return True
+        mean_v = float(hsv[...,2].mean())
+
+        return {
+            "valido": fm >= 100 and mean_v >= 50,
+            "blur": fm,
+            "brillo": mean_v,
+            "puntaje": fm * max(0.0, 1.0 - abs(mean_v - 128.0) / 128.0),
+        }
     except Exception as e:
-        print(f"Error en validación de rostro: {str(e)}")
-        return False
+        _muestreo.error("calidad", "Error en validación de rostro: %s", e)
+        return None
+
+def es_rostro_valido(r, frame):
+    """Valida la calidad del rostro detectado"""
+    calidad = calidad_rostro(r, frame)
+    return calidad is not None and calidad["valido"]
 
 
 # ────────────────────────────────────────────────
@@ -238,7 +376,10 @@ class VideoManager:
     @classmethod
     def get(cls, cam_id: int) -> "VideoCaptureThread":
         if cam_id not in cls._threads or not cls._threads[cam_id].running:
-            cls._threads[cam_id] = VideoCaptureThread(cam_id)
+            perfil = perfil_camara(cam_id)
+            cls._threads[cam_id] = VideoCaptureThread(
+                cam_id, perfil["ancho"], perfil["alto"], perfil["fps"]
+            )
             cls._refcnt[cam_id]  = 0
         cls._refcnt[cam_id] += 1
         return cls._threads[cam_id]
@@ -253,6 +394,69 @@ class VideoManager:
             del cls._threads[cam_id]
             del cls._refcnt[cam_id]
 
+# ────────────────────────────────────────────────
+#  Gestor global de inferencia     (Paso 2)
+# ────────────────────────────────────────────────
+class InferenceManager:
+    """
+    Devuelve el InferenceWorker único del proceso.
+    Es dueño de los modelos (InsightFace + emociones),
+    lleva un conteo de sesiones que lo usan y lo detiene
+    cuando nadie lo necesita.
+    """
+    _worker: "InferenceWorker" = None
+    _refcnt: int = 0
+    _face_app = None                                          # modelo single-ton
+    _emotion_model = None  # Modelo single-ton para emociones
+
+    @classmethod
+    def get(cls) -> "InferenceWorker":
+        if cls._worker is None or not cls._worker.running:
+            cls._worker = InferenceWorker(
+                cls._get_face_app(), cls._get_emotion_model(), ModeloManager.actual
+            )
+            cls._refcnt = 0
+        cls._refcnt += 1
+        return cls._worker
+
+    @classmethod
+    def release(cls):
+        if cls._worker is None:
+            return
+        cls._refcnt -= 1
+        if cls._refcnt <= 0:
+            cls._worker.stop()
+            cls._worker = None
+            cls._refcnt = 0
+
+    # ╭─────────────────────────╮
+    # │  Inicialización lazy    │
+    # ╰─────────────────────────╯
+    @classmethod
+    def _get_face_app(cls) -> FaceAnalysis:
+        if cls._face_app is None:
+            log.info("Cargando InsightFace (antelopev2)")
+            app = FaceAnalysis(
+                name="antelopev2",
+                providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
+            )
+            # det_size por defecto; cada cámara puede pedir otro en su perfil
+            app.prepare(ctx_id=0, det_size=tuple(PERFIL_CAMARA_DEFAULT["det_size"]))
+            cls._face_app = app
+        return cls._face_app
+
+    @classmethod
+    def _get_emotion_model(cls):
+        if cls._emotion_model is None:
+            log.info("Cargando modelo de emociones")
+            try:
+                cls._emotion_model = EmotionClassifier.cargar()
+                log.info("Emociones listas backend=%s", cls._emotion_model.backend)
+            except Exception as e:
+                log.error("Fallo al cargar modelo de emociones: %s", e)
+                cls._emotion_model = None
+        return cls._emotion_model
+
 # ──────────────────────────────
 #  Captura de vídeo (hilo)
 # ──────────────────────────────
@@ -260,13 +464,15 @@ class VideoCaptureThread:
     """
     Captura frames en segundo plano y mantiene sólo el más reciente.
     """
-    def __init__(self, cam_id: int, width=960, height=540):
+    def __init__(self, cam_id: int, width=960, height=540, fps=20):
+        self.cam_id = cam_id
+        self.fps    = 0.0      # fps real de captura (EMA), para /metrics
         # En Windows MSMF suele dar menos problemas que DSHOW
         backend = cv2.CAP_MSMF if os.name == "nt" else 0
         self.cap = cv2.VideoCapture(cam_id, backend)
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH,  width)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-        self.cap.set(cv2.CAP_PROP_FPS,          20)
+        self.cap.set(cv2.CAP_PROP_FPS,          fps)
 
         self.q        = queue.Queue(maxsize=1)
         self.running  = True
@@ -274,10 +480,16 @@ class VideoCaptureThread:
         self.thread.start()
 
     def _loop(self):
+        previo = None
         while self.running:
             ok, frame = self.cap.read()
             if not ok:
                 continue
+            ahora = time.monotonic()
+            if previo is not None:
+                inst = 1.0 / max(1e-3, ahora - previo)
+                self.fps = inst if not self.fps else 0.9 * self.fps + 0.1 * inst
+            previo = ahora
             if not self.q.empty():
                 try: self.q.get_nowait()
                 except queue.Empty: pass
@@ -299,352 +511,85 @@ class RecognitionSession:
     """
     Una instancia por WebSocket.
 
-    • Almacena: índice FAISS + nombres del usuario.
+    • No guarda el índice: usa la versión vigente de ModeloManager en
+      cada frame, así toma los modelos nuevos sin reiniciarse.
     • Reutiliza (cachea) el modelo InsightFace y los índices cargados.
     """
-    def _registrar_asistencia(self, persona_nombre, estado, tipo, path_foto, fecha, hora):
-        try:
-            conn = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="",
-                database="omniface"
-            )
-            cursor = conn.cursor()
-
-            # Buscar persona
-            cursor.execute("SELECT id, usuario_id, departamentos_id FROM personas WHERE nombre_completo=%s", (persona_nombre,))
-            persona = cursor.fetchone()
-
-            if persona:
-                persona_id, usuario_id, dep_id = persona
-            else:
-                persona_id = None
-                usuario_id = self.user_id
-                dep_id = None
-
-            cursor.execute("""
-                INSERT INTO asistencias
-                (persona_id, usuario_id, departamento_id, nombre, estado, tipo, foto_path, fecha, hora)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            """, (
-                persona_id,
-                usuario_id,
-                dep_id,
-                persona_nombre,
-                estado,
-                tipo,
-                path_foto,
-                fecha,
-                hora
-            ))
-
-            conn.commit()
-            cursor.close()
-            conn.close()
-        except Exception as e:
-            print(f"[ERROR] Registro de asistencia falló: {e}")
-    def _registrar_salida(self, persona_nombre, path_foto, fecha, hora):
-        try:
-            conn = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="",
-                database="omniface"
-            )
-            cursor = conn.cursor()
-
-            # Buscar persona
-            cursor.execute("SELECT id, usuario_id, departamentos_id FROM personas WHERE nombre_completo=%s", (persona_nombre,))
-            persona = cursor.fetchone()
-
-            if persona:
-                persona_id, usuario_id, dep_id = persona
-            else:
-                persona_id = None
-                usuario_id = self.user_id
-                dep_id = None
-
-            cursor.execute("""
-                INSERT INTO salidas
-                (persona_id, usuario_id, departamento_id, nombre, foto_path, fecha, hora)
-                VALUES (%s,%s,%s,%s,%s,%s,%s)
-            """, (
-                persona_id,
-                usuario_id,
-                dep_id,
-                persona_nombre,
-                path_foto,
-                fecha,
-                hora
-            ))
-
-            conn.commit()
-            cursor.close()
-            conn.close()
-        except Exception as e:
-            print(f"[ERROR] Registro de salida falló: {e}")
-
-    async def _actualizar_estado_persona(self, persona_nombre: str, emocion: str, camara_id: str):
-        if persona_nombre == "Desconocido":
-            return  # Ignora desconocidos por ahora
-
-        try:
-            conn = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="",
-                database="omniface"
-            )
-            cursor = conn.cursor()
-
-            # Obtener persona_id (para conocidos)
-            cursor.execute("SELECT id FROM personas WHERE nombre_completo = %s AND usuario_id = %s", (persona_nombre, self.user_id))
-            persona = cursor.fetchone()
-            if not persona:
-                return  # No es conocido, ignora
-
-            persona_id = persona[0]
-            ubicacion = f"camara_{camara_id}"  # Formato con guión bajo y minúscula
-
-            # UPSERT: Insert si no existe, update si sí (fluido, una query)
-            cursor.execute("""
-                INSERT INTO estado_persona (persona_id, emocion_actual, ubicacion_actual)
-                VALUES (%s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                emocion_actual = VALUES(emocion_actual),
-                ubicacion_actual = VALUES(ubicacion_actual)
-            """, (persona_id, emocion, ubicacion))
-
-            conn.commit()
-            print(f"[DEBUG] Estado actualizado para {persona_nombre}: Emoción={emocion}, Ubicación={ubicacion}")  # Log para depurar
-        except mysql.connector.Error as e:
-            print(f"[ERROR] Actualizar estado persona: {e}")
-        finally:
-            cursor.close()
-            conn.close()
-
-
-    # --- caches compartidos ---
-    _face_app = None                                          # modelo single-ton
-    _models   = {}  # {user_id: (index, [nombres])}
-    _face_mesh = None  # modelo single-ton para MediaPipe
-    _workers = {}  # {user_id: InferenceWorker}  # Worker per user
-    _emotion_model = None  # Modelo single-ton para emociones
-
-    @classmethod
-    def _get_emotion_model(cls):
-        if cls._emotion_model is None:
-            print("[Recon] ▶ Cargando modelo de emociones (emotion_model.h5)…")
-            try:
-                cls._emotion_model = load_model('emotion_model.h5')
-            except Exception as e:
-                print(f"[ERROR] Fallo al cargar modelo de emociones: {e}")
-                cls._emotion_model = None
-        return cls._emotion_model
-    _ultimo_dia = None
-    _registrados_hoy = defaultdict(set)
-    @classmethod
-    def _get_face_mesh(cls):
-        if cls._face_mesh is None:
-            print("[Recon] ▶ Cargando MediaPipe Face Mesh…")
-            cls._face_mesh = mp_face_mesh.FaceMesh(
-                static_image_mode=False,      # Modo de video (tracking)
-                max_num_faces=10,             # Soporte para múltiples rostros
-                refine_landmarks=True,        # Refina iris y detalles
-                min_detection_confidence=0.5,
-                min_tracking_confidence=0.5
-            )
-        return cls._face_mesh
-    
-    # --- parámetros ---
+    def _evento(self, tabla, tipo_evento, persona_id, path, fecha, hora, **extra):
+        """Evento para SumideroEventos; nombre y departamento salen de `tabla`."""
+        return nuevo_evento(
+            tipo_evento,
+            persona_id=persona_id,
+            usuario_id=self.user_id,
+            departamento_id=tabla.departamento(persona_id),
+            nombre=tabla.nombre(persona_id),
+            foto_path=str(path).replace("\\", "/"),
+            fecha=fecha,
+            hora=hora,
+            **extra
+        )
+
+    def _ruta_captura(self, tabla, persona_id, fecha_str, hora_str) -> Path:
+        nombre = self._sanitize_filename(tabla.nombre(persona_id))
+        return self.directorio_capturas / nombre / f"{nombre}_{fecha_str}_{hora_str.replace(':','-')}.jpg"
 
-    _JPEG_PARAMS   = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
-
-    # ╭─────────────────────────╮
-    # │  Inicialización lazy    │
-    # ╰─────────────────────────╯
-    @classmethod
-    def _get_face_app(cls) -> FaceAnalysis:
-        if cls._face_app is None:
-            print("[Recon] ▶ Cargando InsightFace (antelopev2)…")
-            app = FaceAnalysis(
-                name="antelopev2",
-                providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
-            )
-            app.prepare(ctx_id=0, det_size=(480, 480))
-            cls._face_app = app
-        return cls._face_app
-
-    @classmethod
-    def _load_model(cls, user_id: int):
-        base      = Path(f"modelo_final/usuario_{user_id}")
-        idx_path  = base / "faiss.index"
-        names_pkl = base / "nombres.pkl"
-        mtime     = idx_path.stat().st_mtime  # último mod.
-
-        # cache válido ➜ devolver
-        if (cached := cls._models.get(user_id)) and cached[2] == mtime:
-            return cached[:2]
-
-        # …si existe pero desactualizado, lo descartamos
-        cls._models.pop(user_id, None)
-
-        # recarga desde disco
-        index   = faiss.read_index(str(idx_path))
-        with open(names_pkl, "rb") as f:
-            names = pickle.load(f)
-
-        cls._models[user_id] = (index, names, mtime)
-        print(f"[Recon] ⚡ Modelo usuario {user_id} cargado ({len(names)} emb.)")
-        return index, names
 
     @classmethod
     def reload_model(cls, user_id: int):
-        cls._models.pop(user_id, None)  # Limpia cache modelo
-        cls._workers.pop(user_id, None)  # Limpia worker para recrear con nuevo index
-        return cls._load_model(user_id)  # Recarga modelo
+        # Relee índice y tabla aunque actual.json no haya cambiado; el worker y
+        # las sesiones toman la versión nueva en su próximo lote / frame
+        return ModeloManager.recargar(user_id, forzar=True)
 
     # ╭─────────────────────────╮
     # │  Constructor            │
     # ╰─────────────────────────╯
-    @classmethod
-    def _load_fotos(cls, user_id: int):
-        try:
-            conn = mysql.connector.connect(host="localhost", user="root", password="", database="omniface")
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT nombre_completo, imagen_original FROM personas WHERE usuario_id = %s", (user_id,))
-            rows = cursor.fetchall()
-            if not rows:
-                print(f"[WARNING] No personas encontradas en BD para user_id {user_id}")
-            fotos = {}
-            for row in rows:
-                if row['imagen_original']:
-                    key = row['nombre_completo'].strip().lower()
-                    fotos[key] = row['imagen_original']  # Incluye "usuario_X/..."
-            cursor.close()
-            conn.close()
-            print(f"[DEBUG] Fotos cargadas para user {user_id}: {fotos}")
-            print(f"[DEBUG] Número de fotos: {len(fotos)}")
-            return fotos
-        except mysql.connector.Error as e:
-            print(f"[ERROR] Fallo al cargar fotos de BD: {e}")
-            return {}
-
     def __init__(self, user_id: int, cam_id: int, modo: str = "normal"):
-        print(f"[DEBUG] Iniciando RecognitionSession para user_id={user_id}, cam_id={cam_id}, modo={modo}")
+        log.debug("Iniciando sesión usuario=%s cam=%s modo=%s", user_id, cam_id, modo)
         self.user_id = user_id
         self.cam_id = cam_id
-        hoy = datetime.now().date()
-        if not hasattr(self, '_ultimo_dia') or self._ultimo_dia != hoy:
-            self._registrados_hoy[self.user_id].clear()
-            self._ultimo_dia = hoy
+        RegistroDiario.cargar(user_id)   # asistencias de hoy ya en la BD (una vez por día)
         self.modo = modo
 
-        # ---- modelo/índice/mesh ----------
-        self.face_app = self._get_face_app()
-        self.face_mesh = self._get_face_mesh()
-        print("[DEBUG] Cargando modelo...")
-        self.index, self.nombres = self._load_model(user_id)
-        # Normaliza self.nombres para que coincida con fotos (lower/strip)
-        self.nombres = [n.strip().lower() for n in self.nombres]
-        print(f"[DEBUG] Nombres normalizados del modelo: {self.nombres}")
-        print("[DEBUG] Cargando fotos de DB...")
-        self.fotos = self._load_fotos(user_id)
-        self.emotion_model = self._get_emotion_model()
-
-        # ---- caché optimizado: horas por departamento y dep_id por persona ----
-        self.horas_por_departamento = {}
-        self.dep_por_persona = {}
-        print("[DEBUG] Iniciando carga de cachés optimizados...")
-        try:
-            conn = mysql.connector.connect(host="localhost", user="root", password="", database="omniface")
-            print("[DEBUG] Conexión BD exitosa")
-            cursor = conn.cursor(dictionary=True)
-
-            # Caché de horas por departamento
-            cursor.execute("""
-                SELECT id, hora_temprano, hora_tarde
-                FROM departamentos
-                WHERE usuario_id = %s
-            """, (user_id,))
-            rows_dep = cursor.fetchall()
-            print(f"[DEBUG] Encontrados {len(rows_dep)} departamentos")
-            for row in rows_dep:
-                try:
-                    hora_temprano_td = row["hora_temprano"]
-                    hora_tarde_td = row["hora_tarde"]
-                    if hora_temprano_td is None or hora_tarde_td is None:
-                        raise ValueError("Hora nula")
-
-                    # Convertir timedelta a time
-                    hora_temprano = dtime(
-                        hora_temprano_td.seconds // 3600,
-                        (hora_temprano_td.seconds // 60) % 60,
-                        hora_temprano_td.seconds % 60
-                    )
-                    hora_tarde = dtime(
-                        hora_tarde_td.seconds // 3600,
-                        (hora_tarde_td.seconds // 60) % 60,
-                        hora_tarde_td.seconds % 60
-                    )
-
-                    self.horas_por_departamento[row["id"]] = {
-                        "hora_temprano": hora_temprano,
-                        "hora_tarde": hora_tarde
-                    }
-                    print(f"[DEBUG] Horas cargadas para dep {row['id']}: {self.horas_por_departamento[row['id']]}")
-                except Exception as ve:
-                    print(f"[ERROR] Hora inválida para dep {row['id']}, usando defaults: {ve}")
-                    self.horas_por_departamento[row["id"]] = {
-                        "hora_temprano": dtime(8, 10),
-                        "hora_tarde": dtime(14, 30)
-                    }
-
-            # Caché de dep_id por persona (para mapear rápido en stream)
-            cursor.execute("""
-                SELECT nombre_completo, departamentos_id
-                FROM personas
-                WHERE usuario_id = %s
-            """, (user_id,))
-            rows_personas = cursor.fetchall()
-            print(f"[DEBUG] Encontradas {len(rows_personas)} personas")
-            for row in rows_personas:
-                if row["departamentos_id"] is not None:
-                    self.dep_por_persona[row["nombre_completo"]] = row["departamentos_id"]
-                    print(f"[DEBUG] Dep cargado para {row['nombre_completo']}: {row['departamentos_id']}")
-                else:
-                    print(f"[DEBUG] Persona {row['nombre_completo']} sin dep, usará defaults")
-
-        except mysql.connector.Error as e:
-            print(f"[ERROR] Fallo en conexión o query para cachés: {e}")
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
-            print("[DEBUG] Carga de cachés completada")
-
-        # ---- cámara compartida -----------
+        # ---- modelo/índice + tabla de personas ----------
+        ModeloManager.actual(user_id)   # falla aquí si el usuario no tiene modelo
+
+        # ---- cámara compartida + perfil de inferencia -----------
+        self.perfil = perfil_camara(cam_id)
+        self.malla = MallaFacial(self.perfil["malla"])   # "off" no importa mediapipe
         self.cam = VideoManager.get(cam_id)
 
-        # ---- worker per user -----------
-        if self.user_id not in self._workers:
-            self._workers[self.user_id] = InferenceWorker(
-                self.face_app, self.face_mesh, self.index, self.nombres, self.emotion_model
-            )
-        self.worker = self._workers[self.user_id]
-        self._fps_hist = []
-        self.ultimo_reconocido = defaultdict(lambda: 0)
+        # ---- worker compartido (todos los usuarios) ----
+        self.worker = InferenceManager.get()
+        self._clave = uuid.uuid4().hex   # identifica la sesión ante el control de admisión
+        ControlAdmision.registrar(self._clave, user_id, cam_id)
+        self.tracker = FaceTracker()   # tracks de esta sesión/cámara
+        self.salidas = DepuradorSalidas()   # antirrebote de salidas de esta cámara
+        self._t_frames = deque(maxlen=30)   # tiempos de los últimos frames enviados
         self.directorio_capturas = Path("capturas" if modo == "asistencia" else "capturas_salidas") / f"usuario_{user_id}"
         self.directorio_capturas.mkdir(parents=True, exist_ok=True)
-        self._last_faces = []
-    # ───── in-stream FPS suavizado ─────
-    def _fps(self, frame_count: int, start_ts: float) -> float:
-        fps = frame_count / (time.time() - start_ts + 1e-5)
-        self._fps_hist.append(fps)
-        self._fps_hist = self._fps_hist[-10:]
-        return sum(self._fps_hist) / len(self._fps_hist)
+        self.analitica = AnaliticaCamara(cam_id)   # resumen de emociones/presencia
+        ModeloManager.retener(user_id)   # hasta close(); al final para no retener si algo falló antes
+    @property
+    def tabla(self) -> TablaPersonas:
+        """Tabla del modelo vigente (cambia si el modelo se regenera o la tabla se relee)."""
+        return ModeloManager.actual(self.user_id).tabla
+
+    def _emitir_salidas(self, todos: bool = False):
+        """Publica las salidas de los pases cerrados (una por persona y pase)."""
+        tabla = self.tabla
+        for pase in self.salidas.listos(time.monotonic(), todos):
+            persona_id, (fecha_str, hora_str) = pase.clave, pase.datos
+            # Recorte + fila los escribe el sumidero en segundo plano
+            path = self._ruta_captura(tabla, persona_id, fecha_str, hora_str)
+            evento = self._evento(tabla, "salida", persona_id, path, fecha_str, hora_str)
+            self.salidas.confirmar(pase, SumideroEventos.publicar(evento, pase.recorte))
+
+    # ───── in-stream FPS sobre los últimos frames (no desde el arranque) ─────
+    def _fps(self) -> float:
+        self._t_frames.append(time.monotonic())
+        if len(self._t_frames) < 2:
+            return 0.0
+        return (len(self._t_frames) - 1) / max(1e-5, self._t_frames[-1] - self._t_frames[0])
 
     @staticmethod
     def _sanitize_filename(name: str) -> str:
@@ -653,164 +598,149 @@ class RecognitionSession:
     # ──────────────────────────────
     #  Bucle de envío
     # ──────────────────────────────
-    async def stream(self, ws):
-        frame_cnt, t0 = 0, time.time()
-        loop = asyncio.get_running_loop()
+    async def stream(self, publicar):
+        """
+        Bucle de captura → inferencia → registro. Cada frame se entrega a
+        `publicar(meta, frame, anotar)` (CamaraHub.publicar) sin dibujar ni
+        codificar; `anotar()` devuelve la copia con overlays si alguien la pide.
+        Corre hasta ser cancelado.
+        """
+        stride, leidos = max(1, int(self.perfil["stride"])), 0
 
         while True:
             frame = self.cam.read()
             if frame is None:
                 await asyncio.sleep(0.01)
                 continue
-
-            # ➜ 1) copia sobre la que dibujaremos
+            leidos += 1
+            if leidos % stride:
+                continue          # frame saltado según el perfil de la cámara
+
+            # ➜ admisión: respetar el fps que nos toca bajo la carga actual
+            if (espera := ControlAdmision.espera(self._clave)) > 0:
+                await asyncio.sleep(min(espera, 0.05))
+                continue          # al volver se lee el frame más reciente
+            ControlAdmision.marcar_envio(self._clave)
+
+            # ➜ 1) copia propia del frame (la cámara sigue escribiendo el suyo);
+            #      al worker sólo va la vista del ROI, con su desplazamiento
             proc_frame = frame.copy()
-            faces = await self.worker.submit(proc_frame)
+            rx1, ry1, rx2, ry2 = roi_en_pixeles(self.perfil["roi"], proc_frame.shape)
+            faces = await self.worker.submit(
+                self.user_id, proc_frame[ry1:ry2, rx1:rx2], self.tracker, self.perfil, (rx1, ry1)
+            )
+            if faces is None:
+                continue          # descartado por backpressure
+            Metricas.contar("omniface_frames_analizados_total", camara=self.cam_id)
             # ➜ 2) inferencia en thread-pool **sobre proc_frame**
             final_faces = []               # lo que mandaremos al frontend
+            tabla = self.tabla             # una tabla para todo el frame
             for face in faces:
                 r = face.pop("r")  # objeto InsightFace
-                name = face["nombre"].strip().lower()  # Normaliza ANTES de get()
+                persona_id = face["persona_id"]
+                # El id viene de la versión que usó el worker (o de un track
+                # anterior): si ya no está en la tabla vigente, es desconocido
+                if persona_id != DESCONOCIDO and tabla.fila(persona_id) < 0:
+                    persona_id = face["persona_id"] = DESCONOCIDO
+                conocido = persona_id != DESCONOCIDO
+                face["nombre"] = tabla.nombre(persona_id)
                 emocion = face["emocion"]
                 x1, y1, x2, y2 = face["bbox"]
 
-                if name != "Desconocido":
-                    await self._actualizar_estado_persona(name, emocion, str(self.cam_id))
-
-                color = (0, 255, 100) if name != "desconocido" else (255, 80, 80)
-                color_sec = (20, 180, 20) if name != "Desconocido" else (20, 20, 180)
+                # Presencia en cada frame: el timestamp es el último avistamiento
+                # (la escritura diferida junta todas las llamadas en una fila)
+                if conocido:
+                    Presencia.actualizar(self.user_id, persona_id, face["nombre"], emocion, f"camara_{self.cam_id}")
 
                 # ---- validación + registro + guardado (solo para conocidos en modos apropiados) ----
-                if es_rostro_valido(r, proc_frame):
+                calidad = calidad_rostro(r, proc_frame)
+                if conocido and calidad is not None and calidad["valido"]:
                     ahora = datetime.now()
                     fecha_str = ahora.strftime("%Y-%m-%d")
                     hora_str = ahora.strftime("%H:%M:%S")
-                    estado = "Falto"  # Default, solo se usa en asistencia
-
-                    if name != "Desconocido" and self.modo == "asistencia":
-                        # Calcular estado para conocidos en asistencia
-                        dep_id = self.dep_por_persona.get(name)
-                        if dep_id is not None and dep_id in self.horas_por_departamento:
-                            horas_dep = self.horas_por_departamento[dep_id]
-                            hora_temprano = horas_dep["hora_temprano"]
-                            hora_tarde = horas_dep["hora_tarde"]
-                            ahora_time = ahora.time()
-                            if ahora_time <= hora_temprano:
-                                estado = "Temprano"
-                            elif ahora_time <= hora_tarde:
-                                estado = "Tarde"
-                            else:
-                                estado = "Falto"
-                        else:
-                            # Fallback
-                            estado = ("Temprano" if ahora.time() <= dtime(8,10) else "Tarde" if ahora.time() <= dtime(14,30) else "Falto")
 
+                    if self.modo == "asistencia":
                         # Registrar solo si no ya registrado hoy
-                        if name not in self._registrados_hoy[self.user_id]:
-                            self._registrados_hoy[self.user_id].add(name)
-                            # Guardar recorte
-                            folder = self.directorio_capturas / self._sanitize_filename(name)
-                            folder.mkdir(parents=True, exist_ok=True)
-                            fname = f"{self._sanitize_filename(name)}_{fecha_str}_{hora_str.replace(':','-')}.jpg"
-                            path = folder / fname
-                            cv2.imwrite(str(path), proc_frame[y1:y2, x1:x2])
-                            # Registrar en BD
-                            self._registrar_asistencia(
-                                persona_nombre=name,
-                                estado=estado,
-                                tipo="Conocido",
-                                path_foto=str(path).replace("\\", "/"),
-                                fecha=fecha_str,
-                                hora=hora_str
+                        if RegistroDiario.marcar(self.user_id, persona_id, ahora.date()):
+                            # Recorte + fila los escribe el sumidero en segundo plano
+                            evento = self._evento(
+                                tabla, "asistencia", persona_id,
+                                self._ruta_captura(tabla, persona_id, fecha_str, hora_str), fecha_str, hora_str,
+                                estado=tabla.estado_asistencia(persona_id, ahora.time()), tipo="Conocido",
+                                evento_id=clave_asistencia(self.user_id, persona_id, fecha_str)
                             )
-
-                    elif name != "Desconocido" and self.modo == "salida":
-                        # Para salidas: registrar cada detección (sin chequeo de "ya registrado")
-                        # Guardar recorte
-                        folder = self.directorio_capturas / self._sanitize_filename(name)
-                        folder.mkdir(parents=True, exist_ok=True)
-                        fname = f"{self._sanitize_filename(name)}_{fecha_str}_{hora_str.replace(':','-')}.jpg"
-                        path = folder / fname
-                        cv2.imwrite(str(path), proc_frame[y1:y2, x1:x2])
-                        # Registrar en BD
-                        self._registrar_salida(
-                            persona_nombre=name,
-                            path_foto=str(path).replace("\\", "/"),
-                            fecha=fecha_str,
-                            hora=hora_str
+                            if not SumideroEventos.publicar(evento, proc_frame[y1:y2, x1:x2].copy()):
+                                RegistroDiario.desmarcar(self.user_id, persona_id)  # se reintenta
+
+                    elif self.modo == "salida":
+                        # Para salidas: un evento por pase, con el mejor recorte del pase
+                        self.salidas.observar(
+                            persona_id, time.monotonic(), calidad["puntaje"],
+                            lambda: proc_frame[y1:y2, x1:x2].copy(),
+                            (fecha_str, hora_str)
                         )
 
-                # ---- dibujos siempre ----
-                dibujar_esquinas(proc_frame, x1, y1, x2, y2, color)
-                dibujar_landmarks(proc_frame, (x1,y1,x2,y2), self.face_mesh)
-
                 # ---- info para frontend ----
-                face["foto_path"] = self.fotos.get(name) if name != "desconocido" else None
-                face["registrado"] = name != "Desconocido" and name in self._registrados_hoy[self.user_id]
+                face["kps"] = r.kps.round(1).tolist() if r.kps is not None else None
+                face["foto_path"] = tabla.foto(persona_id) if conocido else None
+                face["registrado"] = conocido and RegistroDiario.contiene(self.user_id, persona_id)
                 final_faces.append(face)
                 
-            # Calcula summary
-            summary = {
-                "emociones_conteo": {},
-                "dominante_por_camara": "",
-                "tendencia": "",
-                "personalizados": {},  # e.g., "Juan": "Happy"
-                "visitantes": {},  # Conteo emociones desconocidos
-                "personas_por_area": {},  # Nueva: conteo personas conocidas por cámara
-                "visitantes_por_area": {}  # Nueva: conteo visitantes por cámara
-            }
+            self._emitir_salidas()
 
-            # Conteo current emociones
-            for face in final_faces:
-                emocion = face["emocion"]               
-                name = face["nombre"].lower()  # Normaliza name para get()
-                print(f"[DEBUG] Buscando foto para name normalizado '{name}': {self.fotos.get(name)}")
-                summary["emociones_conteo"][emocion] = summary["emociones_conteo"].get(emocion, 0) + 1
-                if name == "Desconocido":
-                    summary["visitantes"][emocion] = summary["visitantes"].get(emocion, 0) + 1
-                else:
-                    summary["personalizados"][name] = emocion  # Última emoción
-
-            # Dominante por cámara
-            if summary["emociones_conteo"]:
-                dominante = max(summary["emociones_conteo"], key=summary["emociones_conteo"].get)
-                count = summary["emociones_conteo"][dominante]
-                summary["dominante_por_camara"] = f"{dominante} ({count} personas)"
-
-            # Tendencias (últimos 5 frames)
-            self._last_faces.append(final_faces)
-            self._last_faces = self._last_faces[-5:]
-            all_emoc = [f["emocion"] for faces in self._last_faces for f in faces if f["nombre"] != "Desconocido"]
-            if all_emoc:
-                dominante_tend = max(set(all_emoc), key=all_emoc.count)
-                percent = (all_emoc.count(dominante_tend) / len(all_emoc)) * 100
-                summary["tendencia"] = f"{dominante_tend} ({percent:.0f}%)"
-
-            # Nuevos campos para localización (por esta cámara)
-            cam_key = f"camara_{self.cam_id}"
-            summary["personas_por_area"][cam_key] = len([f for f in final_faces if f["nombre"] != "Desconocido"])
-            summary["visitantes_por_area"][cam_key] = len([f for f in final_faces if f["nombre"] == "Desconocido"])
-
-            # ➜ 3) codificamos **proc_frame** (ya tiene rectángulos)
-            _, buf = cv2.imencode(".jpg", proc_frame, self._JPEG_PARAMS)
-            b64 = base64.b64encode(buf).decode()
-
-            await ws.send_json({                       # 2️⃣
+            # Resumen incremental: sólo viaja cuando cambia (o como refresco)
+            summary = self.analitica.actualizar(final_faces)
+
+            # ➜ 3) el hub dibuja / codifica sólo las vistas que piden sus visores
+            meta = {
                 "type": "frame",
-                "frame": b64,
                 "faces": final_faces,
-                "fps"      : self._fps(frame_cnt, t0),
+                "fps"      : self._fps(),
                 "timestamp": time.time(),
                 "camara_id": self.cam_id,
-                "summary": summary  # Incluye los nuevos campos
-            })
-            frame_cnt += 1
+                "ancho": proc_frame.shape[1],
+                "alto" : proc_frame.shape[0],
+                "roi"  : self.perfil["roi"],
+            }
+            if summary is not None:
+                meta["summary"] = summary
+            publicar(meta, proc_frame, functools.partial(self._anotar, proc_frame, final_faces))
             await asyncio.sleep(0)   
         
+    def _anotar(self, frame, faces):
+        """Copia de `frame` con esquinas, malla y ROI (vista "anotado")."""
+        img = frame.copy()
+        for face in faces:
+            x1, y1, x2, y2 = face["bbox"]
+            color = (0, 255, 100) if face["nombre"] != "Desconocido" else (255, 80, 80)
+            dibujar_esquinas(img, x1, y1, x2, y2, color)
+            self.malla.dibujar(img, (x1, y1, x2, y2), face.get("track_id"))
+        if self.perfil["roi"]:
+            rx1, ry1, rx2, ry2 = roi_en_pixeles(self.perfil["roi"], img.shape)
+            cv2.rectangle(img, (rx1, ry1), (rx2 - 1, ry2 - 1), (200, 200, 200), 1)
+        return img
+
     # ──────────────────────────────
     async def close(self):
+        if self.modo == "salida":
+            self._emitir_salidas(todos=True)   # no perder el pase en curso
+        ModeloManager.soltar(self.user_id)  # sin sesiones, el modelo sale de memoria
         VideoManager.release(self.cam_id)  # Libera cámara
-        if self.user_id in self._workers:
-            # Opcional: si quieres limpiar worker, pero solo si no hay otras sesiones
-            del self._workers[self.user_id]
-        self._models.pop(self.user_id, None)
\ No newline at end of file
+        InferenceManager.release()         # Libera worker (se detiene con la última sesión)
+        ControlAdmision.quitar(self._clave)
+
+# ──────────────────────────────
+#  Medidores para /metrics
+# ──────────────────────────────
+Metricas.medidor(
+    "omniface_captura_fps", "fps leídos de cada cámara",
+    lambda: [({"camara": cam}, round(t.fps, 2)) for cam, t in list(VideoManager._threads.items())]
+)
+Metricas.medidor(
+    "omniface_worker_cola", "Trabajos esperando en la cola del worker",
+    lambda: InferenceManager._worker.q_in.qsize() if InferenceManager._worker else 0
+)
+Metricas.medidor(
+    "omniface_workers_activos", "Workers de inferencia en marcha",
+    lambda: int(InferenceManager._worker is not None and InferenceManager._worker.running)
+)
@@ -1,9 +1,15 @@
-import mysql.connector
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends
 import cv2, json, asyncio
 
 from recognition_core import RecognitionSession
+from difusion        import HubManager
+from admision        import ControlAdmision
+from transporte      import PROTOCOLOS, VISTAS
+from database        import get_connection
+from presencia       import Presencia
+from bitacora        import cambiar_nivel, niveles
+from protected       import verificar_token, DatosToken
 from config          import SECRET_KEY, ALGORITHM
 from jose            import jwt, JWTError
 import time
@@ -51,11 +57,43 @@ def listar_camaras(force: bool = False):
 def reload_model(token: str = Query(...)):
     try:
         user_id = get_user_id_from_token(token)
-        RecognitionSession.reload_model(user_id)
-        return {"mensaje": "Modelo recargado"}
+        modelo = RecognitionSession.reload_model(user_id)
+        return {"mensaje": "Modelo recargado", "version": modelo.version, "personas": len(modelo.tabla)}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# ──────────────────────────────
+#  Carga del worker / fps efectivo por cámara (sólo admin)
+# ──────────────────────────────
+@router.get("/carga")
+def carga(usuario: DatosToken = Depends(verificar_token)):
+    if usuario.rol != "admin":
+        raise HTTPException(status_code=403, detail="No tienes permiso para acceder")
+    # sesiones, fps y visores sólo de las cámaras del propio usuario, no las de otros
+    return {**ControlAdmision.resumen(usuario.id), "visores": HubManager.resumen(usuario.id)}
+
+# ──────────────────────────────
+#  Nivel de log en caliente (sólo admin)
+# ──────────────────────────────
+@router.get("/log")
+def ver_log(usuario: DatosToken = Depends(verificar_token)):
+    if usuario.rol != "admin":
+        raise HTTPException(status_code=403, detail="No tienes permiso para acceder")
+    return niveles()
+
+@router.put("/log")
+def cambiar_log(
+    nivel: str = Query(...),            # DEBUG | INFO | WARNING | ERROR (NOTSET: el módulo hereda)
+    modulo: str = Query(None),          # p. ej. "recognition_core"; sin módulo cambia el global
+    usuario: DatosToken = Depends(verificar_token)
+):
+    if usuario.rol != "admin":
+        raise HTTPException(status_code=403, detail="No tienes permiso para acceder")
+    try:
+        return cambiar_nivel(nivel, modulo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # ──────────────────────────────
 #  WebSocket principal
 # ──────────────────────────────
@@ -64,7 +102,10 @@ async def websocket_recon(
     ws: WebSocket,
     cam_id: int = 0,
     token: str = Query(...),
-    modo: str = Query("normal")
+    modo: str = Query("normal"),
+    protocolo: str = Query("json"),     # "json" (base64) | "binario"
+    vista: str = Query("anotado"),      # "anotado" | "crudo" | "datos"
+    video_fps: float = Query(0)         # >0: imagen a lo sumo a este ritmo, el resto sólo datos
 ):
     # ── autenticar ───────────────────────
     try:
@@ -73,11 +114,15 @@ async def websocket_recon(
         await ws.close(code=4401, reason="Token inválido")
         return
 
+    if protocolo not in PROTOCOLOS or vista not in VISTAS:
+        await ws.close(code=4400, reason="Protocolo o vista no soportados")
+        return
+
     await ws.accept()
 
-    # ── crear sesión ─────────────────────
+    # ── unirse al hub de la cámara (lo crea si es el primer visor) ──
     try:
-        session = RecognitionSession(user_id, cam_id, modo)
+        hub = await HubManager.get(user_id, cam_id, modo)
     except Exception as e:  # Cambiado de FileNotFoundError a Exception para atrapar todo
         await ws.send_text(json.dumps(
             {"type": "error", "detail": str(e)}
@@ -88,19 +133,19 @@ async def websocket_recon(
 
     # ── bucle ────────────────────────────
     try:
-        await session.stream(ws)
+        await hub.atender(ws, protocolo, vista, video_fps)
     except WebSocketDisconnect:
         pass
     finally:
-        await session.close()
+        await HubManager.release(hub)
 # ──────────────────────────────
 #  Endpoint para salidas del día
 # ──────────────────────────────
 @router.get("/salida/dia/{usuario_id}")
 def salidas_dia(usuario_id: int):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
     try:
-        conn = mysql.connector.connect(host="localhost", user="root", password="", database="omniface")
-        cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT s.nombre, s.foto_path, s.fecha, s.hora, d.nombre AS departamento
             FROM salidas s
@@ -108,27 +153,16 @@ def salidas_dia(usuario_id: int):
             WHERE s.usuario_id = %s AND s.fecha = CURDATE()
             ORDER BY s.hora DESC
         """, (usuario_id,))
-        resultados = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return resultados
+        return cursor.fetchall()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
 @router.get("/estados")
 def get_estados(token: str = Query(...)):
   try:
     user_id = get_user_id_from_token(token)
-    conn = mysql.connector.connect(host="localhost", user="root", password="", database="omniface")
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-      SELECT p.nombre_completo as nombre, e.emocion_actual as emocion, e.ubicacion_actual as ubicacion, e.timestamp_ultimo
-      FROM estado_persona e
-      LEFT JOIN personas p ON e.persona_id = p.id
-      WHERE p.usuario_id = %s
-    """, (user_id,))
-    estados = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return estados
+    return Presencia.estados(user_id)   # memoria; la BD se actualiza por lotes
   except Exception as e:
-    raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,102 @@
+# ✅ omniface-backend/registro_diario.py
+"""
+Índice de "ya registrado hoy" para las asistencias.
+
+Por cada usuario se lee una vez por día (una sola consulta) qué persona_id
+ya tienen asistencia en `asistencias`; después las consultas del bucle de
+stream son un `in` sobre un set de enteros. Al cambiar el día el índice se
+vacía solo. Si la lectura falla el usuario no queda como cargado y la
+próxima sesión que arranque la vuelve a intentar.
+
+Con varios procesos cada uno tiene su propio índice: la deduplicación final
+la hace la BD. La asistencia usa una clave de idempotencia determinista
+(usuario, persona, fecha) como `evento_id`, que es UNIQUE, así que si dos
+procesos registran a la misma persona el mismo día el segundo INSERT IGNORE
+no hace nada.
+"""
+import hashlib
+from datetime import date, datetime
+from threading import Lock
+
+from database import get_connection
+from bitacora import obtener
+
+log = obtener(__name__)
+
+
+def clave_asistencia(usuario_id: int, persona_id: int, fecha) -> str:
+    """evento_id determinista: una asistencia por persona, usuario y día."""
+    base = f"asistencia|{usuario_id}|{persona_id}|{fecha}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()[:32]
+
+
+class RegistroDiario:
+    """Estado global (clase) como Presencia."""
+    _lock = Lock()
+    _dia: date = None
+    _registrados: dict = {}   # usuario_id → {persona_id}
+    _cargados: set = set()    # usuario_id cuyas asistencias de hoy ya se leyeron de la BD
+
+    @classmethod
+    def _rodar(cls, hoy: date):
+        # Día nuevo: nadie está registrado todavía (salvo por otro proceso,
+        # caso que resuelve la clave única en la BD)
+        if cls._dia != hoy:
+            cls._dia = hoy
+            cls._registrados = {}
+            cls._cargados = set()
+            return True
+        return False
+
+    @classmethod
+    def cargar(cls, usuario_id: int):
+        """Lee de la BD las asistencias de hoy del usuario (una vez por día)."""
+        hoy = datetime.now().date()
+        with cls._lock:
+            cls._rodar(hoy)
+            if usuario_id in cls._cargados:
+                return
+        try:
+            conn = get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT DISTINCT persona_id FROM asistencias "
+                    "WHERE usuario_id = %s AND fecha = %s AND persona_id IS NOT NULL",
+                    (usuario_id, hoy)
+                )
+                ids = {int(fila[0]) for fila in cursor.fetchall()}
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            # sin marcar como cargado: se reintenta al abrir la próxima sesión
+            log.error("No se pudieron leer las asistencias de hoy usuario=%s: %s", usuario_id, e)
+            return
+        with cls._lock:
+            if cls._dia == hoy:
+                cls._registrados.setdefault(usuario_id, set()).update(ids)
+                cls._cargados.add(usuario_id)
+        log.debug("Registrados hoy usuario=%s: %d", usuario_id, len(ids))
+
+    @classmethod
+    def contiene(cls, usuario_id: int, persona_id: int, hoy: date = None) -> bool:
+        with cls._lock:
+            cls._rodar(hoy or datetime.now().date())
+            return persona_id in cls._registrados.get(usuario_id, ())
+
+    @classmethod
+    def marcar(cls, usuario_id: int, persona_id: int, hoy: date = None) -> bool:
+        """Agrega a la persona; devuelve False si ya estaba registrada hoy."""
+        with cls._lock:
+            cls._rodar(hoy or datetime.now().date())
+            registrados = cls._registrados.setdefault(usuario_id, set())
+            if persona_id in registrados:
+                return False
+            registrados.add(persona_id)
+            return True
+
+    @classmethod
+    def desmarcar(cls, usuario_id: int, persona_id: int):
+        with cls._lock:
+            cls._registrados.get(usuario_id, set()).discard(persona_id)
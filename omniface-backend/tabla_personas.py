@@ -0,0 +1,124 @@
+# ✅ omniface-backend/tabla_personas.py
+"""
+Metadatos de las personas de un modelo, indexados por persona_id.
+
+El índice FAISS de cada usuario devuelve `persona_id` como etiqueta
+(IndexIDMap). Esta tabla se carga con una sola consulta y resuelve todo lo
+que el bucle de stream necesita saber de una persona sin volver a la BD ni
+comparar nombres: nombre para mostrar, departamento, foto y horario de
+asistencia.
+
+No depende de la versión del índice: ModeloManager la relee cuando
+personas.py / departamentos.py escriben (`invalidar`) o cada
+TABLA_PERSONAS_TTL_S, y la publica junto a la versión vigente.
+
+Los datos viven en arrays paralelos; `_fila` lleva persona_id → posición.
+"""
+import time
+from datetime import time as dtime
+
+import numpy as np
+
+from database import get_connection
+from bitacora import obtener
+
+log = obtener(__name__)
+
+DESCONOCIDO = -1
+# Horario por defecto si la persona no tiene departamento o éste no tiene horas
+_TEMPRANO_DEFAULT = 8 * 3600 + 10 * 60     # 08:10
+_TARDE_DEFAULT    = 14 * 3600 + 30 * 60    # 14:30
+
+
+def _segundos(td, defecto: int) -> int:
+    """TIME de MySQL (llega como timedelta) → segundos desde medianoche."""
+    return int(td.total_seconds()) if td is not None else defecto
+
+
+class TablaPersonas:
+    _invalidadas: set = set()   # usuario_id con personas / departamentos modificados en la BD
+
+    def __init__(self, ids, nombres, deps, fotos, temprano, tarde):
+        self.ids      = np.asarray(ids, dtype=np.int64)
+        self.nombres  = list(nombres)
+        self.deps     = np.asarray(deps, dtype=np.int64)        # -1 = sin departamento
+        self.fotos    = list(fotos)
+        self.temprano = np.asarray(temprano, dtype=np.int32)    # segundos desde 00:00
+        self.tarde    = np.asarray(tarde, dtype=np.int32)
+        self._fila    = {int(pid): i for i, pid in enumerate(self.ids)}
+        self.cargada  = time.monotonic()
+
+    @classmethod
+    def invalidar(cls, usuario_id: int):
+        """La BD cambió: el vigilante de ModeloManager relee la tabla en su próxima vuelta."""
+        cls._invalidadas.add(usuario_id)
+
+    @classmethod
+    def tomar_invalidada(cls, usuario_id: int) -> bool:
+        if usuario_id not in cls._invalidadas:
+            return False
+        cls._invalidadas.discard(usuario_id)
+        return True
+
+    @classmethod
+    def cargar(cls, usuario_id: int) -> "TablaPersonas":
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT p.id, p.nombre_completo, p.departamentos_id, p.imagen_original,
+                       d.hora_temprano, d.hora_tarde
+                FROM personas p
+                LEFT JOIN departamentos d ON d.id = p.departamentos_id
+                WHERE p.usuario_id = %s
+                ORDER BY p.id
+            """, (usuario_id,))
+            filas = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        if not filas:
+            log.warning("No hay personas en la BD para usuario=%s", usuario_id)
+        return cls(
+            ids=[f[0] for f in filas],
+            nombres=[f[1] for f in filas],
+            deps=[f[2] if f[2] is not None else -1 for f in filas],
+            fotos=[f[3] for f in filas],
+            temprano=[_segundos(f[4], _TEMPRANO_DEFAULT) for f in filas],
+            tarde=[_segundos(f[5], _TARDE_DEFAULT) for f in filas],
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def fila(self, persona_id: int) -> int:
+        return self._fila.get(int(persona_id), -1)
+
+    def nombre(self, persona_id: int) -> str:
+        i = self.fila(persona_id)
+        return self.nombres[i] if i >= 0 else "Desconocido"
+
+    def foto(self, persona_id: int):
+        i = self.fila(persona_id)
+        return self.fotos[i] if i >= 0 else None
+
+    def departamento(self, persona_id: int):
+        i = self.fila(persona_id)
+        return int(self.deps[i]) if i >= 0 and self.deps[i] >= 0 else None
+
+    def estado_asistencia(self, persona_id: int, hora: dtime) -> str:
+        """Temprano / Tarde / Falto según el horario del departamento."""
+        i = self.fila(persona_id)
+        temprano = self.temprano[i] if i >= 0 else _TEMPRANO_DEFAULT
+        tarde    = self.tarde[i] if i >= 0 else _TARDE_DEFAULT
+        s = hora.hour * 3600 + hora.minute * 60 + hora.second
+        if s <= temprano:
+            return "Temprano"
+        if s <= tarde:
+            return "Tarde"
+        return "Falto"
+
+    def ids_por_nombre(self, nombres) -> np.ndarray:
+        """Sólo para modelos viejos (etiquetas = posición en nombres.pkl)."""
+        por_nombre = {n.strip().lower(): int(pid) for n, pid in zip(self.nombres, self.ids)}
+        return np.array([por_nombre.get(n.strip().lower(), DESCONOCIDO) for n in nombres], dtype=np.int64)
@@ -0,0 +1,152 @@
+# ✅ omniface-backend/tracker.py
+"""
+Seguimiento temporal de rostros por cámara (IoU entre frames consecutivos).
+
+Cada rostro detectado se asocia a un Track persistente que conserva la
+identidad y la emoción del último reconocimiento. El worker sólo vuelve a
+calcular embedding + FAISS + emoción cuando el track lo necesita:
+  • es nuevo,
+  • su confianza es baja (reintento cada TRACK_REINTENTO_S), o
+  • pasó TRACK_REFRESCO_S desde el último reconocimiento.
+El resto de los frames sólo pasan por el detector.
+
+La identidad de un track no se decide con un solo frame: se promedian los
+últimos IDENT_VENTANA embeddings y se aplica histéresis (umbral de entrada
+para adoptar un nombre, umbral de salida más bajo para soltarlo), así un
+rostro cerca del umbral no alterna entre su nombre y "Desconocido".
+"""
+import itertools
+from collections import deque
+import numpy as np
+from config import (
+    TRACK_IOU_MIN, TRACK_MAX_PERDIDOS, TRACK_REFRESCO_S,
+    TRACK_CONF_MIN, TRACK_REINTENTO_S,
+    IDENT_VENTANA, IDENT_UMBRAL_ENTRADA, IDENT_UMBRAL_SALIDA
+)
+
+_ids = itertools.count(1)   # ids únicos en todo el proceso
+
+
+def iou_matriz(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU entre cada bbox de `a` (N,4) y cada bbox de `b` (M,4) → (N,M)."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    a = a[:, None, :]
+    b = b[None, :, :]
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / (area_a + area_b - inter + 1e-6)
+
+
+class Track:
+    """Estado de un rostro seguido entre frames."""
+
+    def __init__(self, bbox):
+        self.id         = next(_ids)
+        self.bbox       = np.asarray(bbox, dtype=np.float32)
+        self.persona_id = -1         # -1 = desconocido
+        self.nombre     = "Desconocido"
+        self.emocion    = "N/A"
+        self.confidence = 0.0
+        self.perdidos   = 0          # frames seguidos sin detección
+        self.ultimo_rec = None       # monotonic del último reconocimiento
+        self.embeddings = deque(maxlen=IDENT_VENTANA)   # normalizados L2
+
+    def necesita_reconocer(self, ahora: float) -> bool:
+        if self.ultimo_rec is None:
+            return True
+        transcurrido = ahora - self.ultimo_rec
+        if self.confidence < TRACK_CONF_MIN:
+            return transcurrido >= TRACK_REINTENTO_S
+        return transcurrido >= TRACK_REFRESCO_S
+
+    def embedding_medio(self, emb: np.ndarray) -> np.ndarray:
+        """Agrega `emb` a la ventana y devuelve la media normalizada."""
+        self.embeddings.append(emb)
+        media = np.mean(self.embeddings, axis=0).astype(np.float32)
+        return media / (np.linalg.norm(media) + 1e-12)
+
+    def asignar(self, candidato: int, nombre: str, emocion: str, sim: float, ahora: float) -> bool:
+        """
+        Vota la identidad con histéresis a partir del mejor candidato FAISS
+        (persona_id) del embedding medio. Devuelve True si la identidad cambió.
+        La histéresis sólo sostiene el nombre vigente: si gana otra persona
+        sin llegar a IDENT_UMBRAL_ENTRADA, el track pasa a Desconocido.
+        """
+        anterior = self.persona_id
+        if candidato == self.persona_id:
+            if sim < IDENT_UMBRAL_SALIDA:
+                self._soltar()
+        elif sim >= IDENT_UMBRAL_ENTRADA and candidato >= 0:
+            self.persona_id, self.nombre = candidato, nombre
+        else:
+            self._soltar()
+        self.emocion    = emocion
+        self.confidence = sim
+        self.ultimo_rec = ahora
+        return self.persona_id != anterior
+
+    def _soltar(self):
+        self.persona_id, self.nombre = -1, "Desconocido"
+
+    def como_rostro(self, r) -> dict:
+        """Rostro con la identidad arrastrada del último reconocimiento."""
+        x1, y1, x2, y2 = map(int, r.bbox)
+        return {
+            "bbox": (x1, y1, x2, y2),
+            "persona_id": self.persona_id,
+            "nombre": self.nombre,
+            "emocion": self.emocion,
+            "r": r,
+            "confidence": self.confidence
+        }
+
+
+class FaceTracker:
+    """
+    Tracker IoU de una cámara. Lo usa el InferenceWorker (un solo hilo),
+    así que no necesita locks.
+    """
+
+    def __init__(self, iou_min: float = TRACK_IOU_MIN, max_perdidos: int = TRACK_MAX_PERDIDOS):
+        self.iou_min      = iou_min
+        self.max_perdidos = max_perdidos
+        self.tracks: list = []
+
+    def actualizar(self, bboxes: np.ndarray) -> list:
+        """
+        Asocia las detecciones del frame con los tracks vivos (greedy por IoU).
+        Devuelve la lista de Track alineada con `bboxes`.
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        previos = np.array([t.bbox for t in self.tracks], dtype=np.float32).reshape(-1, 4)
+        iou = iou_matriz(previos, bboxes)
+
+        asignados = [None] * len(bboxes)
+        usados = set()
+        if iou.size:
+            for flat in np.argsort(-iou, axis=None):
+                ti, di = (int(v) for v in np.unravel_index(flat, iou.shape))
+                if iou[ti, di] < self.iou_min:
+                    break
+                if ti in usados or asignados[di] is not None:
+                    continue
+                usados.add(ti)
+                asignados[di] = self.tracks[ti]
+
+        for t_idx, t in enumerate(self.tracks):
+            if t_idx not in usados:
+                t.perdidos += 1
+        for d_idx, t in enumerate(asignados):
+            if t is None:
+                t = Track(bboxes[d_idx])
+                self.tracks.append(t)
+                asignados[d_idx] = t
+            t.bbox = bboxes[d_idx]
+            t.perdidos = 0
+
+        self.tracks = [t for t in self.tracks if t.perdidos <= self.max_perdidos]
+        return asignados
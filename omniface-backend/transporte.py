@@ -0,0 +1,77 @@
+# ✅ omniface-backend/transporte.py
+"""
+Serialización de los mensajes de /recon/ws.
+
+Protocolos (se negocian con ?protocolo= en la URL del WebSocket):
+  • "json"    → un mensaje de texto con el JPEG en base64 (formato original)
+  • "binario" → un mensaje binario:  [uint32 big-endian: largo del JSON]
+                                     [JSON de metadatos (utf-8)]
+                                     [bytes del JPEG]
+El modo binario evita el +33 % de base64 y el costo de serializar el frame
+dentro del JSON.
+
+Vistas (?vista=), qué imagen acompaña a los metadatos:
+  • "anotado" → frame con esquinas / malla dibujadas en el servidor
+  • "crudo"   → frame sin dibujar; el frontend pinta los overlays
+  • "datos"   → sólo metadatos (bbox, nombre, emoción, kps), sin imagen
+En "datos" el JSON no lleva "frame" y el mensaje binario no lleva JPEG.
+"""
+import base64
+import json
+import struct
+import cv2
+
+try:
+    import orjson
+except ImportError:   # opcional: json de la stdlib como respaldo
+    orjson = None
+
+PROTOCOLOS = ("json", "binario")
+VISTAS     = ("anotado", "crudo", "datos")
+_CABECERA  = struct.Struct(">I")
+_JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
+
+
+def _a_nativo(obj):
+    """Escalares / arrays de numpy → tipos de Python (respaldo sin orjson)."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} no es serializable")
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), default=_a_nativo
+    ).encode("utf-8")
+
+
+def codificar_jpeg(frame) -> bytes:
+    _, buf = cv2.imencode(".jpg", frame, _JPEG_PARAMS)
+    return buf.tobytes()
+
+
+def empaquetar_binario(meta: dict, jpeg: bytes) -> bytes:
+    cuerpo = dumps(meta)
+    return b"".join((_CABECERA.pack(len(cuerpo)), cuerpo, jpeg))
+
+
+def mensaje_json(meta: dict, jpeg: bytes) -> str:
+    if not jpeg:
+        return dumps(meta).decode("utf-8")
+    return dumps({**meta, "frame": base64.b64encode(jpeg).decode()}).decode("utf-8")
+
+
+def serializar(protocolo: str, meta: dict, jpeg: bytes):
+    """bytes (binario) o str (json) listos para el WebSocket; jpeg vacío = sólo datos."""
+    if protocolo == "binario":
+        return empaquetar_binario(meta, jpeg)
+    return mensaje_json(meta, jpeg)
+
+
+async def enviar(ws, datos):
+    if isinstance(datos, bytes):
+        await ws.send_bytes(datos)
+    else:
+        await ws.send_text(datos)
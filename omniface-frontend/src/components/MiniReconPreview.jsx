@@ -11,7 +11,7 @@ export default function MiniReconPreview({ visible }) {
   useEffect(() => {
     if (!visible || !data.lastFrame) return;
     const img = new Image();
-    img.src = `data:image/jpeg;base64,${data.lastFrame}`;
+    img.src = data.lastFrame;   // data URL (json) u object URL (binario)
     img.onload = () => {
       const cvs = cvsRef.current;
       if (!cvs) return;
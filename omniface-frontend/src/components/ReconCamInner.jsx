@@ -2,44 +2,91 @@ import { useEffect, useRef, useState } from "react";
 import { FaPlay, FaPause, FaStop, FaUser, FaRegClock, FaRegSmile } from "react-icons/fa";
 import { useRecon } from "../context/ReconContext";
 
+/* Esquinas + puntos clave como los dibuja el servidor en la vista "anotado" */
+function dibujarOverlays(ctx, faces, roi, sx, sy, w, h) {
+  const largo = 30;
+  ctx.lineWidth = 2;
+  for (const f of faces) {
+    const [x1, y1, x2, y2] = [f.bbox[0] * sx, f.bbox[1] * sy, f.bbox[2] * sx, f.bbox[3] * sy];
+    ctx.strokeStyle = f.nombre === "Desconocido" ? "rgb(80,80,255)" : "rgb(100,255,0)";
+    ctx.beginPath();
+    for (const [cx, cy, dx, dy] of [[x1, y1, 1, 1], [x2, y1, -1, 1], [x1, y2, 1, -1], [x2, y2, -1, -1]]) {
+      ctx.moveTo(cx + dx * largo, cy);
+      ctx.lineTo(cx, cy);
+      ctx.lineTo(cx, cy + dy * largo);
+    }
+    ctx.stroke();
+    ctx.fillStyle = ctx.strokeStyle;
+    for (const [kx, ky] of f.kps ?? []) {
+      ctx.fillRect(kx * sx - 1.5, ky * sy - 1.5, 3, 3);
+    }
+  }
+  if (roi) {
+    ctx.strokeStyle = "rgba(200,200,200,0.8)";
+    ctx.lineWidth = 1;
+    ctx.strokeRect(roi[0] * w, roi[1] * h, (roi[2] - roi[0]) * w, (roi[3] - roi[1]) * h);
+  }
+}
+
 export default function ReconCamInner({ camId, modo }) {
   const { data, connect, pause, resume, stop } = useRecon(camId, modo);
   const canvasRef = useRef(null);
+  const imgRef = useRef(null);          // último frame decodificado
+  const [imgTick, setImgTick] = useState(0);
   const [scale, setScale] = useState({x: 1, y: 1});
   const [isHoveringControls, setIsHoveringControls] = useState(false);
 
+  /* decodificar el frame nuevo (si el mensaje trajo imagen) */
   useEffect(() => {
-    const cvs = canvasRef.current;
-    if (!cvs) return;
-    
-    const ctx = cvs.getContext("2d", { alpha: false });
     if (!data.lastFrame) {
-      ctx.fillStyle = "#111827";
-      ctx.fillRect(0, 0, cvs.width, cvs.height);
+      imgRef.current = null;
+      setImgTick(t => t + 1);
       return;
     }
-    
     const img = new Image();
-    img.src = `data:image/jpeg;base64,${data.lastFrame}`;
+    img.src = data.lastFrame;   // data URL (json) u object URL (binario)
     img.onload = () => {
-      const { clientWidth: w, clientHeight: h } = cvs;
-      cvs.width = w; 
-      cvs.height = h;
-      setScale({x: w / img.naturalWidth, y: h / img.naturalHeight});
-      
-      ctx.drawImage(img, 0, 0, w, h);
-      
-      const gradient = ctx.createRadialGradient(
-        w/2, h/2, h*0.4,
-        w/2, h/2, h*0.8
-      );
-      gradient.addColorStop(0, 'transparent');
-      gradient.addColorStop(1, 'rgba(0,0,0,0.5)');
-      ctx.fillStyle = gradient;
-      ctx.fillRect(0, 0, w, h);
+      imgRef.current = img;
+      setImgTick(t => t + 1);
     };
   }, [data.lastFrame]);
 
+  /* pintar: frame + overlays del cliente cuando el servidor no los dibujó */
+  useEffect(() => {
+    const cvs = canvasRef.current;
+    if (!cvs) return;
+
+    const ctx = cvs.getContext("2d", { alpha: false });
+    const { clientWidth: w, clientHeight: h } = cvs;
+    cvs.width = w;
+    cvs.height = h;
+    const img = imgRef.current;
+    const fw = data.frameSize?.w ?? img?.naturalWidth;
+    const fh = data.frameSize?.h ?? img?.naturalHeight;
+    const sx = fw ? w / fw : 1, sy = fh ? h / fh : 1;
+    setScale(s => (s.x === sx && s.y === sy ? s : {x: sx, y: sy}));
+
+    if (img) {
+      ctx.drawImage(img, 0, 0, w, h);
+    } else {
+      ctx.fillStyle = "#111827";
+      ctx.fillRect(0, 0, w, h);
+    }
+
+    if (data.vista !== "anotado") {
+      dibujarOverlays(ctx, data.faces, data.roi, sx, sy, w, h);
+    }
+
+    const gradient = ctx.createRadialGradient(
+      w/2, h/2, h*0.4,
+      w/2, h/2, h*0.8
+    );
+    gradient.addColorStop(0, 'transparent');
+    gradient.addColorStop(1, 'rgba(0,0,0,0.5)');
+    ctx.fillStyle = gradient;
+    ctx.fillRect(0, 0, w, h);
+  }, [imgTick, data.faces, data.frameSize, data.roi, data.vista]);
+
   return (
     <div className="relative h-full group">
       {/* Botones de control con efecto hover */}
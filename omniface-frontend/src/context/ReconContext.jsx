@@ -9,6 +9,16 @@ const BACKEND_HOST =
   `${window.location.hostname}:8000`;
 /* -------------------- */
 
+/* --- protocolo binario ---
+   [uint32 BE: largo del JSON][JSON de metadatos][bytes del JPEG] */
+const textDecoder = new TextDecoder();
+function decodeBinario(buf) {
+  const metaLen = new DataView(buf).getUint32(0);
+  const msg     = JSON.parse(textDecoder.decode(new Uint8Array(buf, 4, metaLen)));
+  return { msg, jpeg: new Uint8Array(buf, 4 + metaLen) };
+}
+/* -------------------- */
+
 /* 1 Context por cámara → se almacena en este mapa */
 const CtxMap = {};
 function getCtx(id) {
@@ -16,9 +26,24 @@ function getCtx(id) {
 }
 
 /* ────────────────────────────── */
-export function ReconProvider({ camId = 0, modo = "normal", children }) {
+/* vista: "anotado" (overlays del servidor) | "crudo" (overlays en el cliente) | "datos" (sin video)
+   videoFps > 0 limita la imagen a ese ritmo; los demás mensajes llegan sólo con metadatos */
+export function ReconProvider({
+  camId = 0, modo = "normal", protocolo = "binario",
+  vista = "anotado", videoFps = 0, children
+}) {
   const ReconCtx = getCtx(camId);
   const ws = useRef(null);
+  const pausedRef = useRef(false);
+  const frameUrl  = useRef(null);   // object URL del frame mostrado (modo binario)
+
+  /* lastFrame es un src listo para <img>; los object URL se liberan al reemplazarlos
+     (con margen, por si el <img> del consumidor todavía lo está cargando) */
+  const soltarFrameUrl = (nuevo = null) => {
+    const viejo = frameUrl.current;
+    frameUrl.current = nuevo;
+    if (viejo) setTimeout(() => URL.revokeObjectURL(viejo), 1000);
+  };
 
   /* estado base */
   const blank = () => ({
@@ -28,6 +53,10 @@ export function ReconProvider({ camId = 0, modo = "normal", children }) {
     faces       : [],
     latency     : 0,
     lastFrame   : null,
+    frameSize   : null,     // { w, h } del frame analizado (para escalar bbox)
+    roi         : null,
+    summary     : {},       // sólo llega cuando cambia: se conserva el último
+    vista,
     fpsHist     : [],
     latencyHist : [],
     error       : null
@@ -46,8 +75,9 @@ export function ReconProvider({ camId = 0, modo = "normal", children }) {
     }
 
     const proto = window.location.protocol === "https:" ? "wss" : "ws";
-    const url   = `${proto}://${BACKEND_HOST}/recon/ws?cam_id=${camId}&token=${token}&modo=${modo}`;
+    const url   = `${proto}://${BACKEND_HOST}/recon/ws?cam_id=${camId}&token=${token}&modo=${modo}&protocolo=${protocolo}&vista=${vista}&video_fps=${videoFps}`;
     ws.current  = new WebSocket(url);
+    ws.current.binaryType = "arraybuffer";
 
     ws.current.onopen  = () => setData(d=>({...d,connected:true,paused:false,error:null}));
     ws.current.onclose = (event) => {
@@ -62,44 +92,62 @@ export function ReconProvider({ camId = 0, modo = "normal", children }) {
     /* throttle 60 ms ≈ 16 fps */
     let lastEmit = 0;
     ws.current.onmessage = ev => {
-      const msg = JSON.parse(ev.data);
+      const binario       = typeof ev.data !== "string";
+      const { msg, jpeg } = binario ? decodeBinario(ev.data) : { msg: JSON.parse(ev.data) };
       if (msg.type === "error") {
         setData(d => ({ ...d, error: msg.detail }));
         return;
       }
       if (msg.type !== "frame") return;
 
+      // el resumen no viene en todos los frames: no perderlo por el throttle
+      if (msg.summary) setData(d => ({ ...d, summary: msg.summary }));
+
       const now     = performance.now();
       if (now - lastEmit < 60) return;
       lastEmit = now;
 
       const latency = Date.now() - msg.timestamp*1000;
 
+      let frame = null;
+      if (!pausedRef.current && (binario ? jpeg.length > 0 : msg.frame)) {
+        if (binario) {
+          frame = URL.createObjectURL(new Blob([jpeg], { type: "image/jpeg" }));
+          soltarFrameUrl(frame);
+        } else {
+          frame = `data:image/jpeg;base64,${msg.frame}`;
+        }
+      }
+
       setData(d => ({
         ...d,
-        lastFrame   : d.paused ? d.lastFrame : msg.frame,
+        lastFrame   : frame ?? d.lastFrame,
         faces       : msg.faces,
+        frameSize   : { w: msg.ancho, h: msg.alto },
+        roi         : msg.roi,
         fps         : msg.fps,
         latency,
         fpsHist     : [...d.fpsHist.slice(-59), msg.fps],
         latencyHist : [...d.latencyHist.slice(-59), latency]
       }));
     };
-  }, [camId, modo]);
+  }, [camId, modo, protocolo, vista, videoFps]);
 
   /* controles */
-  const pause  = () => setData(d => ({ ...d, paused:true  }));
-  const resume = () => setData(d => ({ ...d, paused:false }));
+  const pause  = () => { pausedRef.current = true;  setData(d => ({ ...d, paused:true  })); };
+  const resume = () => { pausedRef.current = false; setData(d => ({ ...d, paused:false })); };
   const stop = useCallback(() => {
   if (ws.current) {
     ws.current.close(1000, "Stopped by user");  // Cierra con código normal
     ws.current = null;
   }
+  pausedRef.current = false;
+  soltarFrameUrl();
   setData(blank());  // Resetea estado inmediatamente
 }, []);
 
   /* cerrar al salir */
-  useEffect(()=> () => ws.current?.close(), []);
+  useEffect(()=> () => { ws.current?.close(); soltarFrameUrl(); }, []);
 
   return (
     <ReconCtx.Provider value={{ data, connect, pause, resume, stop }}>
@@ -23,6 +23,26 @@ SET time_zone = "+00:00";
 
 -- --------------------------------------------------------
 
+--
+-- Estructura de tabla para la tabla `asistencias`
+--
+
+CREATE TABLE `asistencias` (
+  `id` int(11) NOT NULL,
+  `evento_id` char(32) DEFAULT NULL,
+  `persona_id` int(11) DEFAULT NULL,
+  `usuario_id` int(11) NOT NULL,
+  `departamento_id` int(11) DEFAULT NULL,
+  `nombre` varchar(100) NOT NULL,
+  `estado` varchar(20) DEFAULT NULL,
+  `tipo` varchar(20) DEFAULT NULL,
+  `foto_path` varchar(255) DEFAULT NULL,
+  `fecha` date NOT NULL,
+  `hora` time NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Estructura de tabla para la tabla `departamentos`
 --
@@ -100,6 +120,38 @@ INSERT INTO `personas` (`id`, `usuario_id`, `nombre_completo`, `codigo_app`, `im
 
 -- --------------------------------------------------------
 
+--
+-- Estructura de tabla para la tabla `personas_imagenes`
+--
+
+CREATE TABLE `personas_imagenes` (
+  `id` int(11) NOT NULL,
+  `persona_id` int(11) NOT NULL,
+  `usuario_id` int(11) NOT NULL,
+  `imagen` varchar(255) NOT NULL,
+  `creado_en` timestamp NOT NULL DEFAULT current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Estructura de tabla para la tabla `salidas`
+--
+
+CREATE TABLE `salidas` (
+  `id` int(11) NOT NULL,
+  `evento_id` char(32) DEFAULT NULL,
+  `persona_id` int(11) DEFAULT NULL,
+  `usuario_id` int(11) NOT NULL,
+  `departamento_id` int(11) DEFAULT NULL,
+  `nombre` varchar(100) NOT NULL,
+  `foto_path` varchar(255) DEFAULT NULL,
+  `fecha` date NOT NULL,
+  `hora` time NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Estructura de tabla para la tabla `usuarios`
 --
@@ -133,6 +185,13 @@ INSERT INTO `usuarios` (`id`, `nombre`, `correo`, `contrasena_hash`, `creado_en`
 -- Índices para tablas volcadas
 --
 
+--
+-- Indices de la tabla `asistencias`
+--
+ALTER TABLE `asistencias`
+  ADD PRIMARY KEY (`id`),
+  ADD UNIQUE KEY `uq_asistencias_evento` (`evento_id`);
+
 --
 -- Indices de la tabla `departamentos`
 --
@@ -155,6 +214,21 @@ ALTER TABLE `personas`
   ADD KEY `usuario_id` (`usuario_id`),
   ADD KEY `fk_departamentos` (`departamentos_id`);
 
+--
+-- Indices de la tabla `personas_imagenes`
+--
+ALTER TABLE `personas_imagenes`
+  ADD PRIMARY KEY (`id`),
+  ADD KEY `idx_personas_imagenes_usuario` (`usuario_id`),
+  ADD KEY `personas_imagenes_ibfk_1` (`persona_id`);
+
+--
+-- Indices de la tabla `salidas`
+--
+ALTER TABLE `salidas`
+  ADD PRIMARY KEY (`id`),
+  ADD UNIQUE KEY `uq_salidas_evento` (`evento_id`);
+
 --
 -- Indices de la tabla `usuarios`
 --
@@ -166,6 +240,12 @@ ALTER TABLE `usuarios`
 -- AUTO_INCREMENT de las tablas volcadas
 --
 
+--
+-- AUTO_INCREMENT de la tabla `asistencias`
+--
+ALTER TABLE `asistencias`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT de la tabla `departamentos`
 --
@@ -184,6 +264,18 @@ ALTER TABLE `modelos_generados`
 ALTER TABLE `personas`
   MODIFY `id` int(11) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=105;
 
+--
+-- AUTO_INCREMENT de la tabla `personas_imagenes`
+--
+ALTER TABLE `personas_imagenes`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
+--
+-- AUTO_INCREMENT de la tabla `salidas`
+--
+ALTER TABLE `salidas`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT de la tabla `usuarios`
 --
@@ -212,6 +304,12 @@ ALTER TABLE `modelos_generados`
 ALTER TABLE `personas`
   ADD CONSTRAINT `fk_departamentos` FOREIGN KEY (`departamentos_id`) REFERENCES `departamentos` (`id`),
   ADD CONSTRAINT `personas_ibfk_1` FOREIGN KEY (`usuario_id`) REFERENCES `usuarios` (`id`) ON DELETE CASCADE;
+
+--
+-- Filtros para la tabla `personas_imagenes`
+--
+ALTER TABLE `personas_imagenes`
+  ADD CONSTRAINT `personas_imagenes_ibfk_1` FOREIGN KEY (`persona_id`) REFERENCES `personas` (`id`) ON DELETE CASCADE;
 COMMIT;
 
 /*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;